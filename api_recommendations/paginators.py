@@ -1,9 +1,184 @@
+import json
+import operator
+from functools import reduce
+
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor
+from rest_framework.utils.urls import replace_query_param
+
+
+PAGINATION_MODES = ('page', 'cursor')
+
+
+class LinkParamsMixin:
+    """Класс-примесь добавления в ссылки на страницы параметров запроса, например зерна перемешивания"""
+
+    link_params = None
 
+    def add_link_params(self, url):
+        if url is None:
+            return None
 
-class ItemPaginator(pagination.PageNumberPagination):
+        for key, value in (self.link_params or {}).items():
+            url = replace_query_param(url, key, value)
+        return url
+
+    def get_next_link(self):
+        return self.add_link_params(super().get_next_link())
+
+    def get_previous_link(self):
+        return self.add_link_params(super().get_previous_link())
+
+
+class ItemPaginator(LinkParamsMixin, pagination.PageNumberPagination):
     """Класс пагинатора для списка элементов"""
 
     page_size = 5
     page_query_param = 'page_size'
     max_page_size = 50
+
+
+class ItemCursorPaginator(pagination.CursorPagination):
+    """Класс курсорного пагинатора для списка элементов без подсчета общего количества
+
+    Курсор хранит значения всех полей порядка последнего элемента страницы, следующая страница выбирается
+    условием по составному ключу (поле, pk) без OFFSET. Пустые значения считаются наибольшими, как в PostgreSQL
+    """
+
+    page_size = 5
+    ordering = ('-created_at', 'pk')
+
+    def get_ordering(self, request, queryset, view):
+        # Порядок задает представление, а не параметр ordering, иначе позиция курсора неоднозначна
+        return self.ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+
+        reverse = self.cursor is not None and self.cursor.reverse
+        position = self.decode_position(queryset) if self.cursor is not None else None
+
+        # Поле сортируется по возрастанию, если направление поля и направление чтения совпадают
+        fields = [(name.lstrip('-'), name.startswith('-') == reverse) for name in self.ordering]
+
+        queryset = queryset.order_by(*(
+            F(name).asc(nulls_last=True) if ascending else F(name).desc(nulls_first=True)
+            for name, ascending in fields
+        ))
+        if position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(fields, position))
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_following = len(results) > self.page_size
+
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = position is not None, has_following
+        else:
+            self.has_next, self.has_previous = has_following, position is not None
+
+        self.display_page_controls = self.has_next or self.has_previous
+        return self.page
+
+    @staticmethod
+    def get_keyset_filter(fields, position):
+        """Метод построения условия выбора элементов строго после позиции курсора по составному ключу"""
+
+        conditions = []
+        equal = Q()
+
+        for (name, ascending), value in zip(fields, position):
+            if value is None:
+                after = None if ascending else Q(**{f'{name}__isnull': False})
+                same = Q(**{f'{name}__isnull': True})
+            elif ascending:
+                after = Q(**{f'{name}__gt': value}) | Q(**{f'{name}__isnull': True})
+                same = Q(**{name: value})
+            else:
+                after = Q(**{f'{name}__lt': value})
+                same = Q(**{name: value})
+
+            if after is not None:
+                conditions.append(equal & after)
+            equal &= same
+
+        return reduce(operator.or_, conditions) if conditions else Q(pk__in=[])
+
+    def get_field(self, queryset, name):
+        """Метод получения поля модели или аннотации для приведения значений из курсора"""
+
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        if name == 'pk':
+            return queryset.model._meta.pk
+        return queryset.model._meta.get_field(name)
+
+    def decode_position(self, queryset):
+        """Метод разбора значений полей порядка из позиции курсора"""
+
+        if self.cursor.position is None:
+            return None
+
+        try:
+            values = json.loads(self.cursor.position)
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError
+            return [
+                None if value is None else self.get_field(queryset, name.lstrip('-')).to_python(value)
+                for name, value in zip(self.ordering, values)
+            ]
+        except (ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_position(self, instance):
+        """Метод кодирования значений полей порядка элемента в позицию курсора"""
+
+        # Даты кодируются через str с микросекундами, чтобы условие по ключу точно совпадало с сохраненным значением
+        return json.dumps([getattr(instance, name.lstrip('-')) for name in self.ordering], default=str)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+
+        position = self.get_position(self.page[-1]) if self.page else self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+
+        # С пустой страницы за концом списка ссылка ведет на последнюю страницу
+        position = self.get_position(self.page[0]) if self.page else None
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+
+class SelectablePaginationMixin:
+    """Класс-примесь выбора пагинации по номеру страницы или курсорной через параметр pagination"""
+
+    pagination_class = ItemPaginator
+    pagination_mode = 'page'
+    cursor_ordering = ItemCursorPaginator.ordering
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            pagination_mode = self.request.query_params.get('pagination', self.pagination_mode)
+
+            if pagination_mode == 'cursor':
+                self._paginator = ItemCursorPaginator()
+                self._paginator.ordering = self.cursor_ordering
+            else:
+                self._paginator = self.pagination_class()
+
+        return self._paginator
@@ -0,0 +1,16 @@
+from rest_framework.renderers import BaseRenderer
+
+
+class PrometheusRenderer(BaseRenderer):
+    """Класс вывода метрик в текстовом формате Prometheus"""
+
+    media_type = 'text/plain'
+    format = 'prometheus'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, str):
+            return data.encode(self.charset)
+
+        # Ошибки прав доступа и аутентификации приходят словарем
+        return '\n'.join(f'# {key}: {value}' for key, value in data.items()).encode(self.charset)
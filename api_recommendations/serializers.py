@@ -1,4 +1,6 @@
 from rest_framework import serializers
+from config import settings
+from api_recommendations.streaming import EXPORT_FORMATS
 from api_recommendations.validators import StopWordsValidator
 from api_users.serializers import AnotherUserSerializer
 from recommendations.models import Item, Like
@@ -41,3 +43,35 @@ class StatisticSerializer(serializers.Serializer):
 
     users = AnotherUserSerializer(many=True)
     items = ItemSerializer(many=True)
+
+
+class CacheStatsSerializer(serializers.Serializer):
+    """Класс сериализатора статистики попаданий в кеш"""
+
+    hits = serializers.IntegerField()
+    misses = serializers.IntegerField()
+    hit_rate = serializers.FloatField()
+
+
+class BatchRecommendationsRequestSerializer(serializers.Serializer):
+    """Класс сериализатора запроса пакетного расчета рекомендаций"""
+
+    users = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False,
+                                  max_length=settings.RECOMMENDATIONS_BATCH_MAX_USERS)
+    k = serializers.IntegerField(min_value=1, default=5)
+    limit = serializers.IntegerField(min_value=1, default=settings.RECOMMENDATIONS_LIMIT)
+
+
+class ItemExportQuerySerializer(serializers.Serializer):
+    """Класс сериализатора параметров потоковой выгрузки элементов"""
+
+    export_format = serializers.ChoiceField(choices=EXPORT_FORMATS, default='ndjson')
+    category = serializers.IntegerField(required=False)
+    user = serializers.IntegerField(required=False)
+    since = serializers.DateTimeField(required=False)
+
+
+class LikeExportQuerySerializer(ItemExportQuerySerializer):
+    """Класс сериализатора параметров потоковой выгрузки лайков"""
+
+    item = serializers.IntegerField(required=False)
@@ -0,0 +1,51 @@
+import csv
+from datetime import datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
+# Формат передается параметром export_format, параметр format занят выбором рендерера DRF
+EXPORT_FORMATS = ('ndjson', 'csv')
+EXPORT_CHUNK_SIZE = 2000
+
+
+class Echo:
+    """Класс псевдо-файла, возвращающего записанную строку вместо ее хранения"""
+
+    def write(self, value):
+        return value
+
+
+def iter_ndjson(records):
+    """Функция кодирования потока словарей в строки NDJSON, по одному объекту JSON на строку"""
+
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+
+    for record in records:
+        yield encoder.encode(record) + '\n'
+
+
+def iter_csv(records, fields):
+    """Функция кодирования потока словарей в строки CSV с заголовком, даты выводятся в ISO 8601"""
+
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+
+    for record in records:
+        yield writer.writerow([value.isoformat() if isinstance(value, datetime) else value
+                               for value in (record[field] for field in fields)])
+
+
+def export_response(queryset, fields, export_format, filename):
+    """Функция потоковой выгрузки строк queryset.values() через серверный курсор без сериализаторов модели"""
+
+    records = queryset.values(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+    if export_format == 'csv':
+        response = StreamingHttpResponse(iter_csv(records, fields), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+        return response
+
+    return StreamingHttpResponse(iter_ndjson(records), content_type=NDJSON_CONTENT_TYPE)
@@ -1,10 +1,18 @@
 from rest_framework import status
 from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+from django.test import TransactionTestCase
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from datetime import datetime
+import json
+from datetime import datetime, timedelta
+from unittest import mock
 import pytz
 from django.conf import settings
-from recommendations.models import Item, Like
+from config import metrics
+from recommendations.models import Item, Like, Category
+from recommendations.services import reset_likes_stores
 from users.models import User
 
 
@@ -60,6 +68,102 @@ class ItemAPITestCase(APITestCase):
         self.assertEqual(len(response.data['results']), 0)
         self.assertEqual(response.data['count'], 0)
 
+    def test_item_list_seeded_pagination(self):
+        for i in range(11):
+            Item.objects.create(name=f"test_{i}", description="test", created_at=self.now, is_published=True)
+
+        # Страницы с одним зерном не повторяют элементы и вместе покрывают весь список
+        pages = [
+            self.client.get(reverse('api_recommendations:api_item_list'), {'seed': 'abc', 'page_size': page}).data
+            for page in range(1, 4)
+        ]
+        pks = [item['pk'] for page in pages for item in page['results']]
+
+        self.assertEqual(len(pks), 12)
+        self.assertCountEqual(pks, Item.objects.values_list('pk', flat=True))
+
+        response = self.client.get(reverse('api_recommendations:api_item_list'), {'seed': 'abc', 'page_size': 1})
+        self.assertEqual([item['pk'] for item in response.data['results']], pks[:5])
+
+    def test_item_list_seed_is_kept_in_links(self):
+        for i in range(11):
+            Item.objects.create(name=f"test_{i}", description="test", created_at=self.now, is_published=True)
+
+        # Клиент без cookie получает зерно в ссылке на следующую страницу, сессия не создается
+        pks = []
+        url = reverse('api_recommendations:api_item_list')
+        while url:
+            self.client.cookies.clear()
+            response = self.client.get(url)
+            self.assertNotIn('sessionid', response.cookies)
+            pks.extend(item['pk'] for item in response.data['results'])
+            url = response.data['next']
+            if url:
+                self.assertIn('seed=', url)
+
+        self.assertEqual(len(pks), 12)
+        self.assertCountEqual(pks, Item.objects.values_list('pk', flat=True))
+
+    def test_item_list_cursor_pagination(self):
+        for i in range(11):
+            Item.objects.create(name=f"test_{i}", description="test", created_at=self.now, is_published=True,
+                                count_likes=i % 4)
+
+        pks = []
+        url = reverse('api_recommendations:api_item_list') + '?pagination=cursor'
+        while url:
+            response = self.client.get(url)
+            self.assertNotIn('count', response.data)
+            pks.extend(item['pk'] for item in response.data['results'])
+            url = response.data['next']
+
+        self.assertEqual(pks, list(Item.objects.order_by('-count_likes', 'pk').values_list('pk', flat=True)))
+
+    def test_user_item_list_cursor_pagination(self):
+        self.client.force_authenticate(user=self.user_owner)
+
+        response = self.client.get(reverse('api_recommendations:api_user_item_list'), {'pagination': 'cursor'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['pk'] for item in response.data['results']], [self.item.pk])
+        self.assertIsNone(response.data['next'])
+
+    def test_cursor_pagination_uses_keyset(self):
+        self.client.force_authenticate(user=self.user_owner)
+        for i in range(11):
+            created_at = None if i % 5 == 0 else self.now - timedelta(days=i % 3)
+            Item.objects.create(name=f"test_{i}", description="test", created_at=created_at, user=self.user_owner)
+
+        # Пустые даты идут первыми, одинаковые даты упорядочены по pk, страницы читаются без OFFSET
+        expected = sorted(Item.objects.filter(user=self.user_owner),
+                          key=lambda item: (item.created_at is not None, -(item.created_at or self.now).timestamp(),
+                                            item.pk))
+        pks, links = [], []
+        url = reverse('api_recommendations:api_user_item_list') + '?pagination=cursor'
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertFalse(any('OFFSET' in query['sql'] for query in queries.captured_queries))
+            pks.extend(item['pk'] for item in response.data['results'])
+            links.append(response.data['previous'])
+            url = response.data['next']
+
+        self.assertEqual(pks, [item.pk for item in expected])
+
+        response = self.client.get(links[-1])
+        self.assertEqual([item['pk'] for item in response.data['results']], pks[5:10])
+
+    def test_cache_stats_staff_only(self):
+        self.client.force_authenticate(user=self.standart_user)
+        response = self.client.get(reverse('api_recommendations:api_cache_stats'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.standart_user.is_staff = True
+        self.standart_user.save()
+        response = self.client.get(reverse('api_recommendations:api_cache_stats'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data), {'hits', 'misses', 'hit_rate'})
+
     def test_item_retrieve(self):
         # Проверка доступа к элементу
         response = self.client.get(reverse('api_recommendations:api_item_detail', args=[self.item.id]))
@@ -79,6 +183,7 @@ class ItemAPITestCase(APITestCase):
         created_item = Item.objects.get(pk=response.data['pk'])
         self.assertEqual(created_item.name, data['name'])
         self.assertEqual(created_item.user, self.standart_user)
+        self.assertGreater(created_item.created_at, self.now)
 
     def test_item_update_authenticated_user_owner(self):
         self.client.force_authenticate(user=self.user_owner)
@@ -91,6 +196,7 @@ class ItemAPITestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.item.refresh_from_db()
         self.assertEqual(self.item.name, data['name'])
+        self.assertGreater(self.item.updated_at, self.now)
 
     def test_item_update_authenticated_user_not_owner(self):
         self.client.force_authenticate(user=self.standart_user)
@@ -170,6 +276,23 @@ class ItemAPITestCase(APITestCase):
         self.assertEqual(len(response.data['results']), 0)
         self.assertEqual(response.data['count'], 0)
 
+    def test_recommended_items_scoring(self):
+        self.client.force_authenticate(user=self.standart_user)
+
+        response = self.client.get(reverse('api_recommendations:api_item_recommended'), {'scoring': 'push'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(reverse('api_recommendations:api_item_recommended'), {'scoring': 'unknown'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_recommended_items_cursor_pagination(self):
+        self.client.force_authenticate(user=self.standart_user)
+
+        response = self.client.get(reverse('api_recommendations:api_item_recommended'), {'pagination': 'cursor'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', response.data)
+
     def test_recommended_items_user_without_like_set(self):
         self.client.force_authenticate(user=self.user_owner)
         response = self.client.get(reverse('api_recommendations:api_item_recommended'))
@@ -182,6 +305,15 @@ class ItemAPITestCase(APITestCase):
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_statistic_view_window(self):
+        self.client.force_authenticate(user=self.standart_user)
+
+        response = self.client.get(reverse('api_recommendations:api_statistic'), {'window': '7d'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(reverse('api_recommendations:api_statistic'), {'window': 'year'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_statistic_view_user_without_like_set(self):
         self.client.force_authenticate(user=self.user_owner)
         response = self.client.get(reverse('api_recommendations:api_statistic'))
@@ -219,6 +351,26 @@ class LikeAPITestCase(APITestCase):
         self.assertEqual(len(response.data['results']), 1)
         self.assertEqual(response.data['count'], 1)
 
+    def test_user_like_list_ordered_by_like_date(self):
+        self.client.force_authenticate(user=self.standart_user)
+        self.like.created_at = self.now - timedelta(days=2)
+        self.like.save()
+        for i in range(6):
+            item = Item.objects.create(name=f"test_{i}", description="test", created_at=self.now - timedelta(days=i),
+                                       is_published=True, user=self.user_owner)
+            Like.objects.create(user=self.standart_user, item=item, created_at=self.now - timedelta(hours=i))
+
+        expected = list(Like.objects.filter(user=self.standart_user).order_by('-created_at', 'pk').
+                        values_list('item_id', flat=True))
+
+        response = self.client.get(reverse('api_recommendations:api_user_like_list'), {'pagination': 'cursor'})
+        pks = [item['pk'] for item in response.data['results']]
+        response = self.client.get(response.data['next'])
+        pks.extend(item['pk'] for item in response.data['results'])
+
+        self.assertEqual(pks, expected)
+        self.assertIsNone(response.data['next'])
+
     def test_user_like_list_no_likes(self):
         self.client.force_authenticate(user=self.user_owner)
         response = self.client.get(reverse('api_recommendations:api_user_like_list'))
@@ -292,3 +444,250 @@ class LikeAPITestCase(APITestCase):
         response = self.client.delete(reverse('api_recommendations:api_item_unlike'), data)
 
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_repeated_unlike_decrements_once(self):
+        self.client.force_authenticate(user=self.standart_user)
+
+        responses = [self.client.delete(reverse('api_recommendations:api_item_unlike'), {'item': self.item.pk})
+                     for _ in range(2)]
+
+        self.assertEqual([response.status_code for response in responses],
+                         [status.HTTP_200_OK, status.HTTP_403_FORBIDDEN])
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.count_likes, -1)
+
+
+class AsyncRecommendationAPITestCase(TransactionTestCase):
+    """Класс тестирования асинхронных API-контроллеров рекомендаций и статистики"""
+
+    def setUp(self) -> None:
+        reset_likes_stores()
+
+        self.user_1 = User.objects.create(email="user_1@test.ru", password="test_password", phone="88005553535")
+        self.user_2 = User.objects.create(email="user_2@test.ru", password="test_password", phone="88005553535")
+
+        self.item_1 = Item.objects.create(name="test_1", description="test", is_published=True, count_likes=2)
+        self.item_2 = Item.objects.create(name="test_2", description="test", is_published=True, count_likes=1)
+
+        Like.objects.create(user=self.user_1, item=self.item_1)
+        Like.objects.create(user=self.user_2, item=self.item_1)
+        Like.objects.create(user=self.user_2, item=self.item_2)
+
+        self.headers = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(self.user_1).access_token}'}
+
+    def test_recommended_items_async(self):
+        response = self.client.get(reverse('api_recommendations:api_item_recommended_async'), **self.headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['pk'] for item in response.json()['results']], [self.item_2.pk])
+
+        response = self.client.get(reverse('api_recommendations:api_item_recommended_async'),
+                                   {'scoring': 'unknown'}, **self.headers)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_statistic_async(self):
+        response = self.client.get(reverse('api_recommendations:api_statistic_async'), **self.headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([user['email'] for user in response.json()['users']], [self.user_2.email])
+
+    def test_async_views_access(self):
+        response = self.client.get(reverse('api_recommendations:api_item_recommended_async'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        Like.objects.filter(user=self.user_1).delete()
+        response = self.client.get(reverse('api_recommendations:api_statistic_async'), **self.headers)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class BatchRecommendationsAPITestCase(APITestCase):
+    """Класс тестирования пакетного расчета рекомендаций"""
+
+    def setUp(self):
+        reset_likes_stores()
+
+        self.users = [User.objects.create(email=f'user_{i}@test.com', password='password', phone="88005553535")
+                      for i in range(3)]
+        self.admin = User.objects.create(email='admin@test.com', password='password', phone="88005553535",
+                                         is_staff=True)
+        self.items = [Item.objects.create(name=f"test_{i}", description="test", is_published=True) for i in range(3)]
+
+        for user, item in [(0, 0), (1, 0), (1, 1), (2, 0), (2, 2)]:
+            Like.objects.create(user=self.users[user], item=self.items[item])
+
+    def tearDown(self):
+        reset_likes_stores()
+
+    def test_batch_streams_ndjson(self):
+        self.client.force_authenticate(user=self.admin)
+        user_pks = [self.users[0].pk, self.admin.pk]
+
+        response = self.client.post(reverse('api_recommendations:api_item_recommended_batch'),
+                                    {'users': user_pks, 'k': 5}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(lines, [
+            {'user': self.users[0].pk, 'items': [self.items[1].pk, self.items[2].pk], 'scores': [1.0, 1.0]},
+            {'user': self.admin.pk, 'items': [], 'scores': []},
+        ])
+
+    def test_batch_validation(self):
+        self.client.force_authenticate(user=self.admin)
+
+        response = self.client.post(reverse('api_recommendations:api_item_recommended_batch'), {'users': []},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_batch_is_staff_only(self):
+        self.client.force_authenticate(user=self.users[0])
+
+        response = self.client.post(reverse('api_recommendations:api_item_recommended_batch'),
+                                    {'users': [self.users[0].pk]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ExportAPITestCase(APITestCase):
+    """Класс тестирования потоковой выгрузки элементов и лайков"""
+
+    def setUp(self):
+        zone = pytz.timezone(settings.TIME_ZONE)
+        self.since = datetime(2024, 1, 2, tzinfo=zone)
+
+        self.user_1 = User.objects.create(email='user_1@test.com', password='password', phone="88005553535")
+        self.user_2 = User.objects.create(email='user_2@test.com', password='password', phone="88005553535")
+        self.admin = User.objects.create(email='admin@test.com', password='password', phone="88005553535",
+                                         is_staff=True)
+        self.category = Category.objects.create(name="test", description="test")
+
+        self.item_1 = Item.objects.create(name="test_1", description="test", user=self.user_1,
+                                          created_at=datetime(2024, 1, 1, tzinfo=zone))
+        self.item_2 = Item.objects.create(name="test_2", description="test", category=self.category,
+                                          created_at=datetime(2024, 1, 1, tzinfo=zone),
+                                          updated_at=datetime(2024, 1, 3, tzinfo=zone))
+        self.item_3 = Item.objects.create(name="test_3", description="test", category=self.category,
+                                          created_at=datetime(2024, 1, 3, tzinfo=zone))
+
+        Like.objects.create(user=self.user_1, item=self.item_2, created_at=datetime(2024, 1, 1, tzinfo=zone))
+        Like.objects.create(user=self.user_1, item=self.item_3, created_at=datetime(2024, 1, 3, tzinfo=zone))
+        Like.objects.create(user=self.user_2, item=self.item_3, created_at=datetime(2024, 1, 3, tzinfo=zone))
+
+    @staticmethod
+    def read_ndjson(response):
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    def test_items_export_ndjson(self):
+        self.client.force_authenticate(user=self.user_1)
+
+        response = self.client.get(reverse('api_recommendations:api_item_export'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual([item['pk'] for item in self.read_ndjson(response)],
+                         [self.item_1.pk, self.item_2.pk, self.item_3.pk])
+
+    def test_items_export_filters(self):
+        self.client.force_authenticate(user=self.user_1)
+        url = reverse('api_recommendations:api_item_export')
+
+        response = self.client.get(url, {'since': self.since.isoformat()})
+        self.assertEqual([item['pk'] for item in self.read_ndjson(response)], [self.item_2.pk, self.item_3.pk])
+
+        response = self.client.get(url, {'category': self.category.pk, 'user': self.user_1.pk})
+        self.assertEqual(self.read_ndjson(response), [])
+
+        response = self.client.get(url, {'since': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_items_export_csv(self):
+        self.client.force_authenticate(user=self.user_1)
+
+        response = self.client.get(reverse('api_recommendations:api_item_export'),
+                                   {'export_format': 'csv', 'user': self.user_1.pk})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(lines[0], 'pk,name,description,count_likes,created_at,updated_at,user,category')
+        created_at = Item.objects.get(pk=self.item_1.pk).created_at.isoformat()
+        self.assertEqual(lines[1], f'{self.item_1.pk},test_1,test,0,{created_at},,{self.user_1.pk},')
+
+    def test_likes_export_is_limited_to_own_likes(self):
+        self.client.force_authenticate(user=self.user_1)
+
+        response = self.client.get(reverse('api_recommendations:api_like_export'))
+        self.assertEqual([like['item'] for like in self.read_ndjson(response)], [self.item_2.pk, self.item_3.pk])
+
+        self.client.force_authenticate(user=self.admin)
+
+        response = self.client.get(reverse('api_recommendations:api_like_export'),
+                                   {'item': self.item_3.pk, 'since': self.since.isoformat()})
+        self.assertEqual([like['user'] for like in self.read_ndjson(response)], [self.user_1.pk, self.user_2.pk])
+
+
+class MetricsAPITestCase(APITestCase):
+    """Класс тестирования счетчиков запросов по представлениям"""
+
+    def setUp(self):
+        reset_likes_stores()
+        metrics.metrics_registry.reset()
+
+        self.user_1 = User.objects.create(email='user_1@test.com', password='password', phone="88005553535")
+        self.user_2 = User.objects.create(email='user_2@test.com', password='password', phone="88005553535")
+        self.admin = User.objects.create(email='admin@test.com', password='password', phone="88005553535",
+                                         is_staff=True)
+
+        self.item_1 = Item.objects.create(name="test_1", description="test", is_published=True)
+        self.item_2 = Item.objects.create(name="test_2", description="test", is_published=True)
+
+        Like.objects.create(user=self.user_1, item=self.item_1)
+        Like.objects.create(user=self.user_2, item=self.item_1)
+        Like.objects.create(user=self.user_2, item=self.item_2)
+
+    def tearDown(self):
+        reset_likes_stores()
+        metrics.metrics_registry.reset()
+
+    def test_sampled_request_is_counted(self):
+        self.client.force_authenticate(user=self.user_1)
+
+        with mock.patch.object(metrics.settings, 'METRICS_ENABLED', True), \
+                mock.patch.object(metrics.settings, 'METRICS_SAMPLE_RATE', 1.0), \
+                mock.patch.object(metrics.settings, 'METRICS_SERVER_TIMING', True), \
+                mock.patch.object(metrics.settings, 'RECOMMENDER_ENGINE', 'networkx'):
+            response = self.client.get(reverse('api_recommendations:api_item_recommended'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('collaborative_filtering_alg;dur=', response['Server-Timing'])
+        self.assertIn('create_likes_graph;dur=', response['Server-Timing'])
+
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(reverse('api_recommendations:api_metrics'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+
+        text = response.content.decode()
+        self.assertIn('inspire_requests_total{view="api_recommendations:api_item_recommended"} 1', text)
+        self.assertIn('inspire_function_calls_total{view="api_recommendations:api_item_recommended",'
+                      'function="collaborative_filtering_alg"} 1', text)
+        queries = next(line for line in text.splitlines() if line.startswith('inspire_db_queries_total'))
+        self.assertGreater(int(queries.rsplit(' ', 1)[1]), 0)
+
+    def test_not_sampled_request_is_skipped(self):
+        self.client.force_authenticate(user=self.user_1)
+
+        with mock.patch.object(metrics.settings, 'METRICS_ENABLED', True), \
+                mock.patch.object(metrics.settings, 'METRICS_SAMPLE_RATE', 0.0):
+            response = self.client.get(reverse('api_recommendations:api_item_recommended'))
+
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(metrics.metrics_registry.views, {})
+
+    def test_metrics_staff_only(self):
+        self.client.force_authenticate(user=self.user_1)
+        response = self.client.get(reverse('api_recommendations:api_metrics'))
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
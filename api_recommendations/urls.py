@@ -2,7 +2,8 @@ from django.urls import path
 from api_recommendations.apps import ApiRecommendationsConfig
 from api_recommendations.views import ItemCreateAPIView, ItemUpdateAPIView, ItemDestroyAPIView, ItemRetrieveAPIView, \
     ItemListAPIView, UserItemListAPIView, RecommendedItemsAPIView, UserLikeListAPIView, like_item, unlike_item, \
-    StatisticAPIView
+    StatisticAPIView, ItemListCacheStatsAPIView, recommended_items_async, statistic_async, MetricsAPIView, \
+    RecommendationTracesAPIView, BatchRecommendationsAPIView, ItemExportAPIView, LikeExportAPIView
 
 app_name = ApiRecommendationsConfig.name
 
@@ -14,13 +15,22 @@ urlpatterns = [
     path('item/delete/<int:pk>/', ItemDestroyAPIView.as_view(), name='api_item_delete'),
     path('user-items/', UserItemListAPIView.as_view(), name='api_user_item_list'),
     path('item/create/', ItemCreateAPIView.as_view(), name='api_item_create'),
+    path('export/items/', ItemExportAPIView.as_view(), name='api_item_export'),
 
     path('like-item/', like_item, name='api_item_like'),
     path('unlike-item/', unlike_item, name='api_item_unlike'),
 
     path('user-likes/', UserLikeListAPIView.as_view(), name='api_user_like_list'),
+    path('export/likes/', LikeExportAPIView.as_view(), name='api_like_export'),
 
     path('recommendations/', RecommendedItemsAPIView.as_view(), name='api_item_recommended'),
+    path('recommendations/async/', recommended_items_async, name='api_item_recommended_async'),
+    path('recommendations/batch/', BatchRecommendationsAPIView.as_view(), name='api_item_recommended_batch'),
 
-    path('statistic/', StatisticAPIView.as_view(), name='api_statistic')
+    path('statistic/', StatisticAPIView.as_view(), name='api_statistic'),
+    path('statistic/async/', statistic_async, name='api_statistic_async'),
+
+    path('cache-stats/', ItemListCacheStatsAPIView.as_view(), name='api_cache_stats'),
+    path('metrics/', MetricsAPIView.as_view(), name='api_metrics'),
+    path('traces/', RecommendationTracesAPIView.as_view(), name='api_traces'),
 ]
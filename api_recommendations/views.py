@@ -1,26 +1,43 @@
+from asgiref.sync import sync_to_async
+from django.db.models import F, Q
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import generics, status
 from rest_framework.decorators import api_view
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.filters import OrderingFilter
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from api_recommendations.paginators import ItemPaginator
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from config.metrics import metrics_registry
+from api_recommendations.paginators import SelectablePaginationMixin, PAGINATION_MODES, ItemPaginator
 from api_recommendations.permissions import IsOwner, DoesHaveLikes
+from api_recommendations.renderers import PrometheusRenderer
+from api_recommendations.streaming import iter_ndjson, NDJSON_CONTENT_TYPE, export_response
 from api_recommendations.serializers import LikeRequestSerializer, LikeSerializer, ItemSerializer, \
-    PaginatedItemResponseSerializer, StatisticSerializer
+    PaginatedItemResponseSerializer, StatisticSerializer, CacheStatsSerializer, BatchRecommendationsRequestSerializer, \
+    ItemExportQuerySerializer, LikeExportQuerySerializer
 from recommendations.models import Item, Like
-from recommendations.services import collaborative_filtering_alg, NOW, get_statistics
+from recommendations.tracing import get_recent_traces
+from recommendations.services import get_recommended_items, get_statistics, SCORING_MODES, \
+    update_popular_items, create_like, delete_like, new_shuffle_seed, \
+    shuffle_items, get_item_list_cache_stats, aget_recommended_items, aget_statistics, LEADERBOARD_WINDOWS, \
+    get_recommended_items_batch, parse_shuffle_seed
 from users.models import User
 
+ITEM_EXPORT_FIELDS = ('pk', 'name', 'description', 'count_likes', 'created_at', 'updated_at', 'user', 'category')
+LIKE_EXPORT_FIELDS = ('pk', 'user', 'item', 'created_at')
 
-class UserItemListAPIView(generics.ListAPIView):
+
+class UserItemListAPIView(SelectablePaginationMixin, generics.ListAPIView):
     """API-Контроллер для получения списка элементов текущего пользователя"""
 
     serializer_class = ItemSerializer
-    pagination_class = ItemPaginator
+    cursor_ordering = ('-created_at', 'pk')
 
     filter_backends = [OrderingFilter, DjangoFilterBackend]
     ordering_fields = ['name']
@@ -31,43 +48,91 @@ class UserItemListAPIView(generics.ListAPIView):
         return super().get_queryset()
 
 
-class UserLikeListAPIView(generics.ListAPIView):
+class UserLikeListAPIView(SelectablePaginationMixin, generics.ListAPIView):
     """API-Контроллер для получения списка понравившихся элементов текущего пользователя"""
 
     serializer_class = ItemSerializer
-    pagination_class = ItemPaginator
+    cursor_ordering = ('-liked_at', 'pk')
 
     filter_backends = [OrderingFilter, DjangoFilterBackend]
     ordering_fields = ['name']
     filterset_fields = ('name', 'description')
 
     def get_queryset(self):
-        user_likes = Like.objects.filter(user=self.request.user).order_by('-created_at'). \
-            values_list('item_id', flat=True)
-
-        self.queryset = Item.objects.filter(pk__in=user_likes)
+        # Аннотация после фильтра использует то же соединение с лайками, поэтому liked_at - дата лайка пользователя
+        self.queryset = Item.objects.filter(like__user=self.request.user). \
+            annotate(liked_at=F('like__created_at')). \
+            order_by('-liked_at', 'pk')
         return super().get_queryset()
 
 
-class ItemListAPIView(generics.ListAPIView):
+class ItemListAPIView(SelectablePaginationMixin, generics.ListAPIView):
     """API-Контроллер для получения списка всех элементов"""
 
     serializer_class = ItemSerializer
     permission_classes = [AllowAny]
-    pagination_class = ItemPaginator
+    cursor_ordering = ('-count_likes', 'pk')
 
     filter_backends = [OrderingFilter, DjangoFilterBackend]
     ordering_fields = ['name']
     filterset_fields = ('name', 'description')
 
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('seed', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              description='Зерно перемешивания, с одним зерном порядок одинаков на всех страницах'),
+            openapi.Parameter('pagination', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=list(PAGINATION_MODES),
+                              description='Пагинация по номеру страницы или курсорная по числу лайков'),
+        ]
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
     def get_queryset(self):
         if self.request.user.is_authenticated:
-            self.queryset = Item.objects.exclude(user=self.request.user).order_by('?')
+            self.queryset = Item.objects.exclude(user=self.request.user)
         else:
-            self.queryset = Item.objects.order_by('?')
+            self.queryset = Item.objects.all()
 
         return super().get_queryset()
 
+    def paginate_queryset(self, queryset):
+        # Перемешиваются уже отфильтрованные элементы, курсорная пагинация и параметр ordering задают свой порядок
+        if isinstance(self.paginator, ItemPaginator) and not self.request.query_params.get('ordering'):
+            # Зерно передается в ссылках на страницы, а не в сессии: клиенты API не отправляют cookie
+            seed = self.request.query_params.get('seed') or new_shuffle_seed()
+            self.paginator.link_params = {'seed': seed}
+            queryset = shuffle_items(queryset, parse_shuffle_seed(seed))
+
+        return super().paginate_queryset(queryset)
+
+
+class ItemExportAPIView(APIView):
+    """API-Контроллер потоковой выгрузки элементов в формате NDJSON или CSV для синхронизации"""
+
+    @swagger_auto_schema(
+        query_serializer=ItemExportQuerySerializer(),
+        responses={
+            200: f'Строки NDJSON или CSV с полями {", ".join(ITEM_EXPORT_FIELDS)} в порядке pk',
+        }
+    )
+    def get(self, request):
+        serializer = ItemExportQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+
+        items = Item.objects.order_by('pk')
+        if 'category' in params:
+            items = items.filter(category_id=params['category'])
+        if 'user' in params:
+            items = items.filter(user_id=params['user'])
+        if 'since' in params:
+            # Новые элементы без даты обновления выгружаются по дате создания
+            items = items.filter(Q(updated_at__gte=params['since']) |
+                                 Q(updated_at__isnull=True, created_at__gte=params['since']))
+
+        return export_response(items, ITEM_EXPORT_FIELDS, params['export_format'], 'items')
+
 
 class ItemRetrieveAPIView(generics.RetrieveAPIView):
     """API-Контроллер для получения одного элемента"""
@@ -86,7 +151,7 @@ class ItemCreateAPIView(generics.CreateAPIView):
     def perform_create(self, serializer):
         item = serializer.save()
         item.user = self.request.user
-        item.created_at = NOW
+        item.created_at = timezone.now()
         item.save()
 
 
@@ -99,7 +164,7 @@ class ItemUpdateAPIView(generics.UpdateAPIView):
 
     def perform_update(self, serializer):
         item = serializer.save()
-        item.updated_at = NOW
+        item.updated_at = timezone.now()
         item.save()
 
 
@@ -127,20 +192,17 @@ def like_item(request):
     serializer.is_valid(raise_exception=True)
     item_pk = serializer.validated_data['item']
 
-    item = Item.objects.get(pk=item_pk)
+    created = create_like(request.user, item_pk)
 
-    if item.user == request.user or Like.objects.filter(user=request.user, item=item):
+    if created is None:
         return Response(
             {"Error": "Вы не можете лайкать свои элементы и не можете поставить лайк второй раз!"},
             status=status.HTTP_403_FORBIDDEN
         )
 
-    like = Like.objects.create(user=request.user, item=item)
-    like.created_at = NOW
-    item.count_likes += 1
+    like, count_likes = created
 
-    item.save()
-    like.save()
+    update_popular_items(item_pk, count_likes)
 
     serializer = LikeSerializer(like)
 
@@ -164,41 +226,103 @@ def unlike_item(request):
     item_pk = serializer.validated_data['item']
 
     item = Item.objects.get(pk=item_pk)
-    like = Like.objects.filter(user=request.user, item=item)
 
-    if not like:
+    if not delete_like(request.user, item):
         return Response({"Error": "Вы не можете убрать лайк с еще не понравившегося элемента!"},
                         status=status.HTTP_403_FORBIDDEN)
 
-    like.delete()
-
-    item.count_likes -= 1
-    item.save()
+    update_popular_items(item.pk, item.count_likes)
 
     return Response({"Message": "Лайк успешно убран!"}, status=status.HTTP_200_OK)
 
 
-class RecommendedItemsAPIView(APIView):
+class LikeExportAPIView(APIView):
+    """API-Контроллер потоковой выгрузки лайков в формате NDJSON или CSV, пользователю доступны только свои лайки"""
+
+    @swagger_auto_schema(
+        query_serializer=LikeExportQuerySerializer(),
+        responses={
+            200: f'Строки NDJSON или CSV с полями {", ".join(LIKE_EXPORT_FIELDS)} в порядке pk',
+        }
+    )
+    def get(self, request):
+        serializer = LikeExportQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+
+        likes = Like.objects.order_by('pk')
+        if not request.user.is_staff:
+            likes = likes.filter(user=request.user)
+        if 'user' in params:
+            likes = likes.filter(user_id=params['user'])
+        if 'item' in params:
+            likes = likes.filter(item_id=params['item'])
+        if 'category' in params:
+            likes = likes.filter(item__category_id=params['category'])
+        if 'since' in params:
+            likes = likes.filter(created_at__gte=params['since'])
+
+        return export_response(likes, LIKE_EXPORT_FIELDS, params['export_format'], 'likes')
+
+
+class RecommendedItemsAPIView(SelectablePaginationMixin, APIView):
     """API-Контроллер для получения списка рекомендованных элементов"""
 
-    pagination_class = ItemPaginator
     permission_classes = [DoesHaveLikes]
+    cursor_ordering = ('rank', 'pk')
 
     @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('scoring', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=list(SCORING_MODES),
+                              description='Алгоритм ранжирования похожих пользователей'),
+            openapi.Parameter('pagination', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=list(PAGINATION_MODES),
+                              description='Пагинация по номеру страницы или курсорная по позиции рекомендации'),
+        ],
         responses={
             200: PaginatedItemResponseSerializer(),
+            400: openapi.Response("Неизвестный алгоритм ранжирования!"),
         }
     )
     def get(self, request):
-        recommended_items_ids = collaborative_filtering_alg(request.user.email)
-        recommended_items = Item.objects.filter(pk__in=recommended_items_ids).order_by('-count_likes')
+        scoring = request.query_params.get('scoring', 'overlap')
+
+        if scoring not in SCORING_MODES:
+            return Response({"Error": f"Неизвестный алгоритм ранжирования! Доступны: {', '.join(SCORING_MODES)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        recommended_items = get_recommended_items(request.user.pk, scoring=scoring)
 
-        paginator = self.pagination_class()
-        paginated_items = paginator.paginate_queryset(recommended_items, request)
+        paginated_items = self.paginator.paginate_queryset(recommended_items, request, view=self)
 
         serializer = ItemSerializer(paginated_items, many=True)
 
-        return paginator.get_paginated_response(serializer.data)
+        return self.paginator.get_paginated_response(serializer.data)
+
+
+class BatchRecommendationsAPIView(APIView):
+    """API-Контроллер пакетного расчета рекомендаций для многих пользователей с потоковым ответом NDJSON"""
+
+    permission_classes = [IsAdminUser]
+
+    @swagger_auto_schema(
+        request_body=BatchRecommendationsRequestSerializer(),
+        responses={
+            200: 'Строки NDJSON вида {"user": 1, "items": [2, 3], "scores": [2.0, 1.0]} в порядке запроса',
+        }
+    )
+    def post(self, request):
+        serializer = BatchRecommendationsRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        recommendations = get_recommended_items_batch(serializer.validated_data['users'],
+                                                      serializer.validated_data['k'],
+                                                      serializer.validated_data['limit'])
+
+        records = ({'user': user_pk, 'items': [item_pk for item_pk, _ in items_scores],
+                    'scores': [score for _, score in items_scores]}
+                   for user_pk, items_scores in recommendations)
+
+        return StreamingHttpResponse(iter_ndjson(records), content_type=NDJSON_CONTENT_TYPE)
 
 
 class StatisticAPIView(APIView):
@@ -207,14 +331,26 @@ class StatisticAPIView(APIView):
     permission_classes = [DoesHaveLikes]
 
     @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('window', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=list(LEADERBOARD_WINDOWS),
+                              description='Окно популярности элементов: сутки, неделя или все время'),
+        ],
         responses={
             200: StatisticSerializer(),
+            400: openapi.Response("Неизвестное окно популярности!"),
         }
     )
     def get(self, request):
-        same_interest_users, most_popular_items = get_statistics(request.user.email)
+        window = request.query_params.get('window', 'all')
+
+        if window not in LEADERBOARD_WINDOWS:
+            return Response({"Error": f"Неизвестное окно популярности! Доступны: {', '.join(LEADERBOARD_WINDOWS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
 
-        same_interest_users = User.objects.filter(email__in=same_interest_users)
+        same_interest_users, most_popular_items = get_statistics(request.user.pk, window=window)
+
+        same_interest_users = User.objects.filter(pk__in=same_interest_users). \
+            only('pk', 'first_name', 'last_name', 'email', 'city')
 
         statistic_data = {
             'users': same_interest_users,
@@ -224,3 +360,120 @@ class StatisticAPIView(APIView):
         serializer = StatisticSerializer(statistic_data)
 
         return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+async def get_jwt_user(request):
+    """Функция JWT-аутентификации запроса в асинхронном API-контроллере, None при отсутствии или ошибке токена"""
+
+    try:
+        authenticated = await sync_to_async(JWTAuthentication().authenticate)(request)
+    except AuthenticationFailed:
+        return None
+
+    return authenticated[0] if authenticated else None
+
+
+async def check_async_permissions(request):
+    """Функция проверки доступа к асинхронным API-контроллерам рекомендаций, возвращает (пользователь, ошибка)"""
+
+    user = await get_jwt_user(request)
+
+    if user is None:
+        return None, JsonResponse({"detail": "Учетные данные не были предоставлены."},
+                                  status=status.HTTP_401_UNAUTHORIZED)
+    if not await user.like_set.aexists():
+        return None, JsonResponse({"detail": "У вас недостаточно прав для выполнения данного действия."},
+                                  status=status.HTTP_403_FORBIDDEN)
+
+    return user, None
+
+
+async def recommended_items_async(request):
+    """Асинхронный API-Контроллер для получения списка рекомендованных элементов"""
+
+    user, error_response = await check_async_permissions(request)
+    if error_response is not None:
+        return error_response
+
+    scoring = request.GET.get('scoring', 'overlap')
+
+    if scoring not in SCORING_MODES:
+        return JsonResponse({"Error": f"Неизвестный алгоритм ранжирования! Доступны: {', '.join(SCORING_MODES)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+    recommended_items = await aget_recommended_items(user.pk, scoring=scoring)
+
+    serializer = ItemSerializer(recommended_items, many=True)
+
+    return JsonResponse({'count': len(recommended_items), 'results': serializer.data}, status=status.HTTP_200_OK)
+
+
+async def statistic_async(request):
+    """Асинхронный API-Контроллер для получения статистики"""
+
+    user, error_response = await check_async_permissions(request)
+    if error_response is not None:
+        return error_response
+
+    window = request.GET.get('window', 'all')
+
+    if window not in LEADERBOARD_WINDOWS:
+        return JsonResponse({"Error": f"Неизвестное окно популярности! Доступны: {', '.join(LEADERBOARD_WINDOWS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+    same_interest_users, most_popular_items = await aget_statistics(user.pk, window=window)
+
+    statistic_data = {
+        'users': [same_user async for same_user in User.objects.filter(pk__in=same_interest_users).
+                  only('pk', 'first_name', 'last_name', 'email', 'city')],
+        'items': most_popular_items
+    }
+
+    serializer = StatisticSerializer(statistic_data)
+
+    return JsonResponse(serializer.data, status=status.HTTP_200_OK)
+
+
+class ItemListCacheStatsAPIView(APIView):
+    """API-Контроллер для получения статистики кеша списков элементов"""
+
+    permission_classes = [IsAdminUser]
+
+    @swagger_auto_schema(
+        responses={
+            200: CacheStatsSerializer(),
+        }
+    )
+    def get(self, request):
+        serializer = CacheStatsSerializer(get_item_list_cache_stats())
+
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class MetricsAPIView(APIView):
+    """API-Контроллер для получения счетчиков запросов по представлениям в формате Prometheus"""
+
+    permission_classes = [IsAdminUser]
+    renderer_classes = [PrometheusRenderer]
+
+    @swagger_auto_schema(
+        responses={
+            200: 'Счетчики в текстовом формате Prometheus',
+        }
+    )
+    def get(self, request):
+        return Response(metrics_registry.render(), status=status.HTTP_200_OK)
+
+
+class RecommendationTracesAPIView(APIView):
+    """API-Контроллер для получения последних трассировок расчета рекомендаций и статистики"""
+
+    permission_classes = [IsAdminUser]
+
+    @swagger_auto_schema(
+        responses={
+            200: 'Список трассировок с длительностью и характеристиками этапов расчета',
+        }
+    )
+    def get(self, request):
+        return Response(get_recent_traces(), status=status.HTTP_200_OK)
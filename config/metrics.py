@@ -0,0 +1,231 @@
+import contextvars
+import functools
+import random
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from config import settings
+
+# Счетчики запроса, попавшего в выборку, доступны во всех потоках и задачах, куда передается контекст
+current_metrics = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Класс счетчиков одного запроса: обращения к базе и кешу и время в функциях сервиса"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.cache = defaultdict(lambda: [0, 0])
+        self.timings = defaultdict(lambda: [0, 0.0])
+
+
+def count_query(execute, sql, params, many, context):
+    """Функция-обертка выполнения SQL, учитывающая запрос в счетчиках текущего запроса"""
+
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+
+    started_at = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_time += time.perf_counter() - started_at
+
+
+@receiver(connection_created)
+def install_query_counter(sender, connection, **kwargs):
+    """Обработчик подключения обертки учета запросов к каждому новому соединению с базой"""
+
+    # Обертка на все время жизни соединения, как у connection.execute_wrapper, но и для потоков пулов
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+def timed(func):
+    """Декоратор учета числа вызовов и времени выполнения функции в счетчиках текущего запроса"""
+
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        metrics = current_metrics.get()
+        if metrics is None:
+            return func(*args, **kwargs)
+
+        started_at = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timing = metrics.timings[name]
+            timing[0] += 1
+            timing[1] += time.perf_counter() - started_at
+
+    return wrapper
+
+
+def record_cache_access(name, hit):
+    """Функция учета попадания или промаха кеша в счетчиках текущего запроса"""
+
+    metrics = current_metrics.get()
+    if metrics is not None:
+        metrics.cache[name][0 if hit else 1] += 1
+
+
+class MetricsRegistry:
+    """Класс накопленных в процессе счетчиков по именам представлений"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.views = {}
+
+    def add(self, view_name, metrics, duration):
+        """Метод добавления счетчиков завершенного запроса к итогам представления"""
+
+        with self._lock:
+            view = self.views.setdefault(view_name, {
+                'requests': 0, 'duration': 0.0, 'queries': 0, 'db_time': 0.0,
+                'cache': defaultdict(lambda: [0, 0]), 'timings': defaultdict(lambda: [0, 0.0]),
+            })
+
+            view['requests'] += 1
+            view['duration'] += duration
+            view['queries'] += metrics.queries
+            view['db_time'] += metrics.db_time
+
+            for name, (hits, misses) in metrics.cache.items():
+                view['cache'][name][0] += hits
+                view['cache'][name][1] += misses
+            for name, (calls, seconds) in metrics.timings.items():
+                view['timings'][name][0] += calls
+                view['timings'][name][1] += seconds
+
+    def reset(self):
+        """Метод сброса накопленных счетчиков"""
+
+        with self._lock:
+            self.views = {}
+
+    def render(self):
+        """Метод вывода счетчиков в текстовом формате Prometheus"""
+
+        samples = defaultdict(list)
+
+        with self._lock:
+            for view_name, view in sorted(self.views.items()):
+                labels = f'view="{view_name}"'
+
+                samples['requests_total'].append((labels, view['requests']))
+                samples['request_seconds_total'].append((labels, view['duration']))
+                samples['db_queries_total'].append((labels, view['queries']))
+                samples['db_seconds_total'].append((labels, view['db_time']))
+
+                for name, (hits, misses) in sorted(view['cache'].items()):
+                    samples['cache_hits_total'].append((f'{labels},cache="{name}"', hits))
+                    samples['cache_misses_total'].append((f'{labels},cache="{name}"', misses))
+                for name, (calls, seconds) in sorted(view['timings'].items()):
+                    samples['function_calls_total'].append((f'{labels},function="{name}"', calls))
+                    samples['function_seconds_total'].append((f'{labels},function="{name}"', seconds))
+
+        lines = [
+            '# HELP inspire_metrics_sample_rate Доля запросов, попадающих в счетчики',
+            '# TYPE inspire_metrics_sample_rate gauge',
+            f'inspire_metrics_sample_rate {settings.METRICS_SAMPLE_RATE}',
+        ]
+        for metric, metric_samples in samples.items():
+            lines.append(f'# TYPE inspire_{metric} counter')
+            lines.extend(f'inspire_{metric}{{{labels}}} {value}' for labels, value in metric_samples)
+
+        return '\n'.join(lines) + '\n'
+
+
+metrics_registry = MetricsRegistry()
+
+
+class RequestMetricsMiddleware:
+    """Класс middleware учета запросов к базе, обращений к кешу и времени расчетов по представлениям"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def is_sampled():
+        """Метод выбора запросов для учета, остальные запросы проходят без накладных расходов"""
+
+        return settings.METRICS_ENABLED and random.random() < settings.METRICS_SAMPLE_RATE
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        if not self.is_sampled():
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        started_at = time.perf_counter()
+
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+
+        return self.finish(request, response, metrics, time.perf_counter() - started_at)
+
+    async def __acall__(self, request):
+        if not self.is_sampled():
+            return await self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        started_at = time.perf_counter()
+
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+
+        return self.finish(request, response, metrics, time.perf_counter() - started_at)
+
+    @staticmethod
+    def finish(request, response, metrics, duration):
+        """Метод сохранения счетчиков запроса и добавления заголовка Server-Timing"""
+
+        resolver_match = getattr(request, 'resolver_match', None)
+        view_name = resolver_match.view_name if resolver_match else 'unresolved'
+
+        metrics_registry.add(view_name, metrics, duration)
+
+        if settings.METRICS_SERVER_TIMING:
+            response['Server-Timing'] = get_server_timing(metrics, duration)
+
+        return response
+
+
+def get_server_timing(metrics, duration):
+    """Функция формирования заголовка Server-Timing по счетчикам запроса"""
+
+    entries = [
+        f'total;dur={duration * 1000:.1f}',
+        f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} queries"',
+    ]
+    entries.extend(f'{name};dur={seconds * 1000:.1f};desc="{calls} calls"'
+                   for name, (calls, seconds) in metrics.timings.items())
+    entries.extend(f'cache-{name};desc="{hits} hits, {misses} misses"'
+                   for name, (hits, misses) in metrics.cache.items())
+
+    return ', '.join(entries)
@@ -35,6 +35,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'config.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -119,6 +120,43 @@ if CACHE_ENABLED:
         }
     }
 
+RECOMMENDER_ENGINE = os.getenv('RECOMMENDER_ENGINE', 'networkx')
+
+PAGERANK_DAMPING = float(os.getenv('PAGERANK_DAMPING', 0.85))
+PAGERANK_TOL = float(os.getenv('PAGERANK_TOL', 1e-6))
+PAGERANK_MAX_ITER = int(os.getenv('PAGERANK_MAX_ITER', 100))
+PAGERANK_PUSH_EPSILON = float(os.getenv('PAGERANK_PUSH_EPSILON', 1e-4))
+
+RECOMMENDATIONS_LIMIT = int(os.getenv('RECOMMENDATIONS_LIMIT', 50))
+RECOMMENDATIONS_SOURCE = os.getenv('RECOMMENDATIONS_SOURCE', 'online')
+RECOMMENDATIONS_MAX_AGE = int(os.getenv('RECOMMENDATIONS_MAX_AGE', 24 * 60 * 60))
+RECOMMENDATIONS_EXECUTOR_WORKERS = int(os.getenv('RECOMMENDATIONS_EXECUTOR_WORKERS', 4))
+RECOMMENDATIONS_PROCESS_WORKERS = int(os.getenv('RECOMMENDATIONS_PROCESS_WORKERS', 0))
+RECOMMENDATIONS_SNAPSHOT_MAX_AGE = int(os.getenv('RECOMMENDATIONS_SNAPSHOT_MAX_AGE', 60))
+RECOMMENDATIONS_BATCH_MAX_USERS = int(os.getenv('RECOMMENDATIONS_BATCH_MAX_USERS', 10000))
+RECOMMENDATIONS_BATCH_WORKERS = int(os.getenv('RECOMMENDATIONS_BATCH_WORKERS', 2))
+
+GRAPH_SNAPSHOT_DIR = os.getenv('GRAPH_SNAPSHOT_DIR')
+SPARSE_OVERLAY_MAX_CHANGES = int(os.getenv('SPARSE_OVERLAY_MAX_CHANGES', 10000))
+
+LIKE_EVENTS_RETENTION = int(os.getenv('LIKE_EVENTS_RETENTION', 60 * 60))
+LIKE_EVENTS_REPLAY_LIMIT = int(os.getenv('LIKE_EVENTS_REPLAY_LIMIT', 10000))
+LIKE_EVENTS_GAP_TIMEOUT = int(os.getenv('LIKE_EVENTS_GAP_TIMEOUT', 5))
+
+LIKES_WRITE_BEHIND = bool(os.getenv('LIKES_WRITE_BEHIND'))
+
+METRICS_ENABLED = bool(os.getenv('METRICS_ENABLED'))
+METRICS_SAMPLE_RATE = float(os.getenv('METRICS_SAMPLE_RATE', 0.01))
+METRICS_SERVER_TIMING = bool(os.getenv('METRICS_SERVER_TIMING'))
+
+TRACING_SAMPLE_RATE = float(os.getenv('TRACING_SAMPLE_RATE', 0))
+TRACING_SLOW_THRESHOLD = float(os.getenv('TRACING_SLOW_THRESHOLD', 500))
+TRACING_PROFILE_DIR = os.getenv('TRACING_PROFILE_DIR')
+TRACING_KEEP = int(os.getenv('TRACING_KEEP', 100))
+
+POPULAR_ITEMS_COUNT = int(os.getenv('POPULAR_ITEMS_COUNT', 10))
+POPULAR_ITEMS_CACHE_TIMEOUT = int(os.getenv('POPULAR_ITEMS_CACHE_TIMEOUT', 60 * 60))
+
 LOGIN_URL = 'users:user_login'
 LOGIN_REDIRECT_URL = 'recommendations:category_list'
 LOGOUT_REDIRECT_URL = 'recommendations:category_list'
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from recommendations.models import Item, Category, Like
+from recommendations.models import Item, Category, Like, UserRecommendation, LikeEvent
 
 
 @admin.register(Category)
@@ -25,3 +25,18 @@ class LikeAdmin(admin.ModelAdmin):
     """Класс добавления модели Like в административную панель"""
 
     list_display = ('pk', 'user', 'item', 'created_at',)
+
+
+@admin.register(UserRecommendation)
+class UserRecommendationAdmin(admin.ModelAdmin):
+    """Класс добавления модели UserRecommendation в административную панель"""
+
+    list_display = ('pk', 'user', 'item', 'score', 'rank', 'computed_at',)
+
+
+@admin.register(LikeEvent)
+class LikeEventAdmin(admin.ModelAdmin):
+    """Класс добавления модели LikeEvent в административную панель"""
+
+    list_display = ('sequence', 'action', 'user_id', 'item_id', 'created_at',)
+    list_filter = ('action',)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class RecommendationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recommendations'
+
+    def ready(self):
+        import recommendations.signals  # noqa: F401
@@ -0,0 +1,146 @@
+import csv
+import io
+import json
+from datetime import datetime
+from itertools import islice
+
+from django.db import connection, transaction
+
+from recommendations.models import Like, Item
+from recommendations.services import ZONE
+from users.models import User
+
+LIKE_FILE_FORMATS = ('csv', 'jsonl')
+LIKE_FILE_FIELDS = ('user', 'item', 'created_at')
+
+
+def get_file_format(path, file_format=None):
+    """Функция определения формата файла лайков по явному указанию или расширению"""
+
+    file_format = file_format or path.rsplit('.', 1)[-1].lower()
+
+    if file_format not in LIKE_FILE_FORMATS:
+        raise ValueError(f'Неизвестный формат файла лайков: {file_format}')
+    return file_format
+
+
+def parse_created_at(value):
+    """Функция разбора даты лайка из файла, даты без часового пояса считаются в TIME_ZONE"""
+
+    if not value:
+        return None
+
+    created_at = datetime.fromisoformat(value)
+    if created_at.tzinfo is None:
+        created_at = ZONE.localize(created_at)
+    return created_at
+
+
+def read_like_rows(file, file_format):
+    """Функция потокового чтения строк (email пользователя, элемент, дата) из файла CSV или JSONL"""
+
+    if file_format == 'csv':
+        records = csv.DictReader(file)
+    else:
+        records = (json.loads(line) for line in file if line.strip())
+
+    for record in records:
+        yield record['user'], int(record['item']), parse_created_at(record.get('created_at'))
+
+
+def write_like_rows(file, file_format, rows):
+    """Функция потоковой записи строк (email пользователя, элемент, дата) в файл CSV или JSONL"""
+
+    if file_format == 'csv':
+        writer = csv.writer(file)
+        writer.writerow(LIKE_FILE_FIELDS)
+
+    written_count = 0
+    for email, item_pk, created_at in rows:
+        created_at = created_at.isoformat() if created_at else ''
+
+        if file_format == 'csv':
+            writer.writerow((email, item_pk, created_at))
+        else:
+            file.write(json.dumps(dict(zip(LIKE_FILE_FIELDS, (email, item_pk, created_at))), ensure_ascii=False))
+            file.write('\n')
+        written_count += 1
+
+    return written_count
+
+
+def iter_batches(rows, batch_size):
+    """Функция разбиения потока строк на пакеты"""
+
+    rows = iter(rows)
+    while batch := list(islice(rows, batch_size)):
+        yield batch
+
+
+def copy_likes(rows, batch_size):
+    """Функция загрузки лайков в PostgreSQL через COPY во временную таблицу и один INSERT ... SELECT"""
+
+    quote_name = connection.ops.quote_name
+    like_table, item_table = quote_name(Like._meta.db_table), quote_name(Item._meta.db_table)
+    user_table = quote_name(User._meta.db_table)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('CREATE TEMPORARY TABLE like_import '
+                       '(email varchar(254), item_id bigint, created_at timestamptz) ON COMMIT DROP')
+
+        for batch in iter_batches(rows, batch_size):
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(
+                (email, item_pk, created_at.isoformat() if created_at else '') for email, item_pk, created_at in batch
+            )
+            buffer.seek(0)
+            cursor.copy_expert('COPY like_import FROM STDIN WITH (FORMAT csv)', buffer)
+
+        # Пользователи находятся по email одним соединением, повторы в файле и уже существующие лайки отбрасываются
+        cursor.execute(
+            f'INSERT INTO {like_table} (user_id, item_id, created_at) '
+            f'SELECT DISTINCT ON (u.id, i.id) u.id, i.id, COALESCE(s.created_at, now()) '
+            f'FROM like_import s JOIN {user_table} u ON u.email = s.email '
+            f'JOIN {item_table} i ON i.id = s.item_id AND (i.user_id IS NULL OR i.user_id <> u.id) '
+            f'ORDER BY u.id, i.id, s.created_at '
+            f'ON CONFLICT (user_id, item_id) DO NOTHING'
+        )
+        return cursor.rowcount
+
+
+def bulk_create_likes(rows, batch_size):
+    """Функция загрузки лайков пакетами bulk_create для баз без COPY, например SQLite"""
+
+    likes_count = Like.objects.count()
+    imported_at = datetime.now(ZONE)
+
+    with transaction.atomic():
+        for batch in iter_batches(rows, batch_size):
+            users = dict(User.objects.filter(email__in={email for email, _, _ in batch}).values_list('email', 'pk'))
+            owners = dict(Item.objects.filter(pk__in={item_pk for _, item_pk, _ in batch}).values_list('pk', 'user_id'))
+
+            likes = [
+                Like(user_id=users[email], item_id=item_pk, created_at=created_at or imported_at)
+                for email, item_pk, created_at in batch
+                if email in users and item_pk in owners and owners[item_pk] != users[email]
+            ]
+            # Повторы в пакете и уже существующие лайки отсекаются ограничением уникальности
+            Like.objects.bulk_create(likes, ignore_conflicts=True)
+
+    return Like.objects.count() - likes_count
+
+
+def import_likes(rows, batch_size=10000):
+    """Функция массовой загрузки лайков без сигналов модели, возвращает количество добавленных лайков"""
+
+    if connection.vendor == 'postgresql':
+        return copy_likes(rows, batch_size)
+    return bulk_create_likes(rows, batch_size)
+
+
+def iter_export_rows(chunk_size=10000):
+    """Функция потоковой выгрузки лайков через серверный курсор"""
+
+    return Like.objects.order_by('pk').values_list('user__email', 'item_id', 'created_at').iterator(
+        chunk_size=chunk_size
+    )
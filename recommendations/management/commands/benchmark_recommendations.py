@@ -0,0 +1,181 @@
+import json
+import random
+import statistics
+import subprocess
+import time
+from datetime import datetime
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from config import settings
+from recommendations.models import Like, Item
+from recommendations.services import likes_graph_store, sparse_likes_store, find_same_interest_users, \
+    collaborative_filtering_alg, get_statistics, ZONE
+from recommendations.synthetic import generate_synthetic_data, delete_synthetic_data
+from users.models import User
+
+LIST_ENDPOINTS = {
+    'item_list_page': ('api_recommendations:api_item_list', {}),
+    'item_list_cursor': ('api_recommendations:api_item_list', {'pagination': 'cursor'}),
+    'user_likes_page': ('api_recommendations:api_user_like_list', {}),
+}
+
+
+class Command(BaseCommand):
+    """Класс команды замеров построения графа, рекомендаций, статистики и списков на данных разного объема"""
+
+    help = 'Замеряет основные операции рекомендательной системы и сохраняет результаты в JSON для сравнения'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--likes', type=int, nargs='*', default=[],
+                            help='Объемы синтетических данных, например 10000 100000 1000000 10000000. '
+                                 'Без объемов замеряются текущие данные')
+        parser.add_argument('--seed', type=int, default=0, help='Зерно генератора данных и выборки пользователей')
+        parser.add_argument('--repeat', type=int, default=3, help='Количество повторов каждого замера')
+        parser.add_argument('--samples', type=int, default=20,
+                            help='Количество пользователей в замерах на пользователя')
+        parser.add_argument('--keep-data', action='store_true', help='Не удалять синтетические данные после замеров')
+        parser.add_argument('--output', help='Файл для сохранения результатов в формате JSON')
+        parser.add_argument('--label', default='current', help='Метка замера, например номер коммита')
+        parser.add_argument('--compare', help='Файл предыдущего замера для сравнения медиан')
+
+    def handle(self, *args, **options):
+        report = {
+            'label': options['label'],
+            'commit': self.get_commit(),
+            'vendor': connection.vendor,
+            'engine': settings.RECOMMENDER_ENGINE,
+            'created_at': datetime.now(ZONE).isoformat(),
+            'scales': {},
+        }
+
+        try:
+            for likes_count in options['likes'] or [None]:
+                scale = str(likes_count) if likes_count else 'current'
+                report['scales'][scale] = self.run_scale(likes_count, options)
+        finally:
+            if options['likes'] and not options['keep_data']:
+                delete_synthetic_data()
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+
+        previous = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                previous = json.load(file)
+
+        self.print_report(report, previous)
+
+    @staticmethod
+    def get_commit():
+        """Метод получения текущего коммита для привязки результатов замера"""
+
+        try:
+            return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                  check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def run_scale(self, likes_count, options):
+        """Метод замеров на одном объеме данных, при заданном объеме данные генерируются заново"""
+
+        result = {}
+
+        if likes_count:
+            delete_synthetic_data()
+
+            started_at = time.perf_counter()
+            result.update(generate_synthetic_data(max(likes_count // 20, 100), max(likes_count // 100, 50),
+                                                  likes_count, seed=options['seed']))
+            result['generate_seconds'] = time.perf_counter() - started_at
+        else:
+            result.update(users_count=User.objects.count(), items_count=Item.objects.count(),
+                          likes_count=Like.objects.count())
+
+        user_pks = list(Like.objects.order_by('user_id').values_list('user_id', flat=True).distinct())
+        if not user_pks:
+            raise CommandError('Для замеров нужен хотя бы один лайк')
+        sample = random.Random(options['seed']).sample(user_pks, min(options['samples'], len(user_pks)))
+
+        repeat = options['repeat']
+        result['benchmarks'] = {
+            'graph_build': self.measure(lambda _: self.rebuild(likes_graph_store), [None], repeat),
+            'sparse_build': self.measure(lambda _: self.rebuild(sparse_likes_store), [None], repeat),
+            'knn': self.measure(lambda user_pk: find_same_interest_users(user_pk, 5), sample, repeat),
+            'recommendations': self.measure(collaborative_filtering_alg, sample, repeat),
+            'statistics': self.measure(lambda user_pk: list(get_statistics(user_pk)[1]), sample, repeat),
+            **self.measure_endpoints(sample, repeat),
+        }
+
+        return result
+
+    @staticmethod
+    def rebuild(store):
+        """Метод полной пересборки хранилища графа"""
+
+        store.reset()
+        store.get_graph()
+
+    @staticmethod
+    def measure(func, args, repeat):
+        """Метод замера времени вызовов func для каждого аргумента, возвращает статистику в миллисекундах"""
+
+        timings = []
+        for _ in range(repeat):
+            for arg in args:
+                started_at = time.perf_counter()
+                func(arg)
+                timings.append((time.perf_counter() - started_at) * 1000)
+
+        timings.sort()
+
+        return {
+            'calls': len(timings),
+            'min': timings[0],
+            'median': statistics.median(timings),
+            'p95': timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+            'max': timings[-1],
+        }
+
+    def measure_endpoints(self, sample, repeat):
+        """Метод замера постраничных списков API от имени пользователей выборки"""
+
+        users = User.objects.in_bulk(sample)
+        client = APIClient()
+
+        def request(url, params):
+            def send(user_pk):
+                client.force_authenticate(users[user_pk])
+                response = client.get(url, params)
+                if response.status_code != 200:
+                    raise CommandError(f'{url} вернул {response.status_code}')
+
+            return send
+
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            return {name: self.measure(request(reverse(url_name), params), sample, repeat)
+                    for name, (url_name, params) in LIST_ENDPOINTS.items()}
+
+    def print_report(self, report, previous=None):
+        """Метод вывода медиан замеров, при наличии предыдущего замера - вместе с изменением"""
+
+        for scale, result in report['scales'].items():
+            self.stdout.write(f'{scale}: {result["likes_count"]} лайков, {result["users_count"]} пользователей, '
+                              f'{result["items_count"]} элементов')
+
+            previous_benchmarks = (previous or {}).get('scales', {}).get(scale, {}).get('benchmarks', {})
+
+            for name, timings in result['benchmarks'].items():
+                line = f'  {name}: median {timings["median"]:.3f} мс, p95 {timings["p95"]:.3f} мс'
+
+                if name in previous_benchmarks:
+                    previous_median = previous_benchmarks[name]['median']
+                    line += f' (было {previous_median:.3f} мс в замере {previous["label"]}, ' \
+                            f'x{timings["median"] / previous_median:.2f})'
+
+                self.stdout.write(line)
@@ -0,0 +1,56 @@
+from django.core.cache import cache
+from django.core.management import BaseCommand, CommandError
+from recommendations.services import get_redis_client, POPULAR_ITEMS_KEY
+
+
+class Command(BaseCommand):
+    """Класс команды отчета о потреблении памяти Redis ключами кеша статистики"""
+
+    help = 'Показывает память Redis, занятую кешем популярных элементов, и удаляет устаревшие пользовательские ключи'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--purge-legacy', action='store_true',
+                            help='Удалить ключи most_popular_items_<пользователь> старого формата')
+
+    def handle(self, *args, **options):
+        redis_client = get_redis_client()
+
+        if redis_client is None:
+            raise CommandError('Отчет доступен только для бэкенда кеша Redis')
+
+        before = self.get_report(redis_client)
+        self.print_report('До очистки' if options['purge_legacy'] else 'Текущее состояние', before)
+
+        if options['purge_legacy']:
+            legacy_keys = list(redis_client.scan_iter(match=cache.make_key(f'{POPULAR_ITEMS_KEY}_*')))
+
+            for i in range(0, len(legacy_keys), 1000):
+                redis_client.delete(*legacy_keys[i:i + 1000])
+
+            self.print_report('После очистки', self.get_report(redis_client))
+
+    @staticmethod
+    def get_report(redis_client):
+        """Метод сбора объема памяти Redis и ключей кеша популярных элементов"""
+
+        legacy_keys_count = 0
+        legacy_keys_bytes = 0
+        for key in redis_client.scan_iter(match=cache.make_key(f'{POPULAR_ITEMS_KEY}_*')):
+            legacy_keys_count += 1
+            legacy_keys_bytes += redis_client.memory_usage(key) or 0
+
+        return {
+            'used_memory': redis_client.info('memory')['used_memory'],
+            'legacy_keys_count': legacy_keys_count,
+            'legacy_keys_bytes': legacy_keys_bytes,
+            'global_key_bytes': redis_client.memory_usage(cache.make_key(POPULAR_ITEMS_KEY)) or 0,
+        }
+
+    def print_report(self, title, report):
+        """Метод вывода отчета"""
+
+        self.stdout.write(title)
+        self.stdout.write(f'  Память Redis: {report["used_memory"]} байт')
+        self.stdout.write(f'  Ключи most_popular_items_<пользователь>: {report["legacy_keys_count"]} шт., '
+                          f'{report["legacy_keys_bytes"]} байт')
+        self.stdout.write(f'  Глобальный ключ {POPULAR_ITEMS_KEY}: {report["global_key_bytes"]} байт')
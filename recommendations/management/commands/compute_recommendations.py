@@ -0,0 +1,73 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from django.core.management import BaseCommand
+from django.db import connections, transaction
+from config import settings
+from recommendations.models import Like, UserRecommendation
+from recommendations.services import compute_recommendations_chunk, get_likes_store, ZONE
+
+
+class Command(BaseCommand):
+    """Класс команды пакетного расчета рекомендаций для всех пользователей"""
+
+    help = 'Рассчитывает рекомендации для всех пользователей и сохраняет их в таблицу UserRecommendation'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help='Количество процессов для расчета')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Количество пользователей, обрабатываемых и сохраняемых за один раз')
+        parser.add_argument('--k', type=int, default=5, help='Количество ближайших пользователей')
+        parser.add_argument('--limit', type=int, default=settings.RECOMMENDATIONS_LIMIT,
+                            help='Количество рекомендаций на пользователя')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+
+        user_pks = list(Like.objects.order_by('user_id').values_list('user_id', flat=True).distinct())
+        chunks = [user_pks[i:i + chunk_size] for i in range(0, len(user_pks), chunk_size)]
+
+        # Граф строится один раз до запуска процессов и наследуется ими при fork
+        get_likes_store().get_graph()
+
+        if options['workers'] > 1:
+            connections.close_all()
+
+            with ProcessPoolExecutor(options['workers'], mp_context=multiprocessing.get_context('fork')) as executor:
+                results = executor.map(compute_recommendations_chunk, chunks, [options['k']] * len(chunks),
+                                       [options['limit']] * len(chunks))
+                computed_count = sum(self.save_recommendations(result) for result in results)
+        else:
+            computed_count = sum(
+                self.save_recommendations(compute_recommendations_chunk(chunk, options['k'], options['limit']))
+                for chunk in chunks
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Рассчитано {computed_count} рекомендаций для {len(user_pks)} пользователей'
+        ))
+
+    @staticmethod
+    def save_recommendations(recommendations):
+        """Метод сохранения рекомендаций группы пользователей"""
+
+        computed_at = datetime.now(ZONE)
+
+        user_recommendations = [
+            UserRecommendation(user_id=user_pk, item_id=item_pk, score=score, rank=rank, computed_at=computed_at)
+            for user_pk, items_scores in recommendations.items()
+            for rank, (item_pk, score) in enumerate(items_scores, start=1)
+        ]
+
+        # Пользователь без рекомендаций получает строку без элемента, чтобы не пересчитываться на каждый запрос
+        user_recommendations += [
+            UserRecommendation(user_id=user_pk, score=0, rank=0, computed_at=computed_at)
+            for user_pk, items_scores in recommendations.items() if not items_scores
+        ]
+
+        with transaction.atomic():
+            UserRecommendation.objects.filter(user_id__in=recommendations.keys()).delete()
+            UserRecommendation.objects.bulk_create(user_recommendations, batch_size=1000)
+
+        return len(user_recommendations)
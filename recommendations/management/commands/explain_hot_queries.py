@@ -0,0 +1,90 @@
+import json
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from config import settings
+from recommendations.models import Item, Like
+
+
+class Command(BaseCommand):
+    """Класс команды сбора планов выполнения основных запросов к лайкам и элементам"""
+
+    help = 'Сохраняет EXPLAIN ANALYZE основных запросов в JSON для сравнения до и после изменения индексов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Файл для сохранения планов в формате JSON')
+        parser.add_argument('--label', default='current', help='Метка замера, например before или after')
+        parser.add_argument('--compare', help='Файл предыдущего замера для сравнения времени выполнения')
+
+    def handle(self, *args, **options):
+        # Одни и те же параметры запросов в каждом замере, чтобы планы можно было сравнивать
+        like = Like.objects.order_by('pk').first()
+        item = Item.objects.filter(category__isnull=False).order_by('pk').first()
+
+        if like is None or item is None:
+            raise CommandError('Для замера нужны элементы с категорией и хотя бы один лайк')
+
+        report = {
+            'label': options['label'],
+            'vendor': connection.vendor,
+            'likes_count': Like.objects.count(),
+            'items_count': Item.objects.count(),
+            'queries': {name: self.explain(queryset) for name, queryset in self.get_queries(like, item).items()},
+        }
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+
+        previous = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                previous = json.load(file)
+
+        self.print_report(report, previous)
+
+    @staticmethod
+    def get_queries(like, item):
+        """Метод получения запросов, которые выполняются на каждом обращении к сайту и API"""
+
+        return {
+            'like_by_user_item': Like.objects.filter(user_id=like.user_id, item_id=like.item_id),
+            'likes_by_user': Like.objects.filter(user_id=like.user_id).order_by('-created_at')[:10],
+            'likes_by_item': Like.objects.filter(item_id=like.item_id).values_list('user_id', flat=True),
+            'items_by_category': Item.objects.filter(category_id=item.category_id, is_published=True).
+            order_by('-count_likes')[:10],
+            'items_by_user': Item.objects.filter(user_id=item.user_id).order_by('-created_at')[:10],
+            'popular_items': Item.objects.filter(count_likes__gt=0).order_by('-count_likes', 'pk').
+            values('pk', 'count_likes')[:settings.POPULAR_ITEMS_COUNT + 1],
+        }
+
+    @staticmethod
+    def explain(queryset):
+        """Метод получения плана запроса, для PostgreSQL с фактическим временем выполнения"""
+
+        if connection.vendor != 'postgresql':
+            return {'plan': queryset.explain(), 'execution_time': None}
+
+        plan = json.loads(queryset.explain(format='json', analyze=True, buffers=True))[0]
+
+        return {'plan': plan, 'execution_time': plan['Execution Time']}
+
+    def print_report(self, report, previous=None):
+        """Метод вывода времени выполнения запросов, при наличии предыдущего замера - вместе с ним"""
+
+        self.stdout.write(f'{report["label"]}: {report["likes_count"]} лайков, {report["items_count"]} элементов')
+
+        for name, result in report['queries'].items():
+            line = f'  {name}: {self.format_time(result["execution_time"])}'
+
+            if previous and name in previous['queries']:
+                line += f' (было {self.format_time(previous["queries"][name]["execution_time"])} ' \
+                        f'в замере {previous["label"]})'
+
+            self.stdout.write(line)
+
+    @staticmethod
+    def format_time(execution_time):
+        """Метод форматирования времени выполнения запроса"""
+
+        return 'н/д' if execution_time is None else f'{execution_time:.3f} мс'
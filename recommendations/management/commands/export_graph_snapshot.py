@@ -0,0 +1,36 @@
+from django.core.management import BaseCommand, CommandError
+from config import settings
+from recommendations.services import iter_like_pairs, get_settled_like_event_sequence, compact_like_events
+from recommendations.snapshots import export_snapshot
+from recommendations.sparse import SparseLikesMatrix
+
+
+class Command(BaseCommand):
+    """Класс команды выгрузки снимка матриц лайков на диск для быстрого старта воркеров"""
+
+    help = 'Сохраняет CSR-матрицы лайков в новую версию снимка, которую воркеры открывают через mmap'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--directory', default=settings.GRAPH_SNAPSHOT_DIR,
+                            help='Каталог снимков, по умолчанию GRAPH_SNAPSHOT_DIR')
+        parser.add_argument('--keep', type=int, default=2, help='Количество хранимых версий снимка')
+        parser.add_argument('--compact', action='store_true',
+                            help='Удалить из журнала лайков учтенные в снимке события старше LIKE_EVENTS_RETENTION')
+
+    def handle(self, *args, **options):
+        if not options['directory']:
+            raise CommandError('Укажите каталог снимков в --directory или GRAPH_SNAPSHOT_DIR')
+
+        # Номер события читается до выгрузки лайков: события во время выгрузки воркеры применят повторно
+        sequence = get_settled_like_event_sequence()
+        matrix = SparseLikesMatrix.from_pairs(iter_like_pairs())
+
+        path = export_snapshot(matrix, options['directory'], sequence, options['keep'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Снимок до события {sequence} ({matrix.edges_count} лайков) сохранен в {path}'
+        ))
+
+        if options['compact']:
+            deleted = compact_like_events(sequence)
+            self.stdout.write(f'Из журнала лайков удалено событий: {deleted}')
@@ -0,0 +1,35 @@
+import sys
+
+from django.core.management import BaseCommand, CommandError
+from recommendations.bulk_likes import get_file_format, write_like_rows, iter_export_rows
+
+
+class Command(BaseCommand):
+    """Класс команды потоковой выгрузки лайков в файл CSV или JSONL"""
+
+    help = 'Выгружает лайки (email пользователя, элемент, дата) в формате, который принимает import_likes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл для выгрузки или - для стандартного вывода')
+        parser.add_argument('--format', dest='file_format', help='csv или jsonl, по умолчанию по расширению файла')
+        parser.add_argument('--chunk-size', type=int, default=10000,
+                            help='Количество строк, читаемых из серверного курсора за раз')
+
+    def handle(self, *args, **options):
+        path = options['path']
+
+        try:
+            file_format = get_file_format(path, options['file_format'] or ('csv' if path == '-' else None))
+        except ValueError as error:
+            raise CommandError(str(error))
+
+        rows = iter_export_rows(options['chunk_size'])
+
+        if path == '-':
+            write_like_rows(sys.stdout, file_format, rows)
+            return
+
+        with open(path, 'w', encoding='utf-8', newline='') as file:
+            exported_count = write_like_rows(file, file_format, rows)
+
+        self.stdout.write(self.style.SUCCESS(f'Выгружено лайков: {exported_count}'))
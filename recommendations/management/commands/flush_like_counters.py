@@ -0,0 +1,17 @@
+from django.core.management import BaseCommand
+from recommendations.services import flush_likes_deltas
+
+
+class Command(BaseCommand):
+    """Класс команды переноса накопленных в Redis изменений счетчиков лайков в базу, запускается по расписанию"""
+
+    help = 'Переносит накопленные в Redis изменения счетчиков лайков в таблицу элементов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Количество элементов в одном запросе UPDATE')
+
+    def handle(self, *args, **options):
+        flushed_count = flush_likes_deltas(options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(f'Обновлены счетчики лайков у {flushed_count} элементов'))
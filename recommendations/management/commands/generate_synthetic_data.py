@@ -0,0 +1,37 @@
+from django.core.management import BaseCommand
+from recommendations.synthetic import generate_synthetic_data, delete_synthetic_data
+
+
+class Command(BaseCommand):
+    """Класс команды генерации синтетических данных для нагрузочных замеров"""
+
+    help = 'Создает пользователей, элементы и лайки со степенным распределением активности и популярности'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Количество пользователей')
+        parser.add_argument('--items', type=int, default=500, help='Количество элементов')
+        parser.add_argument('--likes', type=int, default=10000,
+                            help='Количество генерируемых лайков, повторы отбрасываются при загрузке')
+        parser.add_argument('--categories', type=int, default=10, help='Количество категорий')
+        parser.add_argument('--seed', type=int, default=0, help='Зерно генератора для воспроизводимых данных')
+        parser.add_argument('--user-exponent', type=float, default=1.0,
+                            help='Показатель степенного распределения активности пользователей')
+        parser.add_argument('--item-exponent', type=float, default=1.1,
+                            help='Показатель степенного распределения популярности элементов')
+        parser.add_argument('--batch-size', type=int, default=10000, help='Количество строк в одном пакете загрузки')
+        parser.add_argument('--clear', action='store_true', help='Удалить ранее созданные синтетические данные')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            deleted_likes = delete_synthetic_data()
+            self.stdout.write(f'Удалены синтетические данные, лайков: {deleted_likes}')
+
+        counts = generate_synthetic_data(
+            options['users'], options['items'], options['likes'], options['categories'], options['seed'],
+            options['user_exponent'], options['item_exponent'], options['batch_size']
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано категорий: {counts["categories_count"]}, пользователей: {counts["users_count"]}, '
+            f'элементов: {counts["items_count"]}, лайков: {counts["likes_count"]}'
+        ))
@@ -0,0 +1,32 @@
+from django.core.management import BaseCommand, CommandError
+from recommendations.bulk_likes import get_file_format, read_like_rows, import_likes
+from recommendations.services import recount_likes, record_likes_reset, rebuild_leaderboards, \
+    refresh_item_popularity
+
+
+class Command(BaseCommand):
+    """Класс команды массовой загрузки лайков из файла CSV или JSONL"""
+
+    help = 'Загружает лайки (email пользователя, элемент, дата) через COPY или bulk_create и пересчитывает счетчики'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл с колонками user (email), item и необязательной created_at')
+        parser.add_argument('--format', dest='file_format', help='csv или jsonl, по умолчанию по расширению файла')
+        parser.add_argument('--batch-size', type=int, default=10000, help='Количество строк в одном пакете загрузки')
+
+    def handle(self, *args, **options):
+        try:
+            file_format = get_file_format(options['path'], options['file_format'])
+
+            with open(options['path'], encoding='utf-8', newline='') as file:
+                imported_count = import_likes(read_like_rows(file, file_format), options['batch_size'])
+        except (OSError, ValueError, KeyError) as error:
+            raise CommandError(f'Не удалось загрузить лайки: {error!r}')
+
+        # Сигналы лайков при загрузке не отправляются, поэтому счетчики, графы и лидерборды обновляются целиком
+        recount_likes()
+        record_likes_reset()
+        rebuild_leaderboards()
+        refresh_item_popularity()
+
+        self.stdout.write(self.style.SUCCESS(f'Загружено лайков: {imported_count}'))
@@ -0,0 +1,78 @@
+import json
+import statistics
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management import BaseCommand
+
+
+class Command(BaseCommand):
+    """Класс команды нагрузочного тестирования эндпоинтов, например WSGI- и ASGI-сервера"""
+
+    help = 'Отправляет параллельные запросы на каждый URL и сравнивает пропускную способность и задержки'
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+', help='Адреса для сравнения, например синхронный и асинхронный эндпоинт')
+        parser.add_argument('--requests', type=int, default=200, help='Число запросов на каждый адрес')
+        parser.add_argument('--concurrency', type=int, default=20, help='Число одновременных запросов')
+        parser.add_argument('--token', help='JWT-токен для API-эндпоинтов')
+        parser.add_argument('--sessionid', help='Cookie sessionid для эндпоинтов сайта')
+        parser.add_argument('--output', help='Файл для сохранения результатов в формате JSON')
+
+    def handle(self, *args, **options):
+        headers = {}
+        if options['token']:
+            headers['Authorization'] = f'Bearer {options["token"]}'
+        if options['sessionid']:
+            headers['Cookie'] = f'sessionid={options["sessionid"]}'
+
+        results = [self.run_load(url, headers, options['requests'], options['concurrency']) for url in options['urls']]
+
+        for result in results:
+            self.stdout.write(f'{result["url"]}: {result["rps"]:.1f} запросов/с, '
+                              f'p50 {result["p50"]:.1f} мс, p95 {result["p95"]:.1f} мс, p99 {result["p99"]:.1f} мс, '
+                              f'ошибок {result["errors"]}')
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+
+    @staticmethod
+    def send_request(url, headers):
+        """Метод отправки одного запроса, возвращает (задержка в мс, признак успеха)"""
+
+        request = urllib.request.Request(url, headers=headers)
+        started_at = time.perf_counter()
+
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                response.read()
+                success = response.status < 400
+        except OSError:
+            success = False
+
+        return (time.perf_counter() - started_at) * 1000, success
+
+    def run_load(self, url, headers, requests_count, concurrency):
+        """Метод нагрузки одного адреса и расчета пропускной способности и процентилей задержки"""
+
+        started_at = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            responses = list(executor.map(lambda _: self.send_request(url, headers), range(requests_count)))
+
+        elapsed = time.perf_counter() - started_at
+        latencies = sorted(latency for latency, _ in responses)
+        percentiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+
+        return {
+            'url': url,
+            'requests': requests_count,
+            'concurrency': concurrency,
+            'rps': requests_count / elapsed,
+            'p50': percentiles[49],
+            'p95': percentiles[94],
+            'p99': percentiles[98],
+            'errors': sum(1 for _, success in responses if not success),
+        }
@@ -0,0 +1,24 @@
+from django.core.management import BaseCommand
+from recommendations.services import rebuild_leaderboards, expire_leaderboard_buckets, refresh_item_popularity, \
+    get_leaderboard_client
+
+
+class Command(BaseCommand):
+    """Класс команды обновления лидербордов популярности, запускается по расписанию раз в час"""
+
+    help = 'Вычитает из лидербордов Redis лайки, вышедшие за окна, и обновляет материализованное представление'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Построить лидерборды Redis заново по таблице лайков')
+
+    def handle(self, *args, **options):
+        if options['rebuild'] or get_leaderboard_client() is None:
+            if rebuild_leaderboards():
+                self.stdout.write(self.style.SUCCESS('Лидерборды Redis построены по таблице лайков'))
+        else:
+            expired_count = expire_leaderboard_buckets()
+            self.stdout.write(self.style.SUCCESS(f'Из лидербордов Redis вычтено часовых корзин: {expired_count}'))
+
+        if refresh_item_popularity():
+            self.stdout.write(self.style.SUCCESS('Материализованное представление популярности обновлено'))
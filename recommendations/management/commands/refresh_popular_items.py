@@ -0,0 +1,13 @@
+from django.core.management import BaseCommand
+from recommendations.services import refresh_popular_items
+
+
+class Command(BaseCommand):
+    """Класс команды пересчета кеша самых популярных элементов, запускается по расписанию"""
+
+    help = 'Пересчитывает глобальный кеш самых популярных элементов'
+
+    def handle(self, *args, **options):
+        popular_items = refresh_popular_items()
+
+        self.stdout.write(self.style.SUCCESS(f'В кеш популярных элементов записано {len(popular_items)} элементов'))
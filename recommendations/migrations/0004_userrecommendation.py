@@ -0,0 +1,35 @@
+# Generated by Django 4.2 on 2026-10-18 16:14
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recommendations', '0003_category_item_count_likes_item_created_at_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='оценка')),
+                ('rank', models.PositiveIntegerField(verbose_name='позиция')),
+                ('computed_at', models.DateTimeField(verbose_name='дата расчета')),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='recommendations.item', verbose_name='элемент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='пользователь')),
+            ],
+            options={
+                'verbose_name': 'рекомендация',
+                'verbose_name_plural': 'рекомендации',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='userrecommendation',
+            index=models.Index(fields=['user', 'rank'], name='recommendat_user_id_e351e3_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2 on 2026-10-18 16:22
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min
+
+
+def remove_duplicate_likes(apps, schema_editor):
+    """Функция удаления повторных лайков перед созданием ограничения уникальности"""
+
+    Like = apps.get_model('recommendations', 'Like')
+    Item = apps.get_model('recommendations', 'Item')
+
+    duplicates = (Like.objects.values('user', 'item')
+                  .annotate(first_pk=Min('pk'), likes=Count('pk'))
+                  .filter(likes__gt=1))
+
+    for duplicate in duplicates.iterator():
+        Like.objects.filter(user=duplicate['user'], item=duplicate['item']).exclude(pk=duplicate['first_pk']).delete()
+        Item.objects.filter(pk=duplicate['item']).update(count_likes=F('count_likes') - (duplicate['likes'] - 1))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendations', '0004_userrecommendation'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_likes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='like',
+            constraint=models.UniqueConstraint(fields=('user', 'item'), name='unique_like_user_item'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2 on 2026-10-18 16:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendations', '0005_like_unique_user_item'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['category', 'is_published', '-count_likes'], name='item_category_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['user', '-created_at'], name='item_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(('count_likes__gt', 0)), fields=['-count_likes', 'id'], name='item_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='like',
+            index=models.Index(fields=['user', '-created_at'], name='like_user_created_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2 on 2026-10-18 16:31
+
+import random
+
+from django.db import migrations, models
+from django.db.models.functions import Random
+
+
+def fill_random_keys(apps, schema_editor):
+    """Функция заполнения ключа случайного порядка у существующих элементов"""
+
+    Item = apps.get_model('recommendations', 'Item')
+    Item.objects.update(random_key=Random())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendations', '0006_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='random_key',
+            field=models.FloatField(default=0.0, verbose_name='ключ случайного порядка'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_random_keys, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='item',
+            name='random_key',
+            field=models.FloatField(db_index=True, default=random.random, verbose_name='ключ случайного порядка'),
+        ),
+    ]
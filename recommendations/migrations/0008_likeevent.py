@@ -0,0 +1,27 @@
+# Generated by Django 4.2 on 2026-10-18 16:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendations', '0007_item_random_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LikeEvent',
+            fields=[
+                ('sequence', models.BigAutoField(primary_key=True, serialize=False, verbose_name='порядковый номер')),
+                ('action', models.CharField(choices=[('add', 'лайк поставлен'), ('remove', 'лайк убран')], max_length=6, verbose_name='действие')),
+                ('user_id', models.BigIntegerField(verbose_name='пользователь')),
+                ('item_id', models.BigIntegerField(verbose_name='элемент')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='дата создания')),
+            ],
+            options={
+                'verbose_name': 'событие лайка',
+                'verbose_name_plural': 'события лайков',
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-18 16:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendations', '0008_likeevent'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='likeevent',
+            name='action',
+            field=models.CharField(choices=[('add', 'лайк поставлен'), ('remove', 'лайк убран'), ('reset', 'лайки загружены массово')], max_length=6, verbose_name='действие'),
+        ),
+        migrations.AlterField(
+            model_name='likeevent',
+            name='item_id',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='элемент'),
+        ),
+        migrations.AlterField(
+            model_name='likeevent',
+            name='user_id',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='пользователь'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 4.2 on 2026-10-18 16:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+CREATE_ITEM_POPULARITY_SQL = [
+    """
+    CREATE MATERIALIZED VIEW recommendations_itempopularity AS
+    SELECT i.id AS item_id, i.category_id,
+           COUNT(*) FILTER (WHERE l.created_at >= now() - interval '24 hours') AS likes_24h,
+           COUNT(*) FILTER (WHERE l.created_at >= now() - interval '7 days') AS likes_7d,
+           COUNT(*) AS likes_all
+    FROM recommendations_item i JOIN recommendations_like l ON l.item_id = i.id
+    GROUP BY i.id, i.category_id
+    """,
+    # Уникальный индекс нужен для REFRESH MATERIALIZED VIEW CONCURRENTLY
+    'CREATE UNIQUE INDEX itempopularity_item_idx ON recommendations_itempopularity (item_id)',
+    'CREATE INDEX itempopularity_24h_idx ON recommendations_itempopularity (likes_24h DESC, item_id)',
+    'CREATE INDEX itempopularity_7d_idx ON recommendations_itempopularity (likes_7d DESC, item_id)',
+    'CREATE INDEX itempopularity_all_idx ON recommendations_itempopularity (likes_all DESC, item_id)',
+    'CREATE INDEX itempopularity_category_24h_idx ON recommendations_itempopularity '
+    '(category_id, likes_24h DESC, item_id)',
+    'CREATE INDEX itempopularity_category_7d_idx ON recommendations_itempopularity '
+    '(category_id, likes_7d DESC, item_id)',
+    'CREATE INDEX itempopularity_category_all_idx ON recommendations_itempopularity '
+    '(category_id, likes_all DESC, item_id)',
+]
+
+
+def create_item_popularity_view(apps, schema_editor):
+    """Функция создания материализованного представления популярности, в других базах оно заменяется запросом"""
+
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    for sql in CREATE_ITEM_POPULARITY_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_item_popularity_view(apps, schema_editor):
+    """Функция удаления материализованного представления популярности"""
+
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP MATERIALIZED VIEW IF EXISTS recommendations_itempopularity')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendations', '0009_likeevent_reset'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemPopularity',
+            fields=[
+                ('item', models.OneToOneField(on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, serialize=False, to='recommendations.item', verbose_name='элемент')),
+                ('likes_24h', models.IntegerField(verbose_name='лайков за сутки')),
+                ('likes_7d', models.IntegerField(verbose_name='лайков за неделю')),
+                ('likes_all', models.IntegerField(verbose_name='лайков за все время')),
+            ],
+            options={
+                'verbose_name': 'популярность элемента',
+                'verbose_name_plural': 'популярность элементов',
+                'db_table': 'recommendations_itempopularity',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_item_popularity_view, drop_item_popularity_view),
+    ]
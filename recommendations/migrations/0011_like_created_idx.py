@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-18 16:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendations', '0010_item_popularity'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='like',
+            index=models.Index(fields=['created_at'], name='like_created_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2 on 2026-10-18 17:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendations', '0011_like_created_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LikeCountersFlush',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('flush_id', models.CharField(max_length=32, unique=True, verbose_name='идентификатор переноса')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='дата переноса')),
+            ],
+            options={
+                'verbose_name': 'перенос счетчиков лайков',
+                'verbose_name_plural': 'переносы счетчиков лайков',
+            },
+        ),
+    ]
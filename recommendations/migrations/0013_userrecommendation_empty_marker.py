@@ -0,0 +1,19 @@
+# Generated by Django 4.2 on 2026-10-18 17:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendations', '0012_likecountersflush'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userrecommendation',
+            name='item',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='recommendations.item', verbose_name='элемент'),
+        ),
+    ]
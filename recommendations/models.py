@@ -1,3 +1,5 @@
+import random
+
 from django.db import models
 from config import settings
 
@@ -28,6 +30,7 @@ class Item(models.Model):
     created_at = models.DateTimeField(verbose_name='дата создания', **NULLABLE)
     updated_at = models.DateTimeField(verbose_name='дата последнего обновления', **NULLABLE)
     is_published = models.BooleanField(verbose_name='признак публикации', default=False)
+    random_key = models.FloatField(verbose_name='ключ случайного порядка', default=random.random, db_index=True)
 
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, verbose_name='создатель', **NULLABLE)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, verbose_name='категория', **NULLABLE)
@@ -38,6 +41,12 @@ class Item(models.Model):
     class Meta:
         verbose_name = 'элемент'
         verbose_name_plural = 'элементы'
+        indexes = [
+            models.Index(fields=['category', 'is_published', '-count_likes'], name='item_category_published_idx'),
+            models.Index(fields=['user', '-created_at'], name='item_user_created_idx'),
+            models.Index(fields=['-count_likes', 'id'], name='item_popular_idx',
+                         condition=models.Q(count_likes__gt=0)),
+        ]
 
 
 class Like(models.Model):
@@ -53,3 +62,89 @@ class Like(models.Model):
     class Meta:
         verbose_name = 'лайк'
         verbose_name_plural = 'лайки'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'item'], name='unique_like_user_item'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='like_user_created_idx'),
+            models.Index(fields=['created_at'], name='like_created_idx'),
+        ]
+
+
+class LikeEvent(models.Model):
+    """Модель события журнала изменений лайков"""
+
+    ADD = 'add'
+    REMOVE = 'remove'
+    RESET = 'reset'
+    ACTIONS = (
+        (ADD, 'лайк поставлен'),
+        (REMOVE, 'лайк убран'),
+        (RESET, 'лайки загружены массово'),
+    )
+
+    sequence = models.BigAutoField(primary_key=True, verbose_name='порядковый номер')
+    action = models.CharField(max_length=6, choices=ACTIONS, verbose_name='действие')
+    user_id = models.BigIntegerField(verbose_name='пользователь', **NULLABLE)
+    item_id = models.BigIntegerField(verbose_name='элемент', **NULLABLE)
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='дата создания')
+
+    def __str__(self):
+        return f'like event {self.sequence}: {self.action} from {self.user_id} to {self.item_id}'
+
+    class Meta:
+        verbose_name = 'событие лайка'
+        verbose_name_plural = 'события лайков'
+
+
+class LikeCountersFlush(models.Model):
+    """Модель отметки о переносе накопленных в Redis изменений счетчиков лайков в базу"""
+
+    flush_id = models.CharField(max_length=32, unique=True, verbose_name='идентификатор переноса')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='дата переноса')
+
+    def __str__(self):
+        return f'like counters flush {self.flush_id}'
+
+    class Meta:
+        verbose_name = 'перенос счетчиков лайков'
+        verbose_name_plural = 'переносы счетчиков лайков'
+
+
+class ItemPopularity(models.Model):
+    """Модель материализованного представления PostgreSQL с числом лайков элементов за периоды"""
+
+    item = models.OneToOneField(Item, on_delete=models.DO_NOTHING, primary_key=True, verbose_name='элемент')
+    category = models.ForeignKey(Category, on_delete=models.DO_NOTHING, verbose_name='категория', **NULLABLE)
+    likes_24h = models.IntegerField(verbose_name='лайков за сутки')
+    likes_7d = models.IntegerField(verbose_name='лайков за неделю')
+    likes_all = models.IntegerField(verbose_name='лайков за все время')
+
+    def __str__(self):
+        return f'popularity of {self.item_id}'
+
+    class Meta:
+        managed = False
+        db_table = 'recommendations_itempopularity'
+        verbose_name = 'популярность элемента'
+        verbose_name_plural = 'популярность элементов'
+
+
+class UserRecommendation(models.Model):
+    """Модель заранее рассчитанной рекомендации пользователю"""
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, verbose_name='пользователь')
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, verbose_name='элемент', **NULLABLE)
+    score = models.FloatField(verbose_name='оценка')
+    rank = models.PositiveIntegerField(verbose_name='позиция')
+    computed_at = models.DateTimeField(verbose_name='дата расчета')
+
+    def __str__(self):
+        return f'recommendation of {self.item} for {self.user}'
+
+    class Meta:
+        verbose_name = 'рекомендация'
+        verbose_name_plural = 'рекомендации'
+        indexes = [
+            models.Index(fields=['user', 'rank']),
+        ]
@@ -1,109 +1,1192 @@
+import asyncio
+import contextvars
+import atexit
+import bisect
+import heapq
+import random
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+
 import networkx as nx
 import pytz
-from django.core.cache import cache
+import redis
+from django.core.cache import cache, caches
+from django.core.cache.backends.redis import RedisCache
+from django.db import connection, transaction, IntegrityError, close_old_connections
+from django.db.models import Case, When, IntegerField, F, Value, OuterRef, Subquery, Count
+from django.db.models.functions import Coalesce, TruncHour
 
 from config import settings
-from datetime import datetime
-from recommendations.models import Like, Item, Category
+from config.metrics import timed, record_cache_access
+from datetime import datetime, timedelta, timezone
+from recommendations.models import Like, Item, Category, UserRecommendation, LikeEvent, ItemPopularity, \
+    LikeCountersFlush
+from recommendations.snapshots import load_snapshot
+from recommendations.sparse import SparseLikesMatrix
+from recommendations.tracing import span, traced
+from recommendations.workers import RecommendationWorkerPool
 
 ZONE = pytz.timezone(settings.TIME_ZONE)
-NOW = datetime.now(ZONE)
 
+LIKES_CHUNK_SIZE = 10000
+
+SCORING_MODES = ('overlap', 'pagerank', 'push')
+
+POPULAR_ITEMS_KEY = 'most_popular_items'
+LIKES_DELTAS_KEY = 'likes_count_deltas'
+LIKES_FLUSH_ID_FIELD = 'flush_id'
+ITEMS_SEED_KEY = 'items_shuffle_seed'
+ITEM_LIST_KEY = 'item_list'
+ITEM_LIST_HITS_KEY = 'item_list_hits'
+ITEM_LIST_MISSES_KEY = 'item_list_misses'
+SAME_INTEREST_USERS_GENERATION_KEY = 'same_interest_users_generation'
+LIKE_EVENTS_COMPACTED_KEY = 'like_events_compacted'
+
+# Окна лидербордов популярности, None - за все время
+LEADERBOARD_WINDOWS = {'24h': timedelta(hours=24), '7d': timedelta(days=7), 'all': None}
+LEADERBOARD_PREFIX = 'leaderboard'
+LEADERBOARD_BUILT_KEY = 'leaderboard_built'
+# Часовые корзины хранятся дольше самого длинного окна, чтобы успеть вычесть их из лидерборда
+LEADERBOARD_BUCKET_TIMEOUT = 8 * 24 * 60 * 60
+
+# Ограниченный пул для тяжелых расчетов из асинхронных представлений, чтобы они не занимали все потоки
+recommendations_executor = ThreadPoolExecutor(max_workers=settings.RECOMMENDATIONS_EXECUTOR_WORKERS,
+                                              thread_name_prefix='recommendations')
+
+# Отдельный пул пакетных рекомендаций, чтобы долгие пакеты не вытесняли расчеты асинхронных представлений
+batch_recommendations_executor = ThreadPoolExecutor(max_workers=settings.RECOMMENDATIONS_BATCH_WORKERS,
+                                                    thread_name_prefix='batch_recommendations')
+
+
+def get_redis_client():
+    """Функция получения клиента Redis из бэкенда кеша или None для других бэкендов"""
+
+    backend = caches['default']
+
+    if isinstance(backend, RedisCache):
+        return backend._cache.get_client(write=True)
+    return None
+
+
+def incr_cache_keys(keys):
+    """Функция увеличения счетчиков в кеше за один запрос к Redis"""
+
+    redis_client = get_redis_client()
 
+    if redis_client is None:
+        for key in keys:
+            cache.add(key, 0, timeout=None)
+            cache.incr(key)
+        return
+
+    pipeline = redis_client.pipeline(transaction=False)
+    for key in keys:
+        pipeline.incr(cache.make_and_validate_key(key))
+    pipeline.execute()
+
+
+def user_node(user_pk):
+    """Функция получения узла пользователя в графе лайков"""
+
+    return 'user', user_pk
+
+
+def iter_like_pairs(chunk_size=LIKES_CHUNK_SIZE):
+    """Функция потоковой выгрузки пар (пользователь, элемент) из таблицы лайков"""
+
+    return Like.objects.values_list('user_id', 'item_id').iterator(chunk_size=chunk_size)
+
+
+@timed
 def create_likes_graph():
     """Функция построения графа с соотношением пользователей и элементов системы"""
 
     G = nx.Graph()
 
-    likes = Like.objects.all()
-
-    for like in likes:
-        G.add_node(like.user.email, type='user')
-        G.add_node(like.item.pk, type='item')
-        G.add_edge(like.user.email, like.item.pk)
+    for user_pk, item_pk in iter_like_pairs():
+        G.add_node(user_node(user_pk), type='user')
+        G.add_node(item_pk, type='item')
+        G.add_edge(user_node(user_pk), item_pk)
 
     return G
 
 
+def record_like_event(user_pk, item_pk, liked=True):
+    """Функция записи события лайка в журнал изменений, вызывается в транзакции изменения лайка"""
+
+    return LikeEvent.objects.create(action=LikeEvent.ADD if liked else LikeEvent.REMOVE, user_id=user_pk,
+                                    item_id=item_pk)
+
+
+def record_likes_reset():
+    """Функция записи в журнал события массового изменения лайков, после которого графы строятся заново"""
+
+    like_event = LikeEvent.objects.create(action=LikeEvent.RESET)
+    transaction.on_commit(LikesGraphStore.bump_shared_version)
+    transaction.on_commit(invalidate_all_same_interest_users)
+
+    return like_event
+
+
+def get_settled_like_event_sequence():
+    """Функция получения номера последнего события журнала, записанного раньше окна ожидания транзакций"""
+
+    # Номера выдаются до коммита, и более свежие события еще могут появиться в журнале с меньшими номерами
+    horizon = datetime.now(ZONE) - timedelta(seconds=settings.LIKE_EVENTS_GAP_TIMEOUT)
+
+    return LikeEvent.objects.filter(created_at__lte=horizon).order_by('-sequence'). \
+        values_list('sequence', flat=True).first() or 0
+
+
+def compact_like_events(sequence):
+    """Функция удаления из журнала событий, учтенных в снимке и вышедших за время хранения"""
+
+    horizon = datetime.now(ZONE) - timedelta(seconds=settings.LIKE_EVENTS_RETENTION)
+
+    deleted, _ = LikeEvent.objects.filter(sequence__lte=sequence, created_at__lt=horizon).delete()
+
+    # По отметке воркеры, отставшие от сжатой части журнала, строят граф заново
+    if deleted and settings.CACHE_ENABLED:
+        cache.set(LIKE_EVENTS_COMPACTED_KEY, max(sequence, cache.get(LIKE_EVENTS_COMPACTED_KEY, 0)), timeout=None)
+
+    return deleted
+
+
+def get_compacted_like_event_sequence():
+    """Функция получения номера события, до которого включительно журнал лайков мог быть сжат"""
+
+    if settings.CACHE_ENABLED:
+        return cache.get(LIKE_EVENTS_COMPACTED_KEY, 0)
+
+    # Без общего кеша границей служит первое оставшееся событие журнала, пустой журнал считается несжатым
+    first_sequence = LikeEvent.objects.order_by('sequence').values_list('sequence', flat=True).first()
+
+    return first_sequence - 1 if first_sequence else 0
+
+
+class LikesGraphStore:
+    """Класс процессного хранилища графа лайков с инкрементальным обновлением"""
+
+    version_key = 'likes_graph_version'
+
+    def __init__(self):
+        self._graph = None
+        self._version = 0
+        self._sequence = 0
+        self._has_gap = False
+        self._lock = threading.RLock()
+
+    @classmethod
+    def get_shared_version(cls):
+        """Метод получения общей для всех воркеров версии графа"""
+
+        if settings.CACHE_ENABLED:
+            return cache.get(cls.version_key, 0)
+
+        # Без общего кеша версией служит последний номер журнала лайков, который видят все воркеры
+        return LikeEvent.objects.order_by('-sequence').values_list('sequence', flat=True).first() or 0
+
+    @classmethod
+    def bump_shared_version(cls):
+        """Метод увеличения общей для всех воркеров версии графа, без общего кеша ее меняет сам журнал"""
+
+        if not settings.CACHE_ENABLED:
+            return None
+
+        cache.add(cls.version_key, 0, timeout=None)
+        return cache.incr(cls.version_key)
+
+    def build(self):
+        """Метод построения графа, с которого начинается воспроизведение журнала лайков"""
+
+        return self.build_from_table()
+
+    def build_from_table(self):
+        """Метод построения графа по таблице лайков"""
+
+        # Номер события читается до лайков: уже учтенные в таблице события при воспроизведении применятся повторно
+        self._sequence = get_settled_like_event_sequence()
+
+        return create_likes_graph()
+
+    def read_events(self, limit=None):
+        """Метод чтения событий журнала лайков после последнего учтенного номера"""
+
+        events = LikeEvent.objects.filter(sequence__gt=self._sequence).order_by('sequence'). \
+            values_list('sequence', 'action', 'user_id', 'item_id', 'created_at')
+
+        return list(events if limit is None else events[:limit])
+
+    def replay_events(self):
+        """Метод применения к графу событий журнала лайков, записанных после последнего учтенного номера"""
+
+        limit = settings.LIKE_EVENTS_REPLAY_LIMIT
+        events = self.read_events(limit + 1)
+
+        while len(events) > limit or any(action == LikeEvent.RESET for _, action, *_ in events):
+            # Догонять длинный журнал или массовую загрузку дольше, чем заново прочитать таблицу лайков
+            resets = [sequence for sequence, action, *_ in events if action == LikeEvent.RESET]
+
+            self._graph = self.build_from_table()
+            if resets:
+                self._sequence = max(self._sequence, resets[-1])
+            events = self.read_events(limit + 1)
+
+        horizon = datetime.now(ZONE) - timedelta(seconds=settings.LIKE_EVENTS_GAP_TIMEOUT)
+        has_gap = False
+
+        for sequence, action, user_pk, item_pk, created_at in events:
+            if action == LikeEvent.ADD:
+                self.add_edge(self._graph, user_pk, item_pk)
+            else:
+                self.remove_edge(self._graph, user_pk, item_pk)
+
+            # Пропуск в номерах может занимать незавершенная транзакция: события после него прочитаются еще раз,
+            # повторное применение по порядку не меняет итоговое состояние лайка
+            if sequence != self._sequence + 1 and created_at > horizon:
+                has_gap = True
+            if not has_gap:
+                self._sequence = sequence
+
+        self._has_gap = has_gap
+
+    def is_log_expired(self):
+        """Метод проверки, что из журнала удалены еще не воспроизведенные события"""
+
+        return get_compacted_like_event_sequence() > self._sequence
+
+    def add_edge(self, graph, user_pk, item_pk):
+        """Метод добавления ребра лайка в граф"""
+
+        graph.add_node(user_node(user_pk), type='user')
+        graph.add_node(item_pk, type='item')
+        graph.add_edge(user_node(user_pk), item_pk)
+
+    def remove_edge(self, graph, user_pk, item_pk):
+        """Метод удаления ребра лайка из графа"""
+
+        if graph.has_edge(user_node(user_pk), item_pk):
+            graph.remove_edge(user_node(user_pk), item_pk)
+
+        for node in (user_node(user_pk), item_pk):
+            if node in graph and graph.degree(node) == 0:
+                graph.remove_node(node)
+
+    def get_graph(self):
+        """Метод получения графа с пересборкой при расхождении версий"""
+
+        with self._lock:
+            shared_version = self.get_shared_version()
+
+            # Сжатие журнала проверяется только когда есть что догонять, иначе удаленные события уже учтены
+            is_stale = self._graph is not None and (self._version != shared_version or self._has_gap)
+
+            if self._graph is None or is_stale and self.is_log_expired():
+                with span('build_graph', store=type(self).__name__):
+                    self._graph = self.build()
+                    self.replay_events()
+            elif is_stale:
+                with span('replay_events', store=type(self).__name__):
+                    self.replay_events()
+            self._version = shared_version
+
+            return self._graph
+
+    @contextmanager
+    def read(self):
+        """Метод блокировки графа на время чтения"""
+
+        with self._lock:
+            yield self.get_graph()
+
+    def apply_like(self, version, user_pk, item_pk, liked):
+        """Метод применения изменения лайка к графу с проверкой версии"""
+
+        with self._lock:
+            if self._graph is None or version is None:
+                return
+
+            if self._version + 1 == version:
+                if liked:
+                    self.add_edge(self._graph, user_pk, item_pk)
+                else:
+                    self.remove_edge(self._graph, user_pk, item_pk)
+                self._version = version
+            # Иначе граф успели изменить другие воркеры - их события догоним по журналу при следующем чтении
+
+    def reset(self):
+        """Метод сброса графа, следующее чтение загрузит его заново"""
+
+        with self._lock:
+            self._graph = None
+
+
+class SparseLikesStore(LikesGraphStore):
+    """Класс процессного хранилища лайков в виде разреженных матриц"""
+
+    def __init__(self):
+        super().__init__()
+        self._changes = []
+
+    def build(self):
+        self._changes = []
+
+        snapshot = self.load_snapshot()
+        if snapshot is not None:
+            header, matrix = snapshot
+            self._sequence = header['sequence']
+            return matrix
+        return self.build_from_table()
+
+    def build_from_table(self):
+        self._changes = []
+        self._sequence = get_settled_like_event_sequence()
+
+        return SparseLikesMatrix.from_pairs(iter_like_pairs())
+
+    def load_snapshot(self):
+        """Метод открытия снимка матриц с диска, события после него догоняются по журналу лайков"""
+
+        if not settings.GRAPH_SNAPSHOT_DIR:
+            return None
+
+        return load_snapshot(settings.GRAPH_SNAPSHOT_DIR)
+
+    def add_edge(self, graph, user_pk, item_pk):
+        self._changes.append((user_pk, item_pk, True))
+
+    def remove_edge(self, graph, user_pk, item_pk):
+        self._changes.append((user_pk, item_pk, False))
+
+    def get_graph(self):
+        """Метод получения матриц с отложенным применением накопленных изменений поверх базовых матриц"""
+
+        with self._lock:
+            graph = super().get_graph()
+
+            if self._changes:
+                graph = self._graph = graph.with_changes(self._changes, settings.SPARSE_OVERLAY_MAX_CHANGES)
+                self._changes = []
+
+            return graph
+
+    def reset(self):
+        with self._lock:
+            super().reset()
+            self._changes = []
+
+
+likes_graph_store = LikesGraphStore()
+sparse_likes_store = SparseLikesStore()
+
+
+def reset_likes_stores():
+    """Функция сброса графов лайков всех движков рекомендаций процесса"""
+
+    for store in (likes_graph_store, sparse_likes_store):
+        store.reset()
+
+
+def get_likes_store():
+    """Функция получения хранилища графа для выбранного движка рекомендаций"""
+
+    if settings.RECOMMENDER_ENGINE == 'sparse':
+        return sparse_likes_store
+    return likes_graph_store
+
+
+def apply_registered_like(user_pk, item_pk, liked=True):
+    """Функция увеличения версии графа и применения лайка к графам процесса после коммита транзакции"""
+
+    version = LikesGraphStore.bump_shared_version()
+
+    for store in (likes_graph_store, sparse_likes_store):
+        store.apply_like(version, user_pk, item_pk, liked)
+
+
+def register_like(user_pk, item_pk, liked=True):
+    """Функция учета поставленного или убранного лайка во всех хранилищах графа"""
+
+    # До коммита другие воркеры не увидят событие журнала и запомнили бы новую версию без него
+    transaction.on_commit(partial(apply_registered_like, user_pk, item_pk, liked))
+
+
+def get_graph_user_items(graph, user_pk):
+    """Функция получения элементов, понравившихся пользователю, пустой список для пользователя вне графа"""
+
+    if user_node(user_pk) not in graph:
+        return []
+    return list(graph.neighbors(user_node(user_pk)))
+
+
 def page_rank_alg(graph, current_user_items, same_interest_users):
     """Функция реализации алгоритма PageRank для расчета важности пользователей"""
 
     same_users_popularity = {}
     current_user_items = set(current_user_items)
 
-    for same_user in same_interest_users:
-        same_user_items = set(graph.neighbors(same_user))
-        weight = len(current_user_items & same_user_items)
-        same_users_popularity[same_user] = weight
+    with span('page_rank', users=len(same_interest_users)):
+        for same_user in same_interest_users:
+            same_user_items = set(graph.neighbors(same_user))
+            weight = len(current_user_items & same_user_items)
+            same_users_popularity[same_user] = weight
 
     return same_users_popularity
 
 
-def kNN_alg(graph, user_email, current_user_items, k):
+def weighted_kNN_alg(graph, user_pk, current_user_items, k):
+    """Функция нахождения k-ближайших пользователей вместе с весами их похожести"""
+
+    with span('knn', user_items=len(current_user_items)) as knn_span:
+        same_interest_users = []
+        for item in current_user_items:
+            item_users = list(graph.neighbors(item))
+            item_users.remove(user_node(user_pk))
+            same_interest_users.extend(item_users)
+
+        candidates = list(set(same_interest_users))
+        same_users_popularity = page_rank_alg(graph, current_user_items, candidates)
+
+        most_same_interest_users = sorted(same_users_popularity,
+                                          key=lambda node: (-same_users_popularity[node], node))[:k]
+        knn_span.set(candidates=len(candidates), neighbours=len(most_same_interest_users))
+
+    return [(same_user[1], same_users_popularity[same_user]) for same_user in most_same_interest_users]
+
+
+@timed
+def kNN_alg(graph, user_pk, current_user_items, k):
     """Функция реализации алгоритма k-Nearest Neighbors для нахождения k-ближайших пользователей"""
 
-    same_interest_users = []
-    for item in current_user_items:
-        item_users = list(graph.neighbors(item))
-        item_users.remove(user_email)
-        same_interest_users.extend(item_users)
+    return [same_user_pk for same_user_pk, _ in weighted_kNN_alg(graph, user_pk, current_user_items, k)]
+
+
+def get_scoring_params(scoring):
+    """Функция получения параметров алгоритма ранжирования пользователей из настроек"""
+
+    if scoring == 'pagerank':
+        return {
+            'damping': settings.PAGERANK_DAMPING,
+            'tol': settings.PAGERANK_TOL,
+            'max_iter': settings.PAGERANK_MAX_ITER,
+        }
+    if scoring == 'push':
+        return {
+            'damping': settings.PAGERANK_DAMPING,
+            'epsilon': settings.PAGERANK_PUSH_EPSILON,
+        }
+    return {}
 
-    same_users_popularity = page_rank_alg(graph, current_user_items, list(set(same_interest_users)))
 
-    most_same_interest_users = sorted(same_users_popularity, key=same_users_popularity.get, reverse=True)
+@timed
+def find_same_interest_users(user_pk, k, scoring='overlap'):
+    """Функция поиска k ближайших пользователей в виде пар (пользователь, вес похожести)"""
+
+    # Персонализированный PageRank считается только по разреженным матрицам
+    if settings.RECOMMENDER_ENGINE == 'sparse' or scoring != 'overlap':
+        matrix = sparse_likes_store.get_graph()
+
+        with span('nearest_users', engine='sparse', scoring=scoring, users=len(matrix.user_ids),
+                  items=len(matrix.item_ids), likes=matrix.edges_count) as nearest_span:
+            same_interest_rows, weights = matrix.nearest_users(user_pk, k, scoring, **get_scoring_params(scoring))
+            nearest_span.set(neighbours=len(same_interest_rows))
+
+        return list(zip(matrix.user_ids[same_interest_rows].tolist(), weights.tolist()))
+
+    with likes_graph_store.read() as graph:
+        current_user_items = get_graph_user_items(graph, user_pk)
+
+        with span('nearest_users', engine='networkx', scoring=scoring, nodes=graph.number_of_nodes(),
+                  likes=graph.number_of_edges()):
+            return weighted_kNN_alg(graph, user_pk, current_user_items, k)
+
+
+def cache_same_interest_users(user_pk, k, scoring='overlap'):
+    """Функция кеширования списка ближайших пользователей с проверкой поколения записи"""
+
+    # Точечная инвалидация корректна только для общих лайков, PageRank зависит от всего графа
+    if settings.CACHE_ENABLED and scoring == 'overlap':
+        key = f'same_interest_users_{user_pk}_{k}'
+        generation_key = f'{SAME_INTEREST_USERS_GENERATION_KEY}_{user_pk}'
+
+        # Поколение записи - пара из общего поколения, меняющегося при массовых изменениях, и поколения пользователя
+        cached = cache.get_many([key, SAME_INTEREST_USERS_GENERATION_KEY, generation_key])
+        generation = (cached.get(SAME_INTEREST_USERS_GENERATION_KEY, 0), cached.get(generation_key, 0))
+        same_interest_users = cached.get(key)
+
+        is_hit = same_interest_users is not None and same_interest_users['generation'] == generation
+        record_cache_access('same_interest_users', is_hit)
+        if is_hit:
+            return same_interest_users['users']
+
+        same_interest_users = find_same_interest_users(user_pk, k, scoring)
+        cache.set(key, {'generation': generation, 'users': same_interest_users})
+    else:
+        same_interest_users = find_same_interest_users(user_pk, k, scoring)
 
-    return most_same_interest_users[:k]
+    return same_interest_users
 
 
-def get_same_interest_users(user_email, k):
+def invalidate_same_interest_users(user_pk, item_pk):
+    """Функция инвалидации списков ближайших пользователей у поставившего лайк и других лайкнувших элемент"""
+
+    if not settings.CACHE_ENABLED:
+        return
+
+    users_pks = set(Like.objects.filter(item_id=item_pk).values_list('user_id', flat=True))
+    users_pks.add(user_pk)
+
+    incr_cache_keys([f'{SAME_INTEREST_USERS_GENERATION_KEY}_{same_user_pk}' for same_user_pk in users_pks])
+
+
+def invalidate_all_same_interest_users():
+    """Функция инвалидации списков ближайших пользователей у всех пользователей после массового изменения лайков"""
+
+    if settings.CACHE_ENABLED:
+        incr_cache_keys([SAME_INTEREST_USERS_GENERATION_KEY])
+
+
+def get_same_interest_users(user_pk, k, scoring='overlap'):
     """Функция получения пользователей с похожими интересами"""
 
-    graph = create_likes_graph()
-    current_user_items = list(graph.neighbors(user_email))
+    same_interest_users = [same_user_pk for same_user_pk, _ in cache_same_interest_users(user_pk, k, scoring)]
+
+    if settings.RECOMMENDER_ENGINE == 'sparse' or scoring != 'overlap':
+        matrix = sparse_likes_store.get_graph()
+        return matrix, matrix.user_items_ids(user_pk), same_interest_users
 
-    same_interest_users = kNN_alg(graph, user_email, current_user_items, k)
+    with likes_graph_store.read() as graph:
+        current_user_items = get_graph_user_items(graph, user_pk)
 
     return graph, current_user_items, same_interest_users
 
 
-def collaborative_filtering_alg(user_email, k=5):
+recommendation_pool = None
+recommendation_pool_lock = threading.Lock()
+
+
+def get_recommendation_pool():
+    """Функция получения пула процессов расчета рекомендаций со снимком лайков не старше допустимого"""
+
+    global recommendation_pool
+
+    with recommendation_pool_lock:
+        if recommendation_pool is None:
+            recommendation_pool = RecommendationWorkerPool(settings.RECOMMENDATIONS_PROCESS_WORKERS)
+            atexit.register(recommendation_pool.shutdown)
+
+        version = LikesGraphStore.get_shared_version()
+
+        # Снимок пересобирается не чаще раза в RECOMMENDATIONS_SNAPSHOT_MAX_AGE секунд, а не на каждый лайк
+        is_expired = recommendation_pool.age >= settings.RECOMMENDATIONS_SNAPSHOT_MAX_AGE
+        if recommendation_pool.version != version and is_expired:
+            recommendation_pool.publish(sparse_likes_store.get_graph(), version)
+
+    return recommendation_pool
+
+
+def recommend_in_workers(user_pk, k=5, scoring='overlap', limit=None):
+    """Функция расчета рекомендаций в пуле процессов по снимку матриц в разделяемой памяти"""
+
+    future = get_recommendation_pool().submit(user_pk, k, scoring, limit, **get_scoring_params(scoring))
+
+    return future.result()
+
+
+@traced('recommendations')
+def score_recommended_items(user_pk, k=5, scoring='overlap', limit=None):
+    """Функция расчета рекомендаций пользователю в виде пар (элемент, оценка) по убыванию оценки"""
+
+    if settings.RECOMMENDATIONS_PROCESS_WORKERS:
+        return recommend_in_workers(user_pk, k, scoring, limit)
+
+    with span('same_interest_users', k=k) as same_users_span:
+        same_interest_users = cache_same_interest_users(user_pk, k, scoring)
+        same_users_span.set(neighbours=len(same_interest_users))
+
+    if settings.RECOMMENDER_ENGINE == 'sparse' or scoring != 'overlap':
+        same_users_pks = [same_user_pk for same_user_pk, _ in same_interest_users]
+        weights = [weight for _, weight in same_interest_users]
+        matrix = sparse_likes_store.get_graph()
+
+        with span('score_items', engine='sparse', limit=limit) as score_span:
+            items_scores = matrix.score_items(user_pk, same_users_pks, weights, limit)
+            score_span.set(recommended=len(items_scores))
+
+        return items_scores
+
+    with likes_graph_store.read() as graph, span('score_items', engine='networkx', limit=limit) as score_span:
+        current_user_items = set(get_graph_user_items(graph, user_pk))
+
+        # Каждый элемент соседа получает вес похожести этого соседа
+        items_scores = {}
+        for same_user_pk, weight in same_interest_users:
+            if user_node(same_user_pk) not in graph:
+                continue
+
+            for item in graph.neighbors(user_node(same_user_pk)):
+                if item not in current_user_items:
+                    items_scores[item] = items_scores.get(item, 0) + weight
+
+        score_span.set(candidates=len(items_scores))
+
+    def key(item_score):
+        return item_score[1], -item_score[0]
+
+    if limit is None:
+        return sorted(items_scores.items(), key=key, reverse=True)
+    return heapq.nlargest(limit, items_scores.items(), key=key)
+
+
+@timed
+def collaborative_filtering_alg(user_pk, k=5, scoring='overlap', limit=None):
     """Функция реализации алгоритма коллаборативной фильтрации для расчета рекомендаций пользователю"""
 
-    graph, current_user_items, same_interest_users = get_same_interest_users(user_email, k)
+    return [item_pk for item_pk, _ in score_recommended_items(user_pk, k, scoring, limit)]
 
-    recommended_items = []
-    for user in same_interest_users:
-        user_items = graph.neighbors(user)
-        user_items = list(set(user_items) - set(current_user_items))
-        recommended_items.extend(user_items)
 
-    return list(set(recommended_items))
+def compute_recommendations_chunk(user_pks, k=5, limit=None):
+    """Функция расчета рекомендаций для группы пользователей"""
 
+    return {user_pk: score_recommended_items(user_pk, k, limit=limit) for user_pk in user_pks}
 
-def get_statistics(user_email, k=10, count_items=10):
-    """Функция для получения статистики"""
 
-    _, _, same_interest_users = get_same_interest_users(user_email, k)
+def get_recommended_items_batch(user_pks, k=5, limit=None):
+    """Функция расчета рекомендаций по общим лайкам для многих пользователей за один проход по матрицам лайков
+
+    Матрицы загружаются сразу, а рекомендации возвращаются потоком пар (пользователь, список пар (элемент, оценка))
+    """
+
+    if limit is None:
+        limit = settings.RECOMMENDATIONS_LIMIT
+
+    # Для общих лайков разреженный движок дает тот же результат, что и networkx, но считает пакеты матрицами
+    matrix = sparse_likes_store.get_graph()
+
+    return matrix.recommend_items_batch(user_pks, k, limit, executor=batch_recommendations_executor,
+                                        max_in_flight=2 * settings.RECOMMENDATIONS_BATCH_WORKERS)
+
+
+def get_recommended_items(user_pk, k=5, scoring='overlap', limit=None):
+    """Функция получения рекомендованных элементов из заранее рассчитанной таблицы или в реальном времени"""
+
+    if limit is None:
+        limit = settings.RECOMMENDATIONS_LIMIT
+
+    if settings.RECOMMENDATIONS_SOURCE == 'precomputed' and scoring == 'overlap':
+        fresh_after = datetime.now(ZONE) - timedelta(seconds=settings.RECOMMENDATIONS_MAX_AGE)
+        recommendations = UserRecommendation.objects.filter(user_id=user_pk, computed_at__gte=fresh_after)
+
+        # Пустой результат расчета хранится строкой без элемента, поэтому тоже считается свежим
+        if recommendations.exists():
+            return Item.objects.filter(
+                userrecommendation__user_id=user_pk,
+                userrecommendation__computed_at__gte=fresh_after
+            ).annotate(rank=F('userrecommendation__rank')).order_by('rank')[:limit]
+
+    recommended_items_ids = collaborative_filtering_alg(user_pk, k, scoring, limit)
+    ranking = Case(*(When(pk=item_pk, then=rank) for rank, item_pk in enumerate(recommended_items_ids)),
+                   output_field=IntegerField())
+
+    return Item.objects.filter(pk__in=recommended_items_ids).annotate(rank=ranking).order_by('rank')
+
+
+def change_count_likes(item, delta):
+    """Функция атомарного изменения счетчика лайков элемента"""
+
+    redis_client = get_redis_client() if settings.LIKES_WRITE_BEHIND else None
+
+    if redis_client is not None:
+        # Изменения копятся в Redis и переносятся в базу командой flush_like_counters, HINCRBY возвращает
+        # все еще не перенесенное изменение, которое добавляется к прочитанному из базы счетчику
+        item.count_likes += redis_client.hincrby(cache.make_and_validate_key(LIKES_DELTAS_KEY), item.pk, delta)
+        return
+
+    # Значение для дальнейшей логики без повторного запроса к базе
+    count_likes = item.count_likes + delta
+    item.count_likes = F('count_likes') + delta
+    item.save(update_fields=['count_likes'])
+    item.count_likes = count_likes
+
+
+def increment_count_likes(user_pk, item_pk, published_only=False):
+    """Функция увеличения счетчика лайков чужого элемента одним UPDATE ... RETURNING, возвращает счетчик и категорию"""
+
+    item_table = connection.ops.quote_name(Item._meta.db_table)
+    sql = f'UPDATE {item_table} SET count_likes = count_likes + 1 WHERE id = %s AND (user_id IS NULL OR user_id <> %s)'
+    if published_only:
+        sql += ' AND is_published'
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'{sql} RETURNING count_likes, category_id', [item_pk, user_pk])
+        return cursor.fetchone()
+
+
+def create_like(user, item_pk, published_only=False):
+    """Функция создания лайка вместе с увеличением счетчика в одной транзакции, None если лайк невозможен"""
+
+    write_behind = settings.LIKES_WRITE_BEHIND and get_redis_client() is not None
+
+    try:
+        with transaction.atomic():
+            if write_behind:
+                items = Item.objects.filter(pk=item_pk).exclude(user=user)
+                if published_only:
+                    items = items.filter(is_published=True)
+                row = items.values_list('count_likes', 'category_id').first()
+            else:
+                row = increment_count_likes(user.pk, item_pk, published_only)
+
+            if row is None:
+                return None
+
+            # Элемент собирается из RETURNING, чтобы обработчики сигналов не запрашивали его категорию повторно
+            count_likes, category_pk = row
+            item = Item(pk=item_pk, category_id=category_pk, count_likes=count_likes)
+
+            # Повторный лайк отсекается ограничением уникальности, счетчик откатывается вместе с транзакцией
+            like = Like.objects.create(user=user, item=item, created_at=datetime.now(ZONE))
+    except IntegrityError:
+        return None
+
+    # Изменение в Redis не откатывается, поэтому вносится только после транзакции
+    if write_behind:
+        change_count_likes(item, 1)
+
+    return like, item.count_likes
+
+
+def delete_like(user, item):
+    """Функция удаления лайка вместе с уменьшением счетчика в одной транзакции, False если лайка не было"""
+
+    with transaction.atomic():
+        # Счетчик уменьшается только если лайк действительно удален, параллельный запрос удалит 0 строк
+        deleted, _ = Like.objects.filter(user=user, item=item).delete()
+
+        # Изменение в Redis не откатывается, поэтому откладывается до коммита
+        if deleted and settings.LIKES_WRITE_BEHIND and get_redis_client() is not None:
+            transaction.on_commit(partial(change_count_likes, item, -1))
+        elif deleted:
+            change_count_likes(item, -1)
+
+    return bool(deleted)
+
+
+def apply_likes_deltas(likes_deltas, batch_size=1000):
+    """Функция применения накопленных изменений счетчиков лайков пакетными UPDATE ... CASE"""
+
+    likes_deltas = [(item_pk, delta) for item_pk, delta in likes_deltas.items() if delta]
+
+    for i in range(0, len(likes_deltas), batch_size):
+        batch = likes_deltas[i:i + batch_size]
+        delta_case = Case(*(When(pk=item_pk, then=Value(delta)) for item_pk, delta in batch),
+                          default=Value(0), output_field=IntegerField())
+
+        Item.objects.filter(pk__in=[item_pk for item_pk, _ in batch]).update(count_likes=F('count_likes') + delta_case)
+
+    return len(likes_deltas)
+
+
+def flush_likes_deltas(batch_size=1000):
+    """Функция переноса накопленных в Redis изменений счетчиков лайков в базу"""
+
+    redis_client = get_redis_client()
+    if redis_client is None:
+        return 0
+
+    key = cache.make_and_validate_key(LIKES_DELTAS_KEY)
+    flushing_key = f'{key}:flushing'
+
+    # Необработанный после сбоя ключ переносится в первую очередь, новые изменения копятся в основном ключе
+    if not redis_client.exists(flushing_key):
+        try:
+            redis_client.rename(key, flushing_key)
+        except redis.ResponseError:
+            return 0
+
+    # Идентификатор переноса хранится вместе с изменениями, а отметка о нем в базе не даст применить их повторно,
+    # если процесс упадет после коммита, но до удаления ключа
+    redis_client.hsetnx(flushing_key, LIKES_FLUSH_ID_FIELD, uuid.uuid4().hex)
+    likes_deltas = redis_client.hgetall(flushing_key)
+    flush_id = likes_deltas.pop(LIKES_FLUSH_ID_FIELD.encode()).decode()
+    likes_deltas = {int(item_pk): int(delta) for item_pk, delta in likes_deltas.items()}
+
+    with transaction.atomic():
+        _, created = LikeCountersFlush.objects.get_or_create(flush_id=flush_id)
+        flushed_count = apply_likes_deltas(likes_deltas, batch_size) if created else 0
+
+    redis_client.delete(flushing_key)
+    LikeCountersFlush.objects.filter(flush_id=flush_id).delete()
+
+    return flushed_count
+
+
+def recount_likes():
+    """Функция пересчета счетчиков лайков всех элементов одним агрегирующим UPDATE"""
+
+    # Накопленные в Redis изменения уже учтены в таблице лайков, поэтому переносятся до пересчета
+    if settings.LIKES_WRITE_BEHIND:
+        flush_likes_deltas()
+
+    likes_count = Like.objects.filter(item=OuterRef('pk')).order_by().values('item').annotate(count=Count('pk')). \
+        values('count')
+    updated_count = Item.objects.update(count_likes=Coalesce(Subquery(likes_count), 0))
 
     if settings.CACHE_ENABLED:
-        key = f'most_popular_items_{user_email}'
-        most_popular_items = cache.get(key)
+        cache.delete(POPULAR_ITEMS_KEY)
+
+    return updated_count
+
+
+def refresh_popular_items():
+    """Функция пересчета глобального кеша самых популярных элементов"""
+
+    # Лишняя строка хранит ближайшего претендента на попадание в топ
+    popular_items = list(
+        Item.objects.filter(count_likes__gt=0).order_by('-count_likes', 'pk').
+        values('pk', 'count_likes')[:settings.POPULAR_ITEMS_COUNT + 1]
+    )
+    cache.set(POPULAR_ITEMS_KEY, popular_items, settings.POPULAR_ITEMS_CACHE_TIMEOUT)
+
+    return popular_items
+
+
+def cache_most_popular_items(count_items=10):
+    """Функция кеширования списка самых популярных элементов"""
+
+    if settings.CACHE_ENABLED and count_items <= settings.POPULAR_ITEMS_COUNT:
+        popular_items = cache.get(POPULAR_ITEMS_KEY)
+        record_cache_access('popular_items', popular_items is not None)
 
-        if most_popular_items is None:
-            most_popular_items = Item.objects.filter(count_likes__gt=0).order_by('-count_likes')[:count_items]
-            cache.set(key, most_popular_items)
+        if popular_items is None:
+            popular_items = refresh_popular_items()
+
+        popular_items_ids = [popular_item['pk'] for popular_item in popular_items[:count_items]]
+        return Item.objects.filter(pk__in=popular_items_ids).order_by('-count_likes', 'pk')
+
+    return Item.objects.filter(count_likes__gt=0).order_by('-count_likes')[:count_items]
+
+
+def update_popular_items(item_pk, count_likes):
+    """Функция сброса кеша популярных элементов, если новое число лайков меняет состав топа"""
+
+    if not settings.CACHE_ENABLED:
+        return
+
+    popular_items = cache.get(POPULAR_ITEMS_KEY)
+    if popular_items is None:
+        return
+
+    top_items, runners_up = popular_items[:settings.POPULAR_ITEMS_COUNT], popular_items[settings.POPULAR_ITEMS_COUNT:]
+
+    if any(top_item['pk'] == item_pk for top_item in top_items):
+        threshold = runners_up[0]['count_likes'] if runners_up else 1
+        changes_top = count_likes < threshold
     else:
-        most_popular_items = Item.objects.filter(count_likes__gt=0).order_by('-count_likes')[:count_items]
+        threshold = top_items[-1]['count_likes'] if len(top_items) == settings.POPULAR_ITEMS_COUNT else 1
+        changes_top = count_likes >= threshold
+
+    if changes_top:
+        cache.delete(POPULAR_ITEMS_KEY)
+
+
+def leaderboard_key(scope, window):
+    """Функция получения ключа лидерборда категории или всех элементов ('all') за окно"""
+
+    return cache.make_and_validate_key(f'{LEADERBOARD_PREFIX}_{scope}_{window}')
+
+
+def leaderboard_bucket_key(scope, hour):
+    """Функция получения ключа часовой корзины лайков категории или всех элементов"""
+
+    return cache.make_and_validate_key(f'{LEADERBOARD_PREFIX}_{scope}_hour_{hour:%Y%m%d%H}')
+
+
+def leaderboard_cursor_key(window):
+    """Функция получения ключа последнего часа, уже вычтенного из лидерборда окна"""
+
+    return cache.make_and_validate_key(f'{LEADERBOARD_PREFIX}_cursor_{window}')
+
+
+def get_hour(moment):
+    """Функция получения начала часа в UTC"""
+
+    return moment.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def parse_hour(value):
+    """Функция разбора часа из значения курсора лидерборда"""
+
+    return datetime.strptime(value.decode(), '%Y%m%d%H').replace(tzinfo=timezone.utc)
+
+
+def get_timed_windows():
+    """Функция получения окон лидербордов, ограниченных по времени"""
+
+    return [(window, period) for window, period in LEADERBOARD_WINDOWS.items() if period is not None]
+
+
+def get_leaderboard_client():
+    """Функция получения клиента Redis, если лидерборды в нем построены, иначе None"""
+
+    if not settings.CACHE_ENABLED:
+        return None
+
+    redis_client = get_redis_client()
+    if redis_client is None or not redis_client.exists(cache.make_and_validate_key(LEADERBOARD_BUILT_KEY)):
+        return None
+    return redis_client
+
+
+def record_leaderboard_like(item_pk, category_pk, created_at, delta):
+    """Функция изменения счета элемента в лидербордах Redis при лайке и его отмене"""
+
+    redis_client = get_redis_client() if settings.CACHE_ENABLED else None
+    if redis_client is None:
+        return
+
+    # Признак построения и курсоры окон читаются одним MGET
+    timed_windows = get_timed_windows()
+    built, *cursors = redis_client.mget([cache.make_and_validate_key(LEADERBOARD_BUILT_KEY),
+                                         *(leaderboard_cursor_key(window) for window, _ in timed_windows)])
+    if built is None:
+        return
+
+    hour = get_hour(created_at or datetime.now(ZONE))
+
+    pipeline = redis_client.pipeline(transaction=False)
+    for scope in ('all', category_pk) if category_pk else ('all',):
+        pipeline.zincrby(leaderboard_key(scope, 'all'), delta, item_pk)
+
+        bucket_key = leaderboard_bucket_key(scope, hour)
+        pipeline.zincrby(bucket_key, delta, item_pk)
+        pipeline.expire(bucket_key, LEADERBOARD_BUCKET_TIMEOUT)
+
+        # Лайк из уже вычтенного часа в окно не попадает, иначе он не будет из него вычтен
+        for (window, _), cursor in zip(timed_windows, cursors):
+            if cursor is None or hour > parse_hour(cursor):
+                pipeline.zincrby(leaderboard_key(scope, window), delta, item_pk)
+    pipeline.execute()
+
+
+def remove_leaderboard_item(item_pk, category_pk):
+    """Функция удаления элемента из лидербордов Redis, например при удалении самого элемента"""
+
+    redis_client = get_leaderboard_client()
+    if redis_client is None:
+        return
+
+    pipeline = redis_client.pipeline(transaction=False)
+    for scope in ('all', category_pk) if category_pk else ('all',):
+        for window in LEADERBOARD_WINDOWS:
+            pipeline.zrem(leaderboard_key(scope, window), item_pk)
+    pipeline.execute()
+
+
+def rebuild_leaderboards():
+    """Функция построения лидербордов Redis по таблице лайков, возвращает False без Redis"""
+
+    redis_client = get_redis_client() if settings.CACHE_ENABLED else None
+    if redis_client is None:
+        return False
+
+    current_hour = get_hour(datetime.now(ZONE))
+    timed_windows = get_timed_windows()
+    cursors = {window: current_hour - period for window, period in timed_windows}
+    oldest_hour = min(cursors.values())
+
+    leaderboards = {}
+    for item_pk, category_pk, count in Like.objects.order_by().values_list('item_id', 'item__category_id'). \
+            annotate(count=Count('pk')).iterator():
+        for scope in ('all', category_pk) if category_pk else ('all',):
+            leaderboards.setdefault(leaderboard_key(scope, 'all'), {})[item_pk] = count
+
+    buckets = {}
+    hourly_likes = Like.objects.filter(created_at__gte=oldest_hour + timedelta(hours=1)).order_by(). \
+        annotate(hour=TruncHour('created_at', tzinfo=timezone.utc)). \
+        values_list('item_id', 'item__category_id', 'hour').annotate(count=Count('pk'))
+    for item_pk, category_pk, hour, count in hourly_likes.iterator():
+        for scope in ('all', category_pk) if category_pk else ('all',):
+            buckets.setdefault(leaderboard_bucket_key(scope, hour), {})[item_pk] = count
+
+            for window, cursor in cursors.items():
+                if hour > cursor:
+                    window_key = leaderboard_key(scope, window)
+                    leaderboards.setdefault(window_key, {})
+                    leaderboards[window_key][item_pk] = leaderboards[window_key].get(item_pk, 0) + count
+
+    # Старые ключи удаляются в той же транзакции, чтобы читатели не видели частично построенные лидерборды.
+    # Лайки, поставленные во время агрегации, могут потеряться до следующей пересборки
+    pipeline = redis_client.pipeline(transaction=True)
+    for key in redis_client.scan_iter(match=f'{cache.make_and_validate_key(LEADERBOARD_PREFIX)}_*', count=1000):
+        pipeline.delete(key)
+    for key, scores in leaderboards.items():
+        pipeline.zadd(key, scores)
+    for key, scores in buckets.items():
+        pipeline.zadd(key, scores)
+        pipeline.expire(key, LEADERBOARD_BUCKET_TIMEOUT)
+    for window, cursor in cursors.items():
+        pipeline.set(leaderboard_cursor_key(window), f'{cursor:%Y%m%d%H}')
+    pipeline.set(cache.make_and_validate_key(LEADERBOARD_BUILT_KEY), 1)
+    pipeline.execute()
+
+    return True
+
+
+def expire_leaderboard_buckets():
+    """Функция вычитания из лидербордов окон часовых корзин, вышедших за окно, возвращает число корзин"""
+
+    redis_client = get_leaderboard_client()
+    if redis_client is None:
+        return 0
+
+    current_hour = get_hour(datetime.now(ZONE))
+    scopes = ['all', *Category.objects.values_list('pk', flat=True)]
+    expired_count = 0
+
+    for window, period in get_timed_windows():
+        cursor_key = leaderboard_cursor_key(window)
+        cursor = redis_client.get(cursor_key)
+        new_cursor = current_hour - period
+
+        # Корзины за пропущенные часы уже удалены по таймауту, вычесть их нельзя
+        if cursor is None or (current_hour - parse_hour(cursor)).total_seconds() > LEADERBOARD_BUCKET_TIMEOUT:
+            rebuild_leaderboards()
+            return expired_count
+
+        pipeline = redis_client.pipeline(transaction=True)
+        hour = parse_hour(cursor) + timedelta(hours=1)
+        while hour <= new_cursor:
+            for scope in scopes:
+                key = leaderboard_key(scope, window)
+                pipeline.zunionstore(key, {key: 1, leaderboard_bucket_key(scope, hour): -1})
+            hour += timedelta(hours=1)
+            expired_count += 1
+
+        for scope in scopes:
+            pipeline.zremrangebyscore(leaderboard_key(scope, window), '-inf', 0)
+        pipeline.set(cursor_key, f'{new_cursor:%Y%m%d%H}')
+        pipeline.execute()
+
+    return expired_count
+
+
+def refresh_item_popularity():
+    """Функция обновления материализованного представления популярности, False для баз кроме PostgreSQL"""
+
+    if connection.vendor != 'postgresql':
+        return False
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'REFRESH MATERIALIZED VIEW CONCURRENTLY {ItemPopularity._meta.db_table}')
+    return True
+
+
+def get_popular_item_pks(redis_client, count_items, window, category_pk):
+    """Функция получения ключей самых популярных за окно элементов из Redis, представления или таблицы лайков"""
+
+    if redis_client is not None:
+        item_pks = redis_client.zrevrangebyscore(leaderboard_key(category_pk or 'all', window), '+inf', '(0',
+                                                 start=0, num=count_items)
+        return [int(item_pk) for item_pk in item_pks]
+
+    if connection.vendor == 'postgresql':
+        field = f'likes_{window}'
+        popularity = ItemPopularity.objects.filter(**{f'{field}__gt': 0})
+        if category_pk:
+            popularity = popularity.filter(category_id=category_pk)
+        return list(popularity.order_by(f'-{field}', 'item_id').values_list('item_id', flat=True)[:count_items])
+
+    likes = Like.objects.all()
+    if LEADERBOARD_WINDOWS[window] is not None:
+        likes = likes.filter(created_at__gte=datetime.now(ZONE) - LEADERBOARD_WINDOWS[window])
+    if category_pk:
+        likes = likes.filter(item__category_id=category_pk)
+    return list(likes.order_by().values('item_id').annotate(count=Count('pk')).order_by('-count', 'item_id').
+                values_list('item_id', flat=True)[:count_items])
+
+
+def get_popular_items(count_items=10, window='all', category_pk=None):
+    """Функция получения самых популярных элементов за окно, всех или одной категории"""
+
+    redis_client = get_leaderboard_client()
+    if redis_client is None and window == 'all' and category_pk is None:
+        return cache_most_popular_items(count_items)
+
+    item_pks = get_popular_item_pks(redis_client, count_items, window, category_pk)
+    ranking = Case(*(When(pk=item_pk, then=Value(rank)) for rank, item_pk in enumerate(item_pks)),
+                   output_field=IntegerField())
+
+    return Item.objects.filter(pk__in=item_pks).annotate(rank=ranking).order_by('rank')
+
+
+@traced('statistics')
+def get_statistics(user_pk, k=10, count_items=10, window='all'):
+    """Функция для получения статистики"""
+
+    same_interest_users = [same_user_pk for same_user_pk, _ in cache_same_interest_users(user_pk, k)]
+    most_popular_items = get_popular_items(count_items, window)
 
     return same_interest_users, most_popular_items
 
 
+def run_with_fresh_connections(func, *args, **kwargs):
+    """Функция выполнения в потоке пула с закрытием устаревших соединений с базой до и после расчета"""
+
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_in_executor(func, *args, **kwargs):
+    """Функция выполнения тяжелого расчета в ограниченном пуле потоков без блокировки цикла событий"""
+
+    loop = asyncio.get_running_loop()
+    # Контекст передается в поток пула, чтобы расчет попал в счетчики запроса
+    context = contextvars.copy_context()
+
+    return await loop.run_in_executor(recommendations_executor,
+                                      partial(context.run, run_with_fresh_connections, func, *args, **kwargs))
+
+
+def load_recommended_items(user_pk, k=5, scoring='overlap', limit=None):
+    """Функция получения списка рекомендованных элементов с выполненным запросом к базе"""
+
+    return list(get_recommended_items(user_pk, k, scoring, limit))
+
+
+def load_statistics(user_pk, k=10, count_items=10, window='all'):
+    """Функция получения статистики с выполненным запросом популярных элементов"""
+
+    same_interest_users, most_popular_items = get_statistics(user_pk, k, count_items, window)
+
+    return same_interest_users, list(most_popular_items)
+
+
+async def aget_recommended_items(user_pk, k=5, scoring='overlap', limit=None):
+    """Асинхронная функция получения рекомендованных элементов, расчет выполняется в пуле потоков"""
+
+    return await run_in_executor(load_recommended_items, user_pk, k, scoring, limit)
+
+
+async def aget_statistics(user_pk, k=10, count_items=10, window='all'):
+    """Асинхронная функция получения статистики, расчет выполняется в пуле потоков"""
+
+    return await run_in_executor(load_statistics, user_pk, k, count_items, window)
+
+
 def cache_category_list():
     """Функция кеширования списка объектов модели Category"""
 
     if settings.CACHE_ENABLED:
         key = 'category_list'
         category_list = cache.get(key)
+        record_cache_access('category_list', category_list is not None)
 
         if category_list is None:
             category_list = Category.objects.all()
@@ -114,24 +1197,152 @@ def cache_category_list():
     return category_list
 
 
-def cache_item_list(category_published_items, user=None):
-    """Функция кеширования списка объектов модели Item"""
+def parse_shuffle_seed(seed):
+    """Функция перевода строкового зерна перемешивания в число от 0 до 1"""
 
-    if settings.CACHE_ENABLED:
-        key = 'item_list'
-        item_list = cache.get(key)
+    return random.Random(seed).random()
 
-        if item_list is None:
-            if user is not None:
-                item_list = category_published_items.exclude(user=user).order_by('?')
-            else:
-                item_list = category_published_items.order_by('?')
-            cache.set(key, item_list)
 
-    else:
+def new_shuffle_seed():
+    """Функция получения нового строкового зерна перемешивания"""
+
+    return f'{random.getrandbits(64):016x}'
+
+
+def get_shuffle_seed(request):
+    """Функция получения зерна перемешивания элементов из параметра seed, сессии пользователя или cookie гостя"""
+
+    seed = request.GET.get('seed')
+    if seed:
+        return parse_shuffle_seed(seed)
+
+    if request.user.is_authenticated:
+        if ITEMS_SEED_KEY not in request.session:
+            request.session[ITEMS_SEED_KEY] = random.random()
+        return request.session[ITEMS_SEED_KEY]
+
+    # Для гостя сессия не создается, зерно хранится в подписанной cookie, которую ставит set_shuffle_seed_cookie
+    seed = request.get_signed_cookie(ITEMS_SEED_KEY, default=None)
+    if seed is None:
+        seed = request.new_shuffle_seed = new_shuffle_seed()
+    return parse_shuffle_seed(seed)
+
+
+def set_shuffle_seed_cookie(request, response):
+    """Функция сохранения нового зерна перемешивания гостя в подписанной cookie ответа"""
+
+    seed = getattr(request, 'new_shuffle_seed', None)
+    if seed is not None:
+        response.set_signed_cookie(ITEMS_SEED_KEY, seed, httponly=True, samesite='Lax')
+    return response
+
+
+class ShuffledItems:
+    """Класс последовательности элементов по random_key начиная с зерна, поддерживает срезы и подсчет для пагинации
+
+    Последовательность читается двумя диапазонами по индексу random_key: от зерна до конца и от начала до зерна
+    """
+
+    def __init__(self, items, seed):
+        self.model = items.model
+        self.head = items.filter(random_key__gte=seed).order_by('random_key', 'pk')
+        self.tail = items.filter(random_key__lt=seed).order_by('random_key', 'pk')
+        self._head_count = None
+
+    @property
+    def head_count(self):
+        if self._head_count is None:
+            self._head_count = self.head.count()
+        return self._head_count
+
+    def count(self):
+        return self.head_count + self.tail.count()
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        yield from self.head
+        yield from self.tail
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+
+        start = index.start or 0
+        stop = self.count() if index.stop is None else index.stop
+
+        items = []
+        if start < self.head_count:
+            items.extend(self.head[start:min(stop, self.head_count)])
+        if stop > self.head_count:
+            items.extend(self.tail[max(start - self.head_count, 0):stop - self.head_count])
+        return items
+
+
+def shuffle_items(items, seed):
+    """Функция упорядочивания элементов по random_key со сдвигом на зерно, порядок одинаков на всех страницах"""
+
+    return ShuffledItems(items, seed)
+
+
+def rotate_items(item_keys, seed):
+    """Функция сдвига списка (pk, создатель, random_key), упорядоченного по random_key, на зерно"""
+
+    position = bisect.bisect_left([random_key for _, _, random_key in item_keys], seed)
+
+    return item_keys[position:] + item_keys[:position]
+
+
+def cache_item_list(category_pk, user=None, seed=0.0):
+    """Функция кеширования списка опубликованных элементов категории, в кеше хранятся только ключи элементов"""
+
+    category_published_items = Item.objects.filter(category_id=category_pk, is_published=True)
+
+    if not settings.CACHE_ENABLED:
         if user is not None:
-            item_list = category_published_items.exclude(user=user).order_by('?')
-        else:
-            item_list = category_published_items.order_by('?')
+            category_published_items = category_published_items.exclude(user=user)
+        return shuffle_items(category_published_items, seed)
+
+    key = f'{ITEM_LIST_KEY}_{category_pk}'
+    item_keys = cache.get(key)
+    record_cache_access('item_list', item_keys is not None)
+
+    if item_keys is None:
+        incr_cache_keys([ITEM_LIST_MISSES_KEY])
+        item_keys = list(category_published_items.order_by('random_key', 'pk').
+                         values_list('pk', 'user_id', 'random_key'))
+        cache.set(key, item_keys)
+    else:
+        incr_cache_keys([ITEM_LIST_HITS_KEY])
+
+    # Исключение своих элементов после чтения кеша, чтобы одна запись подходила всем пользователям
+    if user is not None:
+        item_keys = [item_key for item_key in item_keys if item_key[1] != user.pk]
+
+    item_pks = [item_pk for item_pk, _, _ in rotate_items(item_keys, seed)]
+
+    # Повторная фильтрация отбрасывает элементы, снятые с публикации или перенесенные после записи в кеш
+    items = category_published_items.in_bulk(item_pks)
+
+    return [items[item_pk] for item_pk in item_pks if item_pk in items]
+
+
+def invalidate_item_list(*category_pks):
+    """Функция сброса кеша списков элементов указанных категорий"""
+
+    if settings.CACHE_ENABLED:
+        cache.delete_many([f'{ITEM_LIST_KEY}_{category_pk}' for category_pk in set(category_pks) if category_pk])
+
+
+def get_item_list_cache_stats():
+    """Функция получения числа попаданий и промахов кеша списков элементов"""
+
+    counters = cache.get_many([ITEM_LIST_HITS_KEY, ITEM_LIST_MISSES_KEY])
+    hits, misses = counters.get(ITEM_LIST_HITS_KEY, 0), counters.get(ITEM_LIST_MISSES_KEY, 0)
 
-    return item_list
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+    }
@@ -0,0 +1,101 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from config import settings
+from recommendations.models import Like, Item
+from recommendations.services import register_like, invalidate_item_list, record_like_event, record_leaderboard_like, \
+    remove_leaderboard_item, invalidate_same_interest_users
+
+
+@receiver(post_save, sender=Like)
+def add_like_to_graph(sender, instance, created, **kwargs):
+    """Обработчик добавления нового лайка в граф лайков"""
+
+    if created:
+        record_like_event(instance.user_id, instance.item_id)
+        register_like(instance.user_id, instance.item_id)
+
+
+@receiver(post_delete, sender=Like)
+def remove_like_from_graph(sender, instance, **kwargs):
+    """Обработчик удаления лайка из графа лайков"""
+
+    record_like_event(instance.user_id, instance.item_id, liked=False)
+    register_like(instance.user_id, instance.item_id, liked=False)
+
+
+@receiver(post_save, sender=Like)
+def invalidate_same_interest_users_on_like(sender, instance, created, **kwargs):
+    """Обработчик инвалидации списков ближайших пользователей после коммита нового лайка"""
+
+    if created:
+        transaction.on_commit(partial(invalidate_same_interest_users, instance.user_id, instance.item_id))
+
+
+@receiver(post_delete, sender=Like)
+def invalidate_same_interest_users_on_unlike(sender, instance, **kwargs):
+    """Обработчик инвалидации списков ближайших пользователей после коммита удаления лайка, в том числе каскадного"""
+
+    transaction.on_commit(partial(invalidate_same_interest_users, instance.user_id, instance.item_id))
+
+
+def record_like_in_leaderboards(instance, delta):
+    """Функция изменения счета элемента лайка в лидербордах, категория берется из уже загруженного элемента"""
+
+    if Like.item.is_cached(instance):
+        category_pk = instance.item.category_id
+    else:
+        category_pk = Item.objects.filter(pk=instance.item_id).values_list('category_id', flat=True).first()
+    record_leaderboard_like(instance.item_id, category_pk, instance.created_at, delta)
+
+
+@receiver(post_save, sender=Like)
+def add_like_to_leaderboards(sender, instance, created, **kwargs):
+    """Обработчик увеличения счета элемента в лидербордах популярности после коммита нового лайка"""
+
+    if created and settings.CACHE_ENABLED:
+        transaction.on_commit(partial(record_like_in_leaderboards, instance, 1))
+
+
+@receiver(post_delete, sender=Like)
+def remove_like_from_leaderboards(sender, instance, **kwargs):
+    """Обработчик уменьшения счета элемента в лидербордах популярности после коммита удаления лайка"""
+
+    if settings.CACHE_ENABLED:
+        transaction.on_commit(partial(record_like_in_leaderboards, instance, -1))
+
+
+def is_count_likes_update(update_fields):
+    """Функция проверки, что сохранение меняет только счетчик лайков, не влияющий на списки элементов"""
+
+    return update_fields is not None and set(update_fields) == {'count_likes'}
+
+
+@receiver(pre_save, sender=Item)
+def remember_item_category(sender, instance, update_fields=None, **kwargs):
+    """Обработчик запоминания прежней категории элемента перед сохранением"""
+
+    if settings.CACHE_ENABLED and instance.pk is not None and not is_count_likes_update(update_fields):
+        instance._previous_category_id = Item.objects.filter(pk=instance.pk). \
+            values_list('category_id', flat=True).first()
+
+
+@receiver(post_save, sender=Item)
+def invalidate_item_list_on_save(sender, instance, update_fields=None, **kwargs):
+    """Обработчик сброса кеша списков элементов при создании, изменении и публикации элемента"""
+
+    if not is_count_likes_update(update_fields):
+        invalidate_item_list(instance.category_id, getattr(instance, '_previous_category_id', None))
+
+
+@receiver(post_delete, sender=Item)
+def invalidate_item_list_on_delete(sender, instance, **kwargs):
+    """Обработчик сброса кеша списков элементов и удаления элемента из лидербордов при его удалении"""
+
+    invalidate_item_list(instance.category_id)
+
+    # Удаление выполняется после уменьшений счета каскадно удаленных лайков, иначе они вернут элемент в лидерборды
+    if settings.CACHE_ENABLED:
+        transaction.on_commit(partial(remove_leaderboard_item, instance.pk, instance.category_id))
@@ -0,0 +1,90 @@
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+
+import numpy as np
+
+from recommendations.sparse import SparseLikesMatrix
+
+SNAPSHOT_FORMAT = 2
+HEADER_FILE = 'header.json'
+CURRENT_FILE = 'CURRENT'
+
+
+def write_atomically(path, content):
+    """Функция записи файла через временный файл, чтобы читатели не увидели его недописанным"""
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        file.write(content)
+    os.replace(tmp_path, path)
+
+
+def export_snapshot(matrix, directory, sequence, keep=2):
+    """Функция сохранения матриц лайков, учитывающих события журнала до номера sequence, в новую версию снимка"""
+
+    created_at = datetime.now(timezone.utc)
+    name = f'snapshot_{sequence}_{created_at:%Y%m%d%H%M%S%f}'
+    tmp_path = os.path.join(directory, f'.{name}')
+    os.makedirs(tmp_path)
+
+    arrays = matrix.to_csr_arrays()
+    for array_name, array in arrays.items():
+        np.save(os.path.join(tmp_path, f'{array_name}.npy'), np.ascontiguousarray(array))
+
+    header = {
+        'format': SNAPSHOT_FORMAT,
+        'sequence': sequence,
+        'created_at': created_at.isoformat(),
+        'users_count': len(arrays['user_ids']),
+        'items_count': len(arrays['item_ids']),
+        'likes_count': matrix.edges_count,
+        'arrays': {array_name: {'dtype': array.dtype.str, 'shape': list(array.shape)}
+                   for array_name, array in arrays.items()},
+    }
+    with open(os.path.join(tmp_path, HEADER_FILE), 'w', encoding='utf-8') as file:
+        json.dump(header, file, indent=2)
+
+    path = os.path.join(directory, name)
+    os.rename(tmp_path, path)
+    write_atomically(os.path.join(directory, CURRENT_FILE), name)
+
+    prune_snapshots(directory, keep)
+
+    return path
+
+
+def prune_snapshots(directory, keep=2):
+    """Функция удаления старых версий снимка, кроме keep последних"""
+
+    names = sorted(
+        (name for name in os.listdir(directory) if name.startswith('snapshot_')),
+        key=lambda name: os.path.getmtime(os.path.join(directory, name)),
+        reverse=True
+    )
+
+    # Уже открытые через mmap файлы остаются доступны процессам и после удаления
+    for name in names[keep:]:
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+
+def load_snapshot(directory, mmap_mode='r'):
+    """Функция открытия текущей версии снимка через mmap, возвращает (заголовок, матрицы) или None"""
+
+    try:
+        with open(os.path.join(directory, CURRENT_FILE), encoding='utf-8') as file:
+            path = os.path.join(directory, file.read().strip())
+
+        with open(os.path.join(path, HEADER_FILE), encoding='utf-8') as file:
+            header = json.load(file)
+
+        if header['format'] != SNAPSHOT_FORMAT:
+            return None
+
+        arrays = {array_name: np.load(os.path.join(path, f'{array_name}.npy'), mmap_mode=mmap_mode)
+                  for array_name in header['arrays']}
+    except (OSError, ValueError, KeyError):
+        return None
+
+    return header, SparseLikesMatrix.from_csr_arrays(arrays)
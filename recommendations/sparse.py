@@ -0,0 +1,571 @@
+from collections import defaultdict, deque
+from itertools import chain
+
+import numpy as np
+from scipy import sparse
+
+# Наибольшее число ячеек плотных матриц одного пакета пакетного расчета рекомендаций
+BATCH_CELLS = 1 << 24
+
+# Наибольшее число измененных лайков поверх базовых матриц, после которого матрицы собираются заново
+OVERLAY_MAX_CHANGES = 10000
+
+
+class SparseLikesMatrix:
+    """Класс представления отношения лайков в виде разреженных CSR-матриц пользователи x элементы
+
+    Свежие лайки хранятся поверх базовых матриц в небольших матрицах добавленных и убранных ребер
+    и учитываются при каждом расчете, базовые матрицы (например, из снимка на диске) не копируются
+    """
+
+    def __init__(self, user_ids, item_ids, user_items, item_users=None, added=None, removed=None, user_order=None,
+                 item_order=None):
+        self.user_ids = user_ids
+        self.item_ids = item_ids
+        # Новые пользователи и элементы дописываются в конец, тогда порядок сортировки идентификаторов хранится
+        # отдельно, None означает уже отсортированные идентификаторы
+        self.user_order = user_order
+        self.item_order = item_order
+        self.user_ranks = self._ranks(user_order)
+        self.item_ranks = self._ranks(item_order)
+        self.user_items = user_items
+        self.item_users = user_items.T.tocsr() if item_users is None else item_users
+        self.user_degrees = np.diff(self.user_items.indptr)
+        self.item_degrees = np.diff(self.item_users.indptr)
+
+        self.added = added
+        self.removed = removed
+        if added is not None:
+            self.added_t = added.T.tocsr()
+            self.removed_t = removed.T.tocsr()
+            self.user_degrees = self.user_degrees + np.diff(added.indptr) - np.diff(removed.indptr)
+            self.item_degrees = self.item_degrees + np.diff(self.added_t.indptr) - np.diff(self.removed_t.indptr)
+            # Строки и столбцы с изменениями, остальные читаются напрямую из базовых матриц
+            self.changed_users = np.union1d(added.tocoo().row, removed.tocoo().row)
+            self.changed_items = np.union1d(added.indices, removed.indices)
+
+    @classmethod
+    def from_arrays(cls, users, items):
+        """Метод построения матриц по массивам идентификаторов пользователей и элементов"""
+
+        user_ids, rows = np.unique(np.asarray(users, dtype=np.int64), return_inverse=True)
+        item_ids, cols = np.unique(np.asarray(items, dtype=np.int64), return_inverse=True)
+
+        user_items = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.int32), (rows, cols)),
+            shape=(len(user_ids), len(item_ids))
+        )
+        # Повторные лайки не должны увеличивать вес ребра
+        user_items.data[:] = 1
+
+        return cls(user_ids, item_ids, user_items)
+
+    @classmethod
+    def from_pairs(cls, pairs):
+        """Метод построения матриц по потоку пар (пользователь, элемент)"""
+
+        flat = np.fromiter(chain.from_iterable(pairs), dtype=np.int64).reshape(-1, 2)
+        return cls.from_arrays(flat[:, 0], flat[:, 1])
+
+    @classmethod
+    def from_csr_arrays(cls, arrays):
+        """Метод построения матриц поверх готовых CSR-массивов без копирования, например из разделяемой памяти"""
+
+        users_count, items_count = len(arrays['user_ids']), len(arrays['item_ids'])
+
+        user_items = sparse.csr_matrix(
+            (arrays['user_items_data'], arrays['user_items_indices'], arrays['user_items_indptr']),
+            shape=(users_count, items_count), copy=False
+        )
+        item_users = sparse.csr_matrix(
+            (arrays['item_users_data'], arrays['item_users_indices'], arrays['item_users_indptr']),
+            shape=(items_count, users_count), copy=False
+        )
+
+        return cls(arrays['user_ids'], arrays['item_ids'], user_items, item_users)
+
+    def to_csr_arrays(self):
+        """Метод получения массивов, из которых состоят матрицы, накопленные изменения предварительно сливаются"""
+
+        matrix = self.compact()
+
+        return {
+            'user_ids': matrix.user_ids,
+            'item_ids': matrix.item_ids,
+            'user_items_data': matrix.user_items.data,
+            'user_items_indices': matrix.user_items.indices,
+            'user_items_indptr': matrix.user_items.indptr,
+            'item_users_data': matrix.item_users.data,
+            'item_users_indices': matrix.item_users.indices,
+            'item_users_indptr': matrix.item_users.indptr,
+        }
+
+    @staticmethod
+    def _ranks(order):
+        """Метод получения места каждой строки или столбца в порядке возрастания идентификаторов"""
+
+        if order is None:
+            return None
+
+        ranks = np.empty_like(order)
+        ranks[order] = np.arange(len(order))
+        return ranks
+
+    @staticmethod
+    def _positions(ids, order, pks):
+        """Метод получения номеров строк или столбцов по идентификаторам и маски найденных идентификаторов"""
+
+        pks = np.asarray(pks, dtype=np.int64)
+        positions = np.searchsorted(ids, pks, sorter=order)
+        known = positions < len(ids)
+        if order is not None:
+            positions[known] = order[positions[known]]
+        known[known] = ids[positions[known]] == pks[known]
+
+        return positions, known
+
+    @property
+    def edges_count(self):
+        if self.added is None:
+            return self.user_items.nnz
+        return self.user_items.nnz + self.added.nnz - self.removed.nnz
+
+    @property
+    def overlay_count(self):
+        """Число измененных ребер поверх базовых матриц"""
+
+        return 0 if self.added is None else self.added.nnz + self.removed.nnz
+
+    def user_row(self, user_pk):
+        """Метод получения номера строки пользователя или None, если у него нет лайков"""
+
+        (row,), (known,) = self._positions(self.user_ids, self.user_order, [user_pk])
+        if known and self.user_degrees[row] > 0:
+            return int(row)
+        return None
+
+    def user_rows(self, rows):
+        """Метод получения строк матрицы пользователи x элементы с учетом накопленных изменений"""
+
+        user_items = self.user_items[rows]
+        if self.added is not None and np.isin(rows, self.changed_users).any():
+            user_items = user_items + self.added[rows] - self.removed[rows]
+            user_items.eliminate_zeros()
+            user_items.sort_indices()
+        return user_items
+
+    def users_dot(self, other):
+        """Метод умножения матрицы пользователи x элементы с учетом изменений на матрицу или вектор справа"""
+
+        result = self.user_items @ other
+        if self.added is not None:
+            result = result + self.added @ other - self.removed @ other
+        return result
+
+    def items_dot(self, other):
+        """Метод умножения матрицы элементы x пользователи с учетом изменений на матрицу или вектор справа"""
+
+        result = self.item_users @ other
+        if self.added is not None:
+            result = result + self.added_t @ other - self.removed_t @ other
+        return result
+
+    def dot_user_items(self, other):
+        """Метод умножения матрицы слева на матрицу пользователи x элементы с учетом изменений"""
+
+        result = other @ self.user_items
+        if self.added is not None:
+            result = result + other @ self.added - other @ self.removed
+        return result
+
+    def dot_item_users(self, other):
+        """Метод умножения разреженной матрицы слева на матрицу элементы x пользователи с учетом изменений"""
+
+        result = other @ self.item_users
+        if self.added is not None and np.isin(other.indices, self.changed_items).any():
+            result = result + other @ self.added_t - other @ self.removed_t
+        return result
+
+    @staticmethod
+    def _row_indices(matrix, added, removed, row):
+        """Метод получения номеров столбцов строки базовой матрицы с учетом добавленных и убранных ребер"""
+
+        indices = matrix.indices[matrix.indptr[row]:matrix.indptr[row + 1]]
+        if added is None or (added.indptr[row] == added.indptr[row + 1] and
+                             removed.indptr[row] == removed.indptr[row + 1]):
+            return indices
+
+        indices = np.setdiff1d(indices, removed.indices[removed.indptr[row]:removed.indptr[row + 1]])
+        return np.union1d(indices, added.indices[added.indptr[row]:added.indptr[row + 1]])
+
+    def user_items_ids(self, user_pk):
+        """Метод получения идентификаторов элементов, понравившихся пользователю"""
+
+        row = self.user_row(user_pk)
+        if row is None:
+            return []
+        return np.sort(self.item_ids[self.user_rows([row]).indices]).tolist()
+
+    def compact(self):
+        """Метод слияния накопленных изменений с базовыми матрицами в новые матрицы"""
+
+        if self.added is None:
+            return self
+
+        user_items = self.user_items + self.added - self.removed
+        user_items.eliminate_zeros()
+        coo = user_items.tocoo()
+
+        return self.from_arrays(self.user_ids[coo.row], self.item_ids[coo.col])
+
+    def with_changes(self, changes, max_overlay=OVERLAY_MAX_CHANGES):
+        """Метод получения матриц с примененными изменениями (пользователь, элемент, признак лайка)
+
+        Изменения накапливаются поверх базовых матриц без их перестроения, новые пользователи и элементы
+        добавляются пустыми строками и столбцами, матрицы собираются заново только при превышении
+        max_overlay измененных ребер
+        """
+
+        final_state = {}
+        for user_pk, item_pk, liked in changes:
+            final_state[(user_pk, item_pk)] = liked
+
+        changed = np.array(list(final_state), dtype=np.int64).reshape(-1, 2)
+        liked = np.array(list(final_state.values()), dtype=bool)
+
+        if self.overlay_count + len(changed) > max_overlay:
+            return self.compact()._rebuilt(changed, liked)
+
+        return self._with_overlay(changed, liked)
+
+    def _with_overlay(self, changed, liked):
+        """Метод получения матриц с изменениями поверх базовых матриц, при необходимости дополненных"""
+
+        rows, known_users = self._positions(self.user_ids, self.user_order, changed[:, 0])
+        cols, known_items = self._positions(self.item_ids, self.item_order, changed[:, 1])
+        known = known_users & known_items
+
+        if not known.all():
+            # Убранный лайк нового пользователя или элемента ничего не меняет, для поставленных
+            # добавляются пустые строки и столбцы
+            new_users = np.unique(changed[~known_users & liked, 0])
+            new_items = np.unique(changed[~known_items & liked, 1])
+
+            return self._padded(new_users, new_items)._with_overlay(changed[known | liked], liked[known | liked])
+
+        items_count = len(self.item_ids)
+        keys = rows * items_count + cols
+        in_base = np.asarray(self.user_items[rows, cols]).ravel() > 0
+
+        # Прежние изменения тех же ребер заменяются новыми, ребро хранится в добавленных, только если его нет
+        # в базовых матрицах, и в убранных, только если оно там есть
+        overlay = []
+        for previous, is_added in ((self.added, True), (self.removed, False)):
+            rows_previous, cols_previous = (np.empty(0, dtype=np.int64),) * 2
+            if previous is not None:
+                coo = previous.tocoo()
+                kept = ~np.isin(coo.row.astype(np.int64) * items_count + coo.col, keys)
+                rows_previous, cols_previous = coo.row[kept], coo.col[kept]
+
+            mask = (liked & ~in_base) if is_added else (~liked & in_base)
+            overlay.append(self._edges(np.concatenate([rows_previous, rows[mask]]),
+                                       np.concatenate([cols_previous, cols[mask]])))
+
+        return SparseLikesMatrix(self.user_ids, self.item_ids, self.user_items, self.item_users, *overlay,
+                                 self.user_order, self.item_order)
+
+    @staticmethod
+    def _grown_order(ids, order, new_pks):
+        """Метод получения порядка сортировки идентификаторов после дописывания в конец новых"""
+
+        order = np.arange(len(ids)) if order is None else order
+        positions = np.searchsorted(ids, new_pks, sorter=order)
+
+        return np.insert(order, positions, np.arange(len(ids), len(ids) + len(new_pks)))
+
+    @staticmethod
+    def _padded_csr(matrix, shape):
+        """Метод дополнения CSR-матрицы пустыми строками и столбцами без копирования данных"""
+
+        if matrix is None or matrix.shape == shape:
+            return matrix
+
+        indptr = np.concatenate([matrix.indptr, np.full(shape[0] - matrix.shape[0], matrix.indptr[-1],
+                                                        dtype=matrix.indptr.dtype)])
+        return sparse.csr_matrix((matrix.data, matrix.indices, indptr), shape=shape, copy=False)
+
+    def _padded(self, new_users, new_items):
+        """Метод получения матриц, дополненных пустыми строками новых пользователей и столбцами новых элементов"""
+
+        user_order = self._grown_order(self.user_ids, self.user_order, new_users) if len(new_users) else \
+            self.user_order
+        item_order = self._grown_order(self.item_ids, self.item_order, new_items) if len(new_items) else \
+            self.item_order
+        user_ids = np.concatenate([self.user_ids, new_users])
+        item_ids = np.concatenate([self.item_ids, new_items])
+
+        shape = (len(user_ids), len(item_ids))
+        return SparseLikesMatrix(user_ids, item_ids, self._padded_csr(self.user_items, shape),
+                                 self._padded_csr(self.item_users, shape[::-1]),
+                                 self._padded_csr(self.added, shape), self._padded_csr(self.removed, shape),
+                                 user_order, item_order)
+
+    def _edges(self, rows, cols):
+        """Метод построения матрицы ребер в размерах базовых матриц"""
+
+        return sparse.csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, cols)), shape=self.user_items.shape)
+
+    def _rebuilt(self, changed, added):
+        """Метод построения новых матриц по лайкам базовых матриц и изменениям"""
+
+        coo = self.user_items.tocoo()
+        users = self.user_ids[coo.row]
+        items = self.item_ids[coo.col]
+
+        # Убираем все затронутые ребра и добавляем заново только поставленные лайки
+        stride = max(int(items.max(initial=0)), int(changed[:, 1].max(initial=0))) + 1
+        touched = np.isin(users * stride + items, changed[:, 0] * stride + changed[:, 1])
+
+        users = np.concatenate([users[~touched], changed[added, 0]])
+        items = np.concatenate([items[~touched], changed[added, 1]])
+
+        return self.from_arrays(users, items)
+
+    def personalized_pagerank(self, user_pk, damping=0.85, tol=1e-6, max_iter=100):
+        """Метод расчета персонализированного PageRank степенным методом по двудольному графу лайков"""
+
+        row = self.user_row(user_pk)
+        if row is None:
+            return np.zeros(len(self.user_ids)), np.zeros(len(self.item_ids))
+
+        seed = np.zeros(len(self.user_ids))
+        seed[row] = 1.0
+
+        users_rank = seed.copy()
+        items_rank = np.zeros(len(self.item_ids))
+
+        # После удаления лайков в матрицах могут остаться пользователи и элементы с нулевой степенью
+        users_weights = np.divide(1.0, self.user_degrees, out=np.zeros(len(self.user_ids)), where=self.user_degrees > 0)
+        items_weights = np.divide(1.0, self.item_degrees, out=np.zeros(len(self.item_ids)), where=self.item_degrees > 0)
+
+        for _ in range(max_iter):
+            # Переход пользователь -> элемент и элемент -> пользователь с равной вероятностью по ребрам
+            new_items_rank = damping * self.items_dot(users_rank * users_weights)
+            new_users_rank = (1 - damping) * seed + damping * self.users_dot(items_rank * items_weights)
+
+            error = np.abs(new_users_rank - users_rank).sum() + np.abs(new_items_rank - items_rank).sum()
+            users_rank, items_rank = new_users_rank, new_items_rank
+
+            if error < tol:
+                break
+
+        return users_rank, items_rank
+
+    def approximate_personalized_pagerank(self, user_pk, damping=0.85, epsilon=1e-4):
+        """Метод приближенного расчета персонализированного PageRank проталкиванием остатков (Forward Push)"""
+
+        row = self.user_row(user_pk)
+        if row is None:
+            return {}
+
+        users_count = len(self.user_ids)
+
+        estimates = defaultdict(float)
+        residuals = defaultdict(float, {row: 1.0})
+        queue = deque([row])
+
+        # Узлы пользователей нумеруются 0..U-1, узлы элементов - U..U+I-1
+        while queue:
+            node = queue.popleft()
+            residual = residuals.pop(node)
+
+            if node < users_count:
+                indices = self._row_indices(self.user_items, self.added, self.removed, node)
+                neighbours = (indices + users_count).tolist()
+            else:
+                added_t, removed_t = (self.added_t, self.removed_t) if self.added is not None else (None, None)
+                neighbours = self._row_indices(self.item_users, added_t, removed_t, node - users_count).tolist()
+
+            estimates[node] += (1 - damping) * residual
+            share = damping * residual / len(neighbours)
+
+            for neighbour in neighbours:
+                previous = residuals[neighbour]
+                residuals[neighbour] = previous + share
+
+                if neighbour < users_count:
+                    threshold = epsilon * self.user_degrees[neighbour]
+                else:
+                    threshold = epsilon * self.item_degrees[neighbour - users_count]
+
+                if previous < threshold <= previous + share:
+                    queue.append(neighbour)
+
+        return {node: estimate for node, estimate in estimates.items() if node < users_count}
+
+    def _top_k(self, candidates, scores, k):
+        """Метод выбора k кандидатов с наибольшей оценкой, при равенстве - с меньшим идентификатором"""
+
+        if len(candidates) > k:
+            kth_score = np.partition(scores, len(scores) - k)[len(scores) - k]
+            mask = scores >= kth_score
+            candidates, scores = candidates[mask], scores[mask]
+
+        order = np.lexsort((self.user_ids[candidates], -scores))[:k]
+
+        return candidates[order], scores[order]
+
+    def nearest_users(self, user_pk, k, scoring='overlap', **params):
+        """Метод поиска k пользователей с наибольшим числом общих лайков или наибольшим PageRank"""
+
+        row = self.user_row(user_pk)
+        if row is None:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        if scoring == 'pagerank':
+            users_rank, _ = self.personalized_pagerank(user_pk, **params)
+            candidates = np.flatnonzero(users_rank)
+            scores = users_rank[candidates]
+        elif scoring == 'push':
+            estimates = self.approximate_personalized_pagerank(user_pk, **params)
+            candidates = np.fromiter(estimates.keys(), dtype=np.int64, count=len(estimates))
+            scores = np.fromiter(estimates.values(), dtype=np.float64, count=len(estimates))
+        else:
+            # Один проход матрица-вектор дает число общих элементов для всех кандидатов
+            overlap = self.dot_item_users(self.user_rows([row])).tocsr()
+            candidates, scores = overlap.indices, overlap.data
+
+        mask = (candidates != row) & (scores > 0)
+
+        return self._top_k(candidates[mask], scores[mask], k)
+
+    def recommend_items(self, user_pk, k, scoring='overlap', limit=None, **params):
+        """Метод расчета рекомендаций, взвешенных по похожести k ближайших пользователей, в виде пар (элемент, оценка)"""
+
+        row = self.user_row(user_pk)
+        if row is None:
+            return []
+
+        neighbours, weights = self.nearest_users(user_pk, k, scoring, **params)
+
+        return self._score_items(row, neighbours, weights, limit)
+
+    def score_items(self, user_pk, neighbours_pks, weights, limit=None):
+        """Метод расчета рекомендаций по заранее найденным ближайшим пользователям и весам их похожести"""
+
+        row = self.user_row(user_pk)
+        if row is None:
+            return []
+
+        neighbours, mask = self._positions(self.user_ids, self.user_order, neighbours_pks)
+
+        return self._score_items(row, neighbours[mask], np.asarray(weights)[mask], limit)
+
+    def _score_items(self, row, neighbours, weights, limit):
+        """Метод суммирования весов похожести соседей по понравившимся им элементам"""
+
+        # Каждый элемент соседа получает вес похожести этого соседа
+        neighbours_items = self.user_rows(neighbours)
+        candidates, positions = np.unique(neighbours_items.indices, return_inverse=True)
+        scores = np.bincount(positions, weights=np.repeat(weights, np.diff(neighbours_items.indptr)))
+
+        mask = ~np.isin(candidates, self.user_rows([row]).indices, assume_unique=True)
+        candidates, scores = candidates[mask], scores[mask]
+
+        if limit is not None and len(candidates) > limit:
+            kth_score = np.partition(scores, len(scores) - limit)[len(scores) - limit]
+            mask = scores >= kth_score
+            candidates, scores = candidates[mask], scores[mask]
+
+        order = np.lexsort((self.item_ids[candidates], -scores))[:limit]
+
+        return list(zip(self.item_ids[candidates[order]].tolist(), scores[order].tolist()))
+
+    @staticmethod
+    def _top_in_rows(scores, count, ranks=None):
+        """Метод выбора в каждой строке плотной матрицы count столбцов с наибольшей целой оценкой
+
+        При равенстве оценок выше столбец с меньшим местом в ranks, по умолчанию с меньшим номером,
+        то есть с меньшим идентификатором
+        """
+
+        columns_count = scores.shape[1]
+        # Оценка и место столбца объединяются в один ключ, чтобы выбрать и упорядочить их одной сортировкой
+        keys = scores.astype(np.int64, order='C')
+        keys *= columns_count
+        keys += columns_count - 1 - (np.arange(columns_count) if ranks is None else ranks)
+
+        count = min(count or columns_count, columns_count)
+        if count < columns_count:
+            top = np.argpartition(keys, columns_count - count, axis=1)[:, columns_count - count:]
+            keys = np.take_along_axis(keys, top, axis=1)
+        else:
+            top = np.broadcast_to(np.arange(columns_count), keys.shape)
+
+        order = np.argsort(-keys, axis=1)
+        top, keys = np.take_along_axis(top, order, axis=1), np.take_along_axis(keys, order, axis=1)
+
+        return top, keys // columns_count
+
+    def _recommend_chunk(self, chunk_pks, k, limit):
+        """Метод расчета рекомендаций по общим лайкам для одного пакета пользователей"""
+
+        chunk_pks = np.asarray(chunk_pks, dtype=np.int64)
+        positions, known = self._positions(self.user_ids, self.user_order, chunk_pks)
+        rows = positions[known]
+
+        # Одно умножение дает число общих элементов каждого пользователя пакета со всеми остальными
+        chunk_items = self.user_rows(rows)
+        overlap = self.users_dot(chunk_items.T.toarray()).T
+        overlap[np.arange(len(rows)), rows] = 0
+        neighbours, weights = self._top_in_rows(overlap, k, self.user_ranks)
+
+        # Каждый элемент соседа получает вес похожести этого соседа, уже понравившиеся элементы отбрасываются
+        neighbour_weights = sparse.csr_matrix(
+            (weights.ravel(), (np.repeat(np.arange(len(rows)), neighbours.shape[1]), neighbours.ravel())),
+            shape=(len(rows), len(self.user_ids))
+        )
+        scores = self.dot_user_items(neighbour_weights).toarray()
+        scores[chunk_items.nonzero()] = 0
+        items, items_scores = self._top_in_rows(scores, limit, self.item_ranks)
+
+        rows_items = iter(zip(self.item_ids[items].tolist(), items_scores.tolist()))
+        recommendations = []
+        for user_pk, is_known in zip(chunk_pks.tolist(), known.tolist()):
+            item_pks, user_scores = next(rows_items) if is_known else ((), ())
+            recommendations.append(
+                (user_pk, [(item_pk, float(score)) for item_pk, score in zip(item_pks, user_scores) if score > 0])
+            )
+
+        return recommendations
+
+    def recommend_items_batch(self, user_pks, k, limit=None, chunk_size=1000, executor=None, max_in_flight=2):
+        """Метод расчета рекомендаций по общим лайкам для многих пользователей пакетным умножением матриц
+
+        Возвращает поток пар (пользователь, список пар (элемент, оценка)) в порядке user_pks,
+        при переданном пуле потоков одновременно считаются не больше max_in_flight пакетов
+        """
+
+        # Плотные матрицы пакета ограничены BATCH_CELLS ячейками независимо от числа пользователей и элементов
+        chunk_size = max(1, min(chunk_size, BATCH_CELLS // max(len(self.user_ids), len(self.item_ids), 1)))
+        chunks = (user_pks[start:start + chunk_size] for start in range(0, len(user_pks), chunk_size))
+
+        if executor is None:
+            for chunk in chunks:
+                yield from self._recommend_chunk(chunk, k, limit)
+            return
+
+        # В отличие от executor.map пакеты отправляются в пул по мере чтения потока, а не все сразу
+        pending = deque()
+        try:
+            for chunk in chunks:
+                pending.append(executor.submit(self._recommend_chunk, chunk, k, limit))
+                if len(pending) >= max_in_flight:
+                    yield from pending.popleft().result()
+
+            while pending:
+                yield from pending.popleft().result()
+        finally:
+            # Клиент мог прервать чтение потока, еще не начатые пакеты больше не нужны
+            for future in pending:
+                future.cancel()
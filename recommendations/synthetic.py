@@ -0,0 +1,117 @@
+from datetime import datetime
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+
+from recommendations.bulk_likes import import_likes, iter_batches
+from recommendations.models import Category, Item, Like
+from recommendations.services import ZONE, recount_likes, record_likes_reset, rebuild_leaderboards, \
+    refresh_item_popularity
+from users.models import User
+
+SYNTHETIC_EMAIL_DOMAIN = 'synthetic.test'
+SYNTHETIC_CATEGORY_PREFIX = 'synthetic_'
+
+
+def synthetic_email(user_index):
+    """Функция получения email синтетического пользователя по его номеру"""
+
+    return f'user_{user_index}@{SYNTHETIC_EMAIL_DOMAIN}'
+
+
+def power_law_weights(count, exponent):
+    """Функция получения вероятностей степенного распределения, первый номер самый активный"""
+
+    weights = np.arange(1, count + 1, dtype=np.float64) ** -exponent
+    return weights / weights.sum()
+
+
+def iter_synthetic_likes(user_emails, item_pks, likes_count, rng, user_exponent, item_exponent, chunk_size=100000):
+    """Функция генерации строк (email, элемент, дата) со степенным распределением активности и популярности"""
+
+    user_weights = power_law_weights(len(user_emails), user_exponent)
+    item_weights = power_law_weights(len(item_pks), item_exponent)
+
+    for start in range(0, likes_count, chunk_size):
+        size = min(chunk_size, likes_count - start)
+        users = rng.choice(len(user_emails), size=size, p=user_weights)
+        items = rng.choice(len(item_pks), size=size, p=item_weights)
+
+        for user_index, item_index in zip(users.tolist(), items.tolist()):
+            yield user_emails[user_index], item_pks[item_index], None
+
+
+def generate_synthetic_data(users_count, items_count, likes_count, categories_count=10, seed=0, user_exponent=1.0,
+                            item_exponent=1.1, batch_size=10000):
+    """Функция генерации синтетических категорий, пользователей, элементов и лайков, возвращает их количество"""
+
+    rng = np.random.default_rng(seed)
+    created_at = datetime.now(ZONE)
+    # Один хеш на всех пользователей: хеширование пароля для каждого заняло бы больше времени, чем вся загрузка
+    password = make_password(None)
+
+    with transaction.atomic():
+        categories = Category.objects.bulk_create(
+            Category(name=f'{SYNTHETIC_CATEGORY_PREFIX}{i}', description='synthetic') for i in range(categories_count)
+        )
+        category_pks = [category.pk for category in categories]
+
+        user_emails = [synthetic_email(i) for i in range(users_count)]
+        for batch in iter_batches(user_emails, batch_size):
+            User.objects.bulk_create(User(email=email, password=password, phone='80000000000') for email in batch)
+        user_pks = list(User.objects.filter(email__endswith=f'@{SYNTHETIC_EMAIL_DOMAIN}').order_by('pk').
+                        values_list('pk', flat=True))
+
+        owners = rng.choice(user_pks, size=items_count).tolist()
+        item_categories = rng.choice(category_pks, size=items_count).tolist()
+        random_keys = rng.random(items_count).tolist()
+        items = (
+            Item(name=f'synthetic_{i}', description='synthetic', is_published=True, created_at=created_at,
+                 user_id=owners[i], category_id=item_categories[i], random_key=random_keys[i])
+            for i in range(items_count)
+        )
+        item_pks = []
+        for batch in iter_batches(items, batch_size):
+            item_pks.extend(item.pk for item in Item.objects.bulk_create(batch))
+
+    rows = iter_synthetic_likes(user_emails, item_pks, likes_count, rng, user_exponent, item_exponent)
+    imported_count = import_likes(rows, batch_size)
+
+    recount_likes()
+    record_likes_reset()
+    rebuild_leaderboards()
+    refresh_item_popularity()
+
+    return {
+        'categories_count': len(category_pks),
+        'users_count': len(user_pks),
+        'items_count': len(item_pks),
+        'likes_count': imported_count,
+    }
+
+
+def delete_synthetic_data():
+    """Функция удаления синтетических данных, созданных generate_synthetic_data"""
+
+    like_table = connection.ops.quote_name(Like._meta.db_table)
+    user_table = connection.ops.quote_name(User._meta.db_table)
+
+    with transaction.atomic():
+        # Лайки удаляются одним запросом без сигналов, иначе Django загрузит в память каждый из них
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {like_table} WHERE user_id IN (SELECT id FROM {user_table} WHERE email LIKE %s)',
+                [f'%@{SYNTHETIC_EMAIL_DOMAIN}']
+            )
+            deleted_likes = cursor.rowcount
+
+        User.objects.filter(email__endswith=f'@{SYNTHETIC_EMAIL_DOMAIN}').delete()
+        Category.objects.filter(name__startswith=SYNTHETIC_CATEGORY_PREFIX).delete()
+
+    recount_likes()
+    record_likes_reset()
+    rebuild_leaderboards()
+    refresh_item_popularity()
+
+    return deleted_likes
@@ -1,16 +1,42 @@
-from datetime import datetime
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from io import StringIO
+from unittest import mock
 import networkx as nx
+import numpy as np
 import pytz
+import redis
 from django.contrib.auth import authenticate
 from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command, CommandError
+from django.db import connection, DatabaseError, transaction
+from django.db.models import Sum
 from django.template.response import TemplateResponse
 from django.urls import reverse
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from config import settings
 from users.models import User
-from .models import Category, Item, Like
+from .models import Category, Item, Like, UserRecommendation, LikeEvent, LikeCountersFlush
+from .sparse import SparseLikesMatrix
+from .workers import SharedLikesSnapshot, RecommendationWorkerPool
+from .snapshots import export_snapshot, load_snapshot
+from .synthetic import generate_synthetic_data, delete_synthetic_data
+from .tracing import get_recent_traces, clear_traces
 from .services import get_statistics, collaborative_filtering_alg, get_same_interest_users, kNN_alg, create_likes_graph, \
-    page_rank_alg
+    page_rank_alg, likes_graph_store, user_node, sparse_likes_store, reset_likes_stores, LikesGraphStore, \
+    get_recommended_items, score_recommended_items, cache_same_interest_users, invalidate_same_interest_users, \
+    cache_most_popular_items, update_popular_items, POPULAR_ITEMS_KEY, change_count_likes, apply_likes_deltas, \
+    create_like, delete_like, shuffle_items, rotate_items, cache_item_list, get_item_list_cache_stats, \
+    get_popular_items, recount_likes, ZONE, get_recommended_items_batch, flush_likes_deltas, compact_like_events, \
+    find_same_interest_users, record_likes_reset, SCORING_MODES, LEADERBOARD_WINDOWS, LEADERBOARD_BUCKET_TIMEOUT, \
+    record_leaderboard_like, rebuild_leaderboards, expire_leaderboard_buckets, leaderboard_key, \
+    leaderboard_bucket_key, leaderboard_cursor_key, get_hour, ITEMS_SEED_KEY
 
 
 class ItemCategoryTestCase(TestCase):
@@ -102,6 +128,19 @@ class ItemCategoryTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertQuerysetEqual(response.context['object_list'], [self.item_1, self.item_2], ordered=False)
 
+    def test_item_list_view_not_authenticated_keeps_seed_in_cookie(self):
+        url = reverse('recommendations:item_list', args=[self.category_1.pk])
+        response = self.client.get(url)
+
+        # Гостю сессия не создается, зерно перемешивания приходит в подписанной cookie
+        self.assertNotIn('sessionid', response.cookies)
+        self.assertIn(ITEMS_SEED_KEY, response.cookies)
+
+        with mock.patch('recommendations.services.new_shuffle_seed') as new_seed:
+            response = self.client.get(url)
+        new_seed.assert_not_called()
+        self.assertNotIn(ITEMS_SEED_KEY, response.cookies)
+
     def test_item_detail_view(self):
         response = self.client.get(reverse('recommendations:item_detail', args=[self.item_1.pk]))
         self.assertEqual(response.status_code, 200)
@@ -294,6 +333,8 @@ class CollaborativeFilteringTestCase(TestCase):
     """Класс тестирования алгоритмов PageRank, коллаборативной фильтрации и kNN"""
 
     def setUp(self):
+        reset_likes_stores()
+
         self.user_1 = User.objects.create(email='user_1@test.com', password='password', phone="88005553535")
         self.user_2 = User.objects.create(email='user_2@test.com', password='password', phone="88005553535")
         self.user_3 = User.objects.create(email='user_3@test.com', password='password', phone="88005553535")
@@ -322,15 +363,19 @@ class CollaborativeFilteringTestCase(TestCase):
 
         self.assertEqual(len(graph.nodes), 6)
 
-        self.assertIn((self.user_1.email, self.item_1.pk), graph.edges)
-        self.assertIn((self.user_1.email, self.item_2.pk), graph.edges)
-        self.assertIn((self.user_2.email, self.item_2.pk), graph.edges)
-        self.assertIn((self.user_2.email, self.item_3.pk), graph.edges)
-        self.assertIn((self.user_3.email, self.item_1.pk), graph.edges)
+        self.assertIn((user_node(self.user_1.pk), self.item_1.pk), graph.edges)
+        self.assertIn((user_node(self.user_1.pk), self.item_2.pk), graph.edges)
+        self.assertIn((user_node(self.user_2.pk), self.item_2.pk), graph.edges)
+        self.assertIn((user_node(self.user_2.pk), self.item_3.pk), graph.edges)
+        self.assertIn((user_node(self.user_3.pk), self.item_1.pk), graph.edges)
+
+    def test_create_likes_graph_query_count(self):
+        with self.assertNumQueries(1):
+            create_likes_graph()
 
     def test_page_rank_alg(self):
         graph = create_likes_graph()
-        nodes = [self.user_1.email, self.user_2.email, self.user_3.email]
+        nodes = [user_node(self.user_1.pk), user_node(self.user_2.pk), user_node(self.user_3.pk)]
 
         popularity = page_rank_alg(graph, nodes)
 
@@ -340,25 +385,26 @@ class CollaborativeFilteringTestCase(TestCase):
 
     def test_knn_alg(self):
         graph = create_likes_graph()
-        current_user_items = list(graph.neighbors(self.user_1.email))
+        current_user_items = list(graph.neighbors(user_node(self.user_1.pk)))
         k = 2
 
-        same_interest_users = kNN_alg(graph, self.user_1.email, current_user_items, k)
+        same_interest_users = kNN_alg(graph, self.user_1.pk, current_user_items, k)
 
         self.assertGreater(len(same_interest_users), 0)
         for user in same_interest_users:
-            self.assertTrue(User.objects.filter(email=user).exists())
+            self.assertTrue(User.objects.filter(pk=user).exists())
 
     def test_get_same_interest_users(self):
         k = 2
-        graph, current_user_items, same_interest_users = get_same_interest_users(self.user_1.email, k)
+        with mock.patch.object(settings, 'RECOMMENDER_ENGINE', 'networkx'):
+            graph, current_user_items, same_interest_users = get_same_interest_users(self.user_1.pk, k)
 
         self.assertIsInstance(graph, nx.Graph)
         self.assertGreater(len(current_user_items), 0)
         self.assertGreater(len(same_interest_users), 0)
 
     def test_collaborative_filtering(self):
-        recommended_items_ids = collaborative_filtering_alg(self.user_1.email)
+        recommended_items_ids = collaborative_filtering_alg(self.user_1.pk)
         recommended_items = Item.objects.filter(pk__in=recommended_items_ids)
 
         self.assertNotIn(self.item_1, recommended_items)
@@ -376,11 +422,11 @@ class CollaborativeFilteringTestCase(TestCase):
         self.item_3.count_likes = 1
         self.item_3.save()
 
-        same_interest_users, most_popular_items = get_statistics(self.user_1.email)
+        same_interest_users, most_popular_items = get_statistics(self.user_1.pk)
 
         self.assertGreater(len(same_interest_users), 0)
-        self.assertIn(self.user_2.email, same_interest_users)
-        self.assertIn(self.user_3.email, same_interest_users)
+        self.assertIn(self.user_2.pk, same_interest_users)
+        self.assertIn(self.user_3.pk, same_interest_users)
 
         self.assertEqual(most_popular_items.count(), 3)
 
@@ -391,3 +437,1322 @@ class CollaborativeFilteringTestCase(TestCase):
     def test_item_like_count(self):
         item1_likes_count = Like.objects.filter(item=self.item_1).count()
         self.assertEqual(item1_likes_count, 2)
+
+
+class LikesGraphStoreTestCase(TestCase):
+    """Класс тестирования процессного хранилища графа лайков"""
+
+    def setUp(self):
+        cache.clear()
+        reset_likes_stores()
+
+        self.user_1 = User.objects.create(email='user_1@test.com', password='password', phone="88005553535")
+        self.user_2 = User.objects.create(email='user_2@test.com', password='password', phone="88005553535")
+
+        self.item_1 = Item.objects.create(name="test_1", description="test")
+        self.item_2 = Item.objects.create(name="test_2", description="test")
+
+        Like.objects.create(user=self.user_1, item=self.item_1)
+
+    def test_graph_is_built_once(self):
+        graph = likes_graph_store.get_graph()
+
+        with mock.patch('recommendations.services.create_likes_graph') as create_graph:
+            self.assertIs(likes_graph_store.get_graph(), graph)
+            create_graph.assert_not_called()
+
+    def test_like_signals_update_graph(self):
+        with mock.patch.object(settings, 'CACHE_ENABLED', True):
+            graph = likes_graph_store.get_graph()
+
+            with self.captureOnCommitCallbacks(execute=True):
+                like = Like.objects.create(user=self.user_2, item=self.item_1)
+            self.assertIn((user_node(self.user_2.pk), self.item_1.pk), graph.edges)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                like.delete()
+            self.assertNotIn(user_node(self.user_2.pk), graph.nodes)
+            self.assertIs(likes_graph_store.get_graph(), graph)
+
+    def test_graph_is_applied_after_commit(self):
+        with mock.patch.object(settings, 'CACHE_ENABLED', True):
+            graph = likes_graph_store.get_graph()
+
+            with self.captureOnCommitCallbacks() as callbacks:
+                Like.objects.create(user=self.user_2, item=self.item_1)
+                self.assertNotIn(user_node(self.user_2.pk), graph.nodes)
+
+            for callback in callbacks:
+                callback()
+            self.assertIn((user_node(self.user_2.pk), self.item_1.pk), graph.edges)
+
+    def test_likes_of_other_workers_are_replayed_without_cache(self):
+        graph = likes_graph_store.get_graph()
+
+        # Лайк другого воркера: в этом процессе сигналы не срабатывали, но событие есть в журнале
+        with mock.patch('recommendations.signals.register_like'):
+            Like.objects.create(user=self.user_2, item=self.item_2)
+
+        self.assertIs(likes_graph_store.get_graph(), graph)
+        self.assertIn((user_node(self.user_2.pk), self.item_2.pk), graph.edges)
+
+    def test_user_outside_graph_has_no_recommendations(self):
+        with mock.patch.object(settings, 'CACHE_ENABLED', True), \
+                mock.patch('recommendations.signals.register_like'):
+            likes_graph_store.get_graph()
+            Like.objects.create(user=self.user_2, item=self.item_2)
+
+            self.assertEqual(score_recommended_items(self.user_2.pk), [])
+            self.assertEqual(find_same_interest_users(self.user_2.pk, 5), [])
+
+    def test_like_changes_are_logged(self):
+        like = Like.objects.create(user=self.user_2, item=self.item_2)
+        like.delete()
+
+        self.assertEqual(
+            list(LikeEvent.objects.order_by('sequence').values_list('action', 'user_id', 'item_id')),
+            [(LikeEvent.ADD, self.user_1.pk, self.item_1.pk), (LikeEvent.ADD, self.user_2.pk, self.item_2.pk),
+             (LikeEvent.REMOVE, self.user_2.pk, self.item_2.pk)]
+        )
+
+    def test_graph_replays_events_on_version_drift(self):
+        with mock.patch.object(settings, 'CACHE_ENABLED', True):
+            graph = likes_graph_store.get_graph()
+
+            # Другой воркер изменил граф и записал событие в журнал
+            LikeEvent.objects.create(action=LikeEvent.ADD, user_id=self.user_2.pk, item_id=self.item_2.pk)
+            LikesGraphStore.bump_shared_version()
+
+            with mock.patch('recommendations.services.create_likes_graph') as create_graph:
+                self.assertIs(likes_graph_store.get_graph(), graph)
+                create_graph.assert_not_called()
+            self.assertIn((user_node(self.user_2.pk), self.item_2.pk), graph.edges)
+
+    def test_graph_is_rebuilt_when_log_is_too_long(self):
+        with mock.patch.object(settings, 'CACHE_ENABLED', True), \
+                mock.patch.object(settings, 'LIKE_EVENTS_REPLAY_LIMIT', 1):
+            stale_graph = likes_graph_store.get_graph().copy()
+
+            with self.captureOnCommitCallbacks(execute=True):
+                Like.objects.create(user=self.user_2, item=self.item_1)
+                Like.objects.create(user=self.user_2, item=self.item_2)
+
+            # Воркер отстал от журнала больше чем на LIKE_EVENTS_REPLAY_LIMIT событий
+            likes_graph_store._graph = stale_graph
+            likes_graph_store._version = 0
+
+            graph = likes_graph_store.get_graph()
+
+            self.assertIsNot(graph, stale_graph)
+            self.assertIn((user_node(self.user_2.pk), self.item_2.pk), graph.edges)
+
+    def test_idle_graph_is_not_rebuilt(self):
+        with mock.patch.object(settings, 'CACHE_ENABLED', True):
+            graph = likes_graph_store.get_graph()
+
+            # Сжатие затронуло только уже воспроизведенные события
+            LikeEvent.objects.update(created_at=datetime(2000, 1, 1, tzinfo=pytz.utc))
+            compact_like_events(likes_graph_store._sequence)
+            Like.objects.create(user=self.user_2, item=self.item_2)
+
+            with mock.patch('recommendations.services.create_likes_graph') as create_graph:
+                self.assertIs(likes_graph_store.get_graph(), graph)
+                create_graph.assert_not_called()
+
+    def test_graph_is_rebuilt_when_needed_events_are_compacted(self):
+        with mock.patch.object(settings, 'CACHE_ENABLED', True):
+            stale_graph = likes_graph_store.get_graph()
+
+            # Воркер не видел лайк, а его событие уже удалено из журнала
+            with mock.patch('recommendations.signals.register_like'):
+                Like.objects.create(user=self.user_2, item=self.item_2)
+            LikesGraphStore.bump_shared_version()
+            LikeEvent.objects.update(created_at=datetime(2000, 1, 1, tzinfo=pytz.utc))
+            compact_like_events(LikeEvent.objects.latest('sequence').sequence)
+
+            graph = likes_graph_store.get_graph()
+
+            self.assertIsNot(graph, stale_graph)
+            self.assertIn((user_node(self.user_2.pk), self.item_2.pk), graph.edges)
+
+    def test_events_after_gap_are_replayed_again(self):
+        graph = likes_graph_store.get_graph()
+
+        # Событие с пропуском в номерах, например от еще не завершенной транзакции
+        sequence = LikeEvent.objects.latest('sequence').sequence
+        LikeEvent.objects.create(sequence=sequence + 2, action=LikeEvent.ADD, user_id=self.user_2.pk,
+                                 item_id=self.item_2.pk)
+        likes_graph_store._version = -1
+
+        likes_graph_store.get_graph()
+        self.assertIn((user_node(self.user_2.pk), self.item_2.pk), graph.edges)
+
+        LikeEvent.objects.create(sequence=sequence + 1, action=LikeEvent.ADD, user_id=self.user_2.pk,
+                                 item_id=self.item_1.pk)
+
+        # Без общего кеша каждое чтение сверяет последний номер журнала, а догоняющее еще и первый
+        with self.assertNumQueries(3):
+            likes_graph_store.get_graph()
+        self.assertIn((user_node(self.user_2.pk), self.item_1.pk), graph.edges)
+
+        with self.assertNumQueries(1):
+            likes_graph_store.get_graph()
+
+
+class SparseEngineTestCase(TestCase):
+    """Класс тестирования движка рекомендаций на разреженных матрицах"""
+
+    def setUp(self):
+        reset_likes_stores()
+
+        self.users = [
+            User.objects.create(email=f'user_{i}@test.com', password='password', phone="88005553535")
+            for i in range(5)
+        ]
+        self.items = [Item.objects.create(name=f"test_{i}", description="test") for i in range(6)]
+
+        likes = [(0, 0), (0, 1), (0, 2), (1, 1), (1, 2), (1, 3), (2, 0), (2, 4), (3, 2), (3, 5), (4, 5)]
+        for user, item in likes:
+            Like.objects.create(user=self.users[user], item=self.items[item])
+
+    def get_engine_results(self, engine, k):
+        with mock.patch.object(settings, 'RECOMMENDER_ENGINE', engine):
+            return [
+                (get_same_interest_users(user.pk, k)[1:], collaborative_filtering_alg(user.pk, k))
+                for user in self.users
+            ]
+
+    def test_engines_return_identical_results(self):
+        for k in (1, 2, 5):
+            networkx_results = self.get_engine_results('networkx', k)
+            sparse_results = self.get_engine_results('sparse', k)
+
+            for (networkx_users, networkx_items), (sparse_users, sparse_items) in zip(networkx_results,
+                                                                                     sparse_results):
+                self.assertEqual(sorted(networkx_users[0]), sorted(sparse_users[0]))
+                self.assertEqual(networkx_users[1], sparse_users[1])
+                self.assertEqual(networkx_items, sparse_items)
+
+    def test_engines_return_identical_scores(self):
+        for limit in (None, 1, 2):
+            with mock.patch.object(settings, 'RECOMMENDER_ENGINE', 'networkx'):
+                networkx_scores = [score_recommended_items(user.pk, 5, limit=limit) for user in self.users]
+            with mock.patch.object(settings, 'RECOMMENDER_ENGINE', 'sparse'):
+                sparse_scores = [score_recommended_items(user.pk, 5, limit=limit) for user in self.users]
+
+            self.assertEqual(networkx_scores, sparse_scores)
+
+    def test_items_are_weighted_by_neighbours_similarity(self):
+        # У user_0 два общих элемента с user_1 и по одному с user_2 и user_3
+        items_scores = score_recommended_items(self.users[0].pk, k=5)
+
+        self.assertEqual(items_scores[0], (self.items[3].pk, 2))
+        self.assertEqual(sorted(items_scores[1:]), [(self.items[4].pk, 1), (self.items[5].pk, 1)])
+        self.assertEqual(collaborative_filtering_alg(self.users[0].pk, k=5, limit=1), [self.items[3].pk])
+
+    def test_recommended_items_keep_personalized_order(self):
+        self.items[5].count_likes = 10
+        self.items[5].save()
+
+        recommended_items = list(get_recommended_items(self.users[0].pk))
+        self.assertEqual(recommended_items, [self.items[3], self.items[4], self.items[5]])
+
+    def test_batch_matches_single_user_scores(self):
+        user_pks = [user.pk for user in self.users] + [self.users[0].pk, 0]
+
+        for k, limit in ((1, None), (2, 2), (5, 50)):
+            with mock.patch.object(settings, 'RECOMMENDER_ENGINE', 'networkx'):
+                expected = [(user_pk, score_recommended_items(user_pk, k, limit=limit) if user_pk else [])
+                            for user_pk in user_pks]
+
+            self.assertEqual(list(get_recommended_items_batch(user_pks, k, limit or 50)), expected)
+            self.assertEqual(list(sparse_likes_store.get_graph().recommend_items_batch(user_pks, k, limit,
+                                                                                       chunk_size=2)), expected)
+
+    def test_batch_keeps_bounded_chunks_in_flight(self):
+        matrix = sparse_likes_store.get_graph()
+        user_pks = [user.pk for user in self.users]
+
+        with ThreadPoolExecutor(max_workers=1) as executor, \
+                mock.patch.object(executor, 'submit', wraps=executor.submit) as submit:
+            results = matrix.recommend_items_batch(user_pks, 2, chunk_size=1, executor=executor, max_in_flight=2)
+
+            first = next(results)
+            self.assertEqual(submit.call_count, 2)
+            self.assertEqual([first] + list(results), list(matrix.recommend_items_batch(user_pks, 2)))
+            self.assertEqual(submit.call_count, len(user_pks))
+
+    def assertSameMatrices(self, matrix, expected, extra_users_pks=()):
+        users_pks = [user.pk for user in self.users] + list(extra_users_pks)
+
+        self.assertEqual(matrix.edges_count, expected.edges_count)
+        self.assertEqual(list(matrix.recommend_items_batch(users_pks, 2)),
+                         list(expected.recommend_items_batch(users_pks, 2)))
+
+        for user_pk in users_pks:
+            self.assertEqual(matrix.user_items_ids(user_pk), expected.user_items_ids(user_pk))
+            self.assertEqual(matrix.recommend_items(user_pk, 5), expected.recommend_items(user_pk, 5))
+
+            for scoring in SCORING_MODES:
+                rows, weights = matrix.nearest_users(user_pk, 5, scoring)
+                expected_rows, expected_weights = expected.nearest_users(user_pk, 5, scoring)
+
+                self.assertEqual(matrix.user_ids[rows].tolist(), expected.user_ids[expected_rows].tolist())
+                np.testing.assert_allclose(weights, expected_weights)
+
+    def test_like_changes_are_kept_over_base_matrices(self):
+        matrix = SparseLikesMatrix.from_pairs(Like.objects.values_list('user_id', 'item_id'))
+        changes = [
+            (self.users[3].pk, self.items[0].pk, True),
+            (self.users[0].pk, self.items[1].pk, False),
+            (self.users[4].pk, self.items[5].pk, False),
+            (self.users[2].pk, self.items[5].pk, True),
+            (self.users[2].pk, self.items[5].pk, False),
+        ]
+
+        overlaid = matrix.with_changes(changes[:2]).with_changes(changes[2:])
+
+        # Базовые матрицы не перестраиваются, у user_4 не осталось лайков
+        self.assertIs(overlaid.user_items, matrix.user_items)
+        self.assertEqual(overlaid.overlay_count, 3)
+        self.assertEqual(overlaid.user_items_ids(self.users[4].pk), [])
+        self.assertSameMatrices(overlaid, matrix.with_changes(changes, max_overlay=0))
+        self.assertSameMatrices(overlaid, overlaid.compact())
+
+        # Лайк, вернувший ребро базовых матриц, убирает его из изменений
+        restored = overlaid.with_changes([(self.users[0].pk, self.items[1].pk, True)])
+        self.assertEqual(restored.overlay_count, 2)
+
+    def test_new_users_and_items_pad_matrices(self):
+        matrix = SparseLikesMatrix.from_pairs(Like.objects.values_list('user_id', 'item_id'))
+        user = User.objects.create(email='user_new@test.com', password='password', phone="88005553535")
+        # Идентификаторы 0 меньше существующих, поэтому их строка и столбец нарушают порядок сортировки
+        changes = [(user.pk, self.items[0].pk, True), (0, self.items[1].pk, True), (0, self.items[3].pk, True),
+                   (self.users[2].pk, 0, True), (self.users[4].pk, 0, True), (user.pk + 1, self.items[0].pk, False)]
+
+        with mock.patch.object(SparseLikesMatrix, 'from_arrays', wraps=SparseLikesMatrix.from_arrays) as from_arrays:
+            padded = matrix.with_changes(changes)
+        from_arrays.assert_not_called()
+
+        self.assertTrue(np.shares_memory(padded.user_items.indices, matrix.user_items.indices))
+        self.assertEqual(padded.user_items.shape, (len(self.users) + 2, len(self.items) + 1))
+        self.assertEqual(padded.overlay_count, 5)
+        self.assertEqual(padded.user_items_ids(user.pk), [self.items[0].pk])
+        self.assertIsNone(padded.user_row(user.pk + 1))
+        self.assertSameMatrices(padded, matrix.with_changes(changes, max_overlay=0), [user.pk, 0])
+
+    def test_new_user_like_does_not_rebuild_matrices(self):
+        matrix = sparse_likes_store.get_graph()
+        user = User.objects.create(email='user_new@test.com', password='password', phone="88005553535")
+        Like.objects.create(user=user, item=self.items[0])
+
+        with mock.patch.object(SparseLikesMatrix, 'from_arrays', wraps=SparseLikesMatrix.from_arrays) as from_arrays:
+            padded = sparse_likes_store.get_graph()
+        from_arrays.assert_not_called()
+
+        self.assertTrue(np.shares_memory(padded.user_items.data, matrix.user_items.data))
+        self.assertEqual(padded.user_items_ids(user.pk), [self.items[0].pk])
+
+    def test_large_changes_rebuild_matrices(self):
+        matrix = SparseLikesMatrix.from_pairs(Like.objects.values_list('user_id', 'item_id'))
+
+        changes = [(self.users[3].pk, self.items[0].pk, True), (self.users[3].pk, self.items[1].pk, True)]
+        self.assertEqual(matrix.with_changes(changes, max_overlay=1).overlay_count, 0)
+
+    def test_sparse_store_applies_like_changes(self):
+        with mock.patch.object(settings, 'RECOMMENDER_ENGINE', 'sparse'):
+            self.assertNotIn(self.items[4].pk, collaborative_filtering_alg(self.users[3].pk, k=5))
+
+            Like.objects.create(user=self.users[3], item=self.items[0])
+            self.assertIn(self.items[4].pk, collaborative_filtering_alg(self.users[3].pk, k=5))
+
+            Like.objects.filter(user=self.users[3], item=self.items[0]).delete()
+            self.assertNotIn(self.items[4].pk, collaborative_filtering_alg(self.users[3].pk, k=5))
+
+
+class UserRecommendationTestCase(TestCase):
+    """Класс тестирования заранее рассчитанных рекомендаций"""
+
+    def setUp(self):
+        reset_likes_stores()
+
+        self.user_1 = User.objects.create(email='user_1@test.com', password='password', phone="88005553535")
+        self.user_2 = User.objects.create(email='user_2@test.com', password='password', phone="88005553535")
+
+        self.item_1 = Item.objects.create(name="test_1", description="test", count_likes=2)
+        self.item_2 = Item.objects.create(name="test_2", description="test", count_likes=1)
+        self.item_3 = Item.objects.create(name="test_3", description="test", count_likes=1)
+
+        Like.objects.create(user=self.user_1, item=self.item_1)
+        Like.objects.create(user=self.user_2, item=self.item_1)
+        Like.objects.create(user=self.user_2, item=self.item_2)
+        Like.objects.create(user=self.user_2, item=self.item_3)
+
+    def test_compute_recommendations_command(self):
+        call_command('compute_recommendations', stdout=StringIO())
+
+        recommendations = UserRecommendation.objects.filter(user=self.user_1).order_by('rank')
+
+        self.assertEqual([recommendation.item for recommendation in recommendations], [self.item_2, self.item_3])
+        empty_recommendations = UserRecommendation.objects.filter(user=self.user_2).values_list('item', flat=True)
+        self.assertEqual(list(empty_recommendations), [None])
+
+    def test_compute_recommendations_command_replaces_old_rows(self):
+        call_command('compute_recommendations', stdout=StringIO())
+        call_command('compute_recommendations', stdout=StringIO())
+
+        self.assertEqual(UserRecommendation.objects.filter(user=self.user_1).count(), 2)
+
+    def test_precomputed_recommendations_are_served(self):
+        UserRecommendation.objects.create(user=self.user_1, item=self.item_3, score=1, rank=1,
+                                          computed_at=datetime.now(pytz.timezone(settings.TIME_ZONE)))
+
+        with mock.patch.object(settings, 'RECOMMENDATIONS_SOURCE', 'precomputed'):
+            self.assertEqual(list(get_recommended_items(self.user_1.pk)), [self.item_3])
+
+    def test_precomputed_recommendations_are_limited(self):
+        call_command('compute_recommendations', stdout=StringIO())
+
+        with mock.patch.object(settings, 'RECOMMENDATIONS_SOURCE', 'precomputed'):
+            self.assertEqual(list(get_recommended_items(self.user_1.pk, limit=1)), [self.item_2])
+
+    def test_empty_precomputed_recommendations_are_fresh(self):
+        call_command('compute_recommendations', stdout=StringIO())
+
+        with mock.patch.object(settings, 'RECOMMENDATIONS_SOURCE', 'precomputed'), \
+                mock.patch('recommendations.services.collaborative_filtering_alg') as collaborative_filtering:
+            self.assertEqual(list(get_recommended_items(self.user_2.pk)), [])
+        collaborative_filtering.assert_not_called()
+
+    def test_stale_precomputed_recommendations_are_ignored(self):
+        UserRecommendation.objects.create(user=self.user_1, item=self.item_3, score=1, rank=1,
+                                          computed_at=datetime(2000, 1, 1, tzinfo=pytz.UTC))
+
+        with mock.patch.object(settings, 'RECOMMENDATIONS_SOURCE', 'precomputed'):
+            self.assertEqual(list(get_recommended_items(self.user_1.pk)), [self.item_2, self.item_3])
+
+
+class PersonalizedPageRankTestCase(TestCase):
+    """Класс тестирования персонализированного PageRank"""
+
+    def setUp(self):
+        reset_likes_stores()
+
+        self.users = [
+            User.objects.create(email=f'user_{i}@test.com', password='password', phone="88005553535")
+            for i in range(5)
+        ]
+        self.items = [Item.objects.create(name=f"test_{i}", description="test") for i in range(6)]
+
+        likes = [(0, 0), (0, 1), (1, 1), (1, 2), (2, 2), (2, 3), (3, 3), (3, 4), (4, 0), (4, 5)]
+        for user, item in likes:
+            Like.objects.create(user=self.users[user], item=self.items[item])
+
+    def test_power_iteration_matches_networkx_pagerank(self):
+        matrix = sparse_likes_store.get_graph()
+        users_rank, items_rank = matrix.personalized_pagerank(self.users[0].pk, damping=0.85, tol=1e-10, max_iter=1000)
+
+        graph = create_likes_graph()
+        expected = nx.pagerank(graph, alpha=0.85, personalization={user_node(self.users[0].pk): 1}, tol=1e-10,
+                               max_iter=1000)
+
+        for row, user_pk in enumerate(matrix.user_ids.tolist()):
+            self.assertAlmostEqual(users_rank[row], expected[user_node(user_pk)], places=6)
+        for column, item_pk in enumerate(matrix.item_ids.tolist()):
+            self.assertAlmostEqual(items_rank[column], expected[item_pk], places=6)
+
+    def test_push_approximates_power_iteration(self):
+        matrix = sparse_likes_store.get_graph()
+        users_rank, _ = matrix.personalized_pagerank(self.users[0].pk, tol=1e-10)
+        estimates = matrix.approximate_personalized_pagerank(self.users[0].pk, epsilon=1e-6)
+
+        for row, estimate in estimates.items():
+            self.assertAlmostEqual(estimate, users_rank[row], places=4)
+
+    def test_pagerank_reaches_users_without_common_items(self):
+        same_interest_users = get_same_interest_users(self.users[0].pk, 4, scoring='pagerank')[2]
+        self.assertIn(self.users[2].pk, same_interest_users)
+        self.assertEqual(set(same_interest_users[:2]), {self.users[1].pk, self.users[4].pk})
+
+        same_interest_users = get_same_interest_users(self.users[0].pk, 4)[2]
+        self.assertNotIn(self.users[2].pk, same_interest_users)
+
+    def test_collaborative_filtering_scoring_modes(self):
+        for scoring in ('pagerank', 'push'):
+            recommended_items_ids = collaborative_filtering_alg(self.users[0].pk, k=1, scoring=scoring)
+
+            self.assertNotIn(self.items[0].pk, recommended_items_ids)
+            self.assertNotIn(self.items[1].pk, recommended_items_ids)
+            self.assertGreater(len(recommended_items_ids), 0)
+
+
+class SameInterestUsersCacheTestCase(TestCase):
+    """Класс тестирования кеша ближайших пользователей"""
+
+    def setUp(self):
+        reset_likes_stores()
+        cache.clear()
+
+        self.user_1 = User.objects.create(email='user_1@test.com', password='password', phone="88005553535")
+        self.user_2 = User.objects.create(email='user_2@test.com', password='password', phone="88005553535")
+        self.user_3 = User.objects.create(email='user_3@test.com', password='password', phone="88005553535")
+
+        self.item_1 = Item.objects.create(name="test_1", description="test", is_published=True)
+        self.item_2 = Item.objects.create(name="test_2", description="test", is_published=True)
+
+        Like.objects.create(user=self.user_1, item=self.item_1)
+        Like.objects.create(user=self.user_2, item=self.item_1)
+
+        patcher = mock.patch.object(settings, 'CACHE_ENABLED', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_same_interest_users_are_cached(self):
+        self.assertEqual(cache_same_interest_users(self.user_1.pk, 5), [(self.user_2.pk, 1)])
+
+        with mock.patch('recommendations.services.find_same_interest_users') as find_users:
+            self.assertEqual(cache_same_interest_users(self.user_1.pk, 5), [(self.user_2.pk, 1)])
+            find_users.assert_not_called()
+
+    def test_like_invalidates_affected_users(self):
+        cache_same_interest_users(self.user_1.pk, 5)
+        cache_same_interest_users(self.user_2.pk, 5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.create(user=self.user_3, item=self.item_1)
+
+        self.assertEqual(cache_same_interest_users(self.user_1.pk, 5), [(self.user_2.pk, 1), (self.user_3.pk, 1)])
+        self.assertEqual(cache_same_interest_users(self.user_2.pk, 5), [(self.user_1.pk, 1), (self.user_3.pk, 1)])
+
+    def test_unrelated_users_keep_cache(self):
+        cache_same_interest_users(self.user_1.pk, 5)
+
+        invalidate_same_interest_users(self.user_3.pk, self.item_2.pk)
+
+        with mock.patch('recommendations.services.find_same_interest_users') as find_users:
+            cache_same_interest_users(self.user_1.pk, 5)
+            find_users.assert_not_called()
+
+    def test_cascade_delete_invalidates_cache(self):
+        cache_same_interest_users(self.user_1.pk, 5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user_2.delete()
+
+        self.assertEqual(cache_same_interest_users(self.user_1.pk, 5), [])
+
+    def test_likes_reset_invalidates_all_users(self):
+        cache_same_interest_users(self.user_1.pk, 5)
+        cache_same_interest_users(self.user_2.pk, 5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            record_likes_reset()
+
+        with mock.patch('recommendations.services.find_same_interest_users', return_value=[]) as find_users:
+            cache_same_interest_users(self.user_1.pk, 5)
+            cache_same_interest_users(self.user_2.pk, 5)
+            self.assertEqual(find_users.call_count, 2)
+
+    def test_like_view_invalidates_cache(self):
+        cache_same_interest_users(self.user_1.pk, 5)
+
+        self.client.force_login(self.user_3)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('recommendations:item_like', args=[self.item_1.pk]))
+
+        self.assertIn((self.user_3.pk, 1), cache_same_interest_users(self.user_1.pk, 5))
+
+
+class PopularItemsCacheTestCase(TestCase):
+    """Класс тестирования глобального кеша самых популярных элементов"""
+
+    def setUp(self):
+        cache.clear()
+
+        self.items = [Item.objects.create(name=f"test_{i}", description="test", count_likes=i) for i in range(4)]
+
+        patchers = [
+            mock.patch.object(settings, 'CACHE_ENABLED', True),
+            mock.patch.object(settings, 'POPULAR_ITEMS_COUNT', 2),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_popular_items_are_cached_globally(self):
+        self.assertEqual(list(cache_most_popular_items(2)), [self.items[3], self.items[2]])
+        self.assertEqual(cache.get(POPULAR_ITEMS_KEY), [
+            {'pk': self.items[3].pk, 'count_likes': 3},
+            {'pk': self.items[2].pk, 'count_likes': 2},
+            {'pk': self.items[1].pk, 'count_likes': 1},
+        ])
+
+    def test_like_below_threshold_keeps_cache(self):
+        cache_most_popular_items(2)
+
+        update_popular_items(self.items[0].pk, 1)
+        update_popular_items(self.items[3].pk, 4)
+
+        self.assertIsNotNone(cache.get(POPULAR_ITEMS_KEY))
+
+    def test_like_crossing_threshold_resets_cache(self):
+        cache_most_popular_items(2)
+
+        Item.objects.filter(pk=self.items[1].pk).update(count_likes=2)
+        update_popular_items(self.items[1].pk, 2)
+
+        self.assertIsNone(cache.get(POPULAR_ITEMS_KEY))
+
+    def test_unlike_below_runner_up_resets_cache(self):
+        cache_most_popular_items(2)
+
+        Item.objects.filter(pk=self.items[2].pk).update(count_likes=0)
+        update_popular_items(self.items[2].pk, 0)
+
+        self.assertEqual(list(cache_most_popular_items(2)), [self.items[3], self.items[1]])
+
+
+class LikesCounterTestCase(TestCase):
+    """Класс тестирования атомарного изменения счетчиков лайков"""
+
+    def setUp(self):
+        self.item_1 = Item.objects.create(name="test_1", description="test", count_likes=5)
+        self.item_2 = Item.objects.create(name="test_2", description="test", count_likes=1)
+
+    def test_change_count_likes_uses_f_expression(self):
+        stale_item = Item.objects.get(pk=self.item_1.pk)
+        Item.objects.filter(pk=self.item_1.pk).update(count_likes=10, name='updated')
+
+        with self.assertNumQueries(1):
+            change_count_likes(stale_item, 1)
+
+        self.item_1.refresh_from_db()
+        self.assertEqual(self.item_1.count_likes, 11)
+        self.assertEqual(self.item_1.name, 'updated')
+
+    def test_apply_likes_deltas(self):
+        with self.assertNumQueries(1):
+            apply_likes_deltas({self.item_1.pk: 3, self.item_2.pk: -1})
+
+        self.item_1.refresh_from_db()
+        self.item_2.refresh_from_db()
+        self.assertEqual(self.item_1.count_likes, 8)
+        self.assertEqual(self.item_2.count_likes, 0)
+
+    def test_create_like_single_round_trip(self):
+        user = User.objects.create(email='liker@test.com', password='password', phone="88005553535")
+
+        # SAVEPOINT, UPDATE ... RETURNING, INSERT лайка, INSERT события в журнал, RELEASE SAVEPOINT
+        with self.assertNumQueries(5):
+            like, count_likes = create_like(user, self.item_1.pk)
+
+        self.item_1.refresh_from_db()
+        self.assertEqual(count_likes, 6)
+        self.assertEqual(self.item_1.count_likes, 6)
+        self.assertEqual(like.item_id, self.item_1.pk)
+
+    def test_create_like_queries_with_leaderboards(self):
+        user = User.objects.create(email='liker@test.com', password='password', phone="88005553535")
+        redis_client = mock.MagicMock()
+        redis_client.mget.return_value = [b'1', None, None]
+
+        # SAVEPOINT, UPDATE ... RETURNING, INSERT лайка, INSERT события в журнал, RELEASE SAVEPOINT и после коммита
+        # SELECT лайкнувших элемент для сброса их ближайших пользователей, лидерборды категорию не запрашивают
+        with mock.patch.object(settings, 'CACHE_ENABLED', True), \
+                mock.patch('recommendations.services.get_redis_client', return_value=redis_client), \
+                self.assertNumQueries(6), self.captureOnCommitCallbacks(execute=True):
+            create_like(user, self.item_1.pk)
+
+        redis_client.pipeline.return_value.zincrby.assert_any_call(leaderboard_key('all', 'all'), 1, self.item_1.pk)
+
+    def test_write_behind_like_counts_pending_deltas(self):
+        user = User.objects.create(email='liker@test.com', password='password', phone="88005553535")
+        redis_client = mock.MagicMock()
+        # В Redis уже накоплено два не перенесенных лайка, вместе с новым их три
+        redis_client.hincrby.return_value = 3
+
+        with mock.patch.object(settings, 'LIKES_WRITE_BEHIND', True), \
+                mock.patch('recommendations.services.get_redis_client', return_value=redis_client):
+            _, count_likes = create_like(user, self.item_1.pk)
+
+            redis_client.hincrby.assert_called_once()
+            self.assertEqual(count_likes, 8)
+
+            redis_client.hincrby.return_value = 2
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.assertTrue(delete_like(user, self.item_1))
+            redis_client.hincrby.assert_called_once()
+
+            for callback in callbacks:
+                callback()
+            self.assertEqual(self.item_1.count_likes, 7)
+
+        self.item_1.refresh_from_db()
+        self.assertEqual(self.item_1.count_likes, 5)
+
+    def test_flush_likes_deltas_crash_after_commit(self):
+        redis_client = mock.MagicMock()
+        redis_client.exists.return_value = True
+        redis_client.hgetall.side_effect = lambda key: {b'flush_id': b'flush', str(self.item_1.pk).encode(): b'3'}
+        # Процесс падает после коммита, не успев удалить ключ с перенесенными изменениями
+        redis_client.delete.side_effect = redis.ConnectionError
+
+        with mock.patch('recommendations.services.get_redis_client', return_value=redis_client):
+            with self.assertRaises(redis.ConnectionError):
+                flush_likes_deltas()
+
+            redis_client.delete.side_effect = None
+            self.assertEqual(flush_likes_deltas(), 0)
+
+        self.item_1.refresh_from_db()
+        self.assertEqual(self.item_1.count_likes, 8)
+        self.assertFalse(LikeCountersFlush.objects.exists())
+
+    def test_create_like_twice_rolls_back_counter(self):
+        user = User.objects.create(email='liker@test.com', password='password', phone="88005553535")
+        create_like(user, self.item_1.pk)
+
+        self.assertIsNone(create_like(user, self.item_1.pk))
+
+        self.item_1.refresh_from_db()
+        self.assertEqual(self.item_1.count_likes, 6)
+        self.assertEqual(Like.objects.filter(user=user, item=self.item_1).count(), 1)
+
+    def test_create_like_own_or_unpublished_item(self):
+        user = User.objects.create(email='liker@test.com', password='password', phone="88005553535")
+        Item.objects.filter(pk=self.item_1.pk).update(user=user)
+
+        self.assertIsNone(create_like(user, self.item_1.pk))
+        self.assertIsNone(create_like(user, self.item_2.pk, published_only=True))
+        self.assertFalse(Like.objects.filter(user=user).exists())
+
+
+class ExplainHotQueriesTestCase(TestCase):
+    """Класс тестирования команды сбора планов основных запросов"""
+
+    def setUp(self):
+        self.user = User.objects.create(email='user@test.com', password='password', phone="88005553535")
+        self.category = Category.objects.create(name="test", description="test")
+        self.item = Item.objects.create(name="test", description="test", category=self.category, is_published=True)
+        Like.objects.create(user=self.user, item=self.item)
+
+    def test_explain_hot_queries_writes_report(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'before.json')
+            call_command('explain_hot_queries', output=output, label='before', stdout=StringIO())
+            out = StringIO()
+            call_command('explain_hot_queries', label='after', compare=output, stdout=out)
+
+            with open(output, encoding='utf-8') as file:
+                report = json.load(file)
+
+        self.assertEqual(report['label'], 'before')
+        self.assertIn('popular_items', report['queries'])
+        self.assertIn('в замере before', out.getvalue())
+
+    def test_explain_hot_queries_without_likes(self):
+        Like.objects.all().delete()
+
+        with self.assertRaises(CommandError):
+            call_command('explain_hot_queries', stdout=StringIO())
+
+
+class ItemShuffleTestCase(TestCase):
+    """Класс тестирования перемешивания элементов по зерну"""
+
+    def setUp(self):
+        self.category = Category.objects.create(name="test", description="test")
+        self.items = [Item.objects.create(name=f"test_{i}", description="test", random_key=(i * 7 % 10) / 10,
+                                          category=self.category, is_published=True)
+                      for i in range(10)]
+
+    def test_shuffle_items_starts_from_seed(self):
+        shuffled = [item.random_key for item in shuffle_items(Item.objects.all(), 0.45)]
+
+        self.assertEqual(shuffled, [0.5, 0.6, 0.7, 0.8, 0.9, 0.0, 0.1, 0.2, 0.3, 0.4])
+
+    def test_rotate_items_matches_shuffle_items(self):
+        ordered = list(Item.objects.order_by('random_key', 'pk').values_list('pk', 'user_id', 'random_key'))
+
+        for seed in (0.0, 0.3, 0.95):
+            self.assertEqual([item_pk for item_pk, _, _ in rotate_items(ordered, seed)],
+                             [item.pk for item in shuffle_items(Item.objects.all(), seed)])
+
+    def test_shuffle_items_slices_across_seed(self):
+        shuffled = shuffle_items(Item.objects.all(), 0.45)
+
+        self.assertEqual(len(shuffled), 10)
+        self.assertEqual([item.random_key for item in shuffled[3:7]], [0.8, 0.9, 0.0, 0.1])
+        self.assertEqual([item.random_key for item in shuffled[6:]], [0.1, 0.2, 0.3, 0.4])
+        self.assertEqual(shuffled[5].random_key, 0.0)
+
+    def test_cache_item_list_uses_seed(self):
+        cache.clear()
+
+        with mock.patch.object(settings, 'CACHE_ENABLED', True):
+            item_list = cache_item_list(self.category.pk, seed=0.45)
+
+            with self.assertNumQueries(1):
+                cached_item_list = cache_item_list(self.category.pk, seed=0.45)
+
+        self.assertEqual(item_list, cached_item_list)
+        self.assertEqual(item_list, list(shuffle_items(Item.objects.all(), 0.45)))
+        cache.clear()
+
+
+class ItemListCacheTestCase(TestCase):
+    """Класс тестирования кеша списков элементов по категориям"""
+
+    def setUp(self):
+        cache.clear()
+        self.settings_patch = mock.patch.object(settings, 'CACHE_ENABLED', True)
+        self.settings_patch.start()
+
+        self.user = User.objects.create(email='user@test.com', password='password', phone="88005553535")
+        self.category_1 = Category.objects.create(name="test_1", description="test")
+        self.category_2 = Category.objects.create(name="test_2", description="test")
+
+        self.item_1 = Item.objects.create(name="test_1", category=self.category_1, is_published=True, user=self.user)
+        self.item_2 = Item.objects.create(name="test_2", category=self.category_1, is_published=True)
+        self.item_3 = Item.objects.create(name="test_3", category=self.category_2, is_published=True)
+
+    def tearDown(self):
+        self.settings_patch.stop()
+        cache.clear()
+
+    def test_item_list_per_category_and_user(self):
+        self.assertCountEqual(cache_item_list(self.category_1.pk), [self.item_1, self.item_2])
+        self.assertEqual(cache_item_list(self.category_2.pk), [self.item_3])
+        self.assertEqual(cache_item_list(self.category_1.pk, self.user), [self.item_2])
+        self.assertCountEqual(cache_item_list(self.category_1.pk), [self.item_1, self.item_2])
+
+    def test_item_changes_invalidate_item_list(self):
+        cache_item_list(self.category_1.pk)
+        cache_item_list(self.category_2.pk)
+
+        self.item_2.category = self.category_2
+        self.item_2.save()
+        self.assertEqual(cache_item_list(self.category_1.pk), [self.item_1])
+        self.assertCountEqual(cache_item_list(self.category_2.pk), [self.item_2, self.item_3])
+
+        self.item_3.is_published = False
+        self.item_3.save()
+        self.assertEqual(cache_item_list(self.category_2.pk), [self.item_2])
+
+        self.item_1.delete()
+        self.assertEqual(cache_item_list(self.category_1.pk), [])
+
+    def test_count_likes_update_keeps_item_list(self):
+        cache_item_list(self.category_1.pk)
+        change_count_likes(self.item_2, 1)
+
+        self.assertIsNotNone(cache.get(f'item_list_{self.category_1.pk}'))
+
+    def test_item_list_cache_stats(self):
+        cache_item_list(self.category_1.pk)
+        cache_item_list(self.category_1.pk)
+        cache_item_list(self.category_1.pk, self.user)
+
+        self.assertEqual(get_item_list_cache_stats(), {'hits': 2, 'misses': 1, 'hit_rate': 2 / 3})
+
+
+class AsyncRecommendationViewTestCase(TransactionTestCase):
+    """Класс тестирования асинхронных контроллеров страниц рекомендаций и статистики"""
+
+    def setUp(self):
+        reset_likes_stores()
+
+        self.user_1 = User.objects.create(email='user_1@test.com', password='password', phone="88005553535")
+        self.user_2 = User.objects.create(email='user_2@test.com', password='password', phone="88005553535")
+
+        self.item_1 = Item.objects.create(name="test_1", description="test", is_published=True, count_likes=2)
+        self.item_2 = Item.objects.create(name="test_2", description="test", is_published=True, count_likes=1)
+
+        Like.objects.create(user=self.user_1, item=self.item_1)
+        Like.objects.create(user=self.user_2, item=self.item_1)
+        Like.objects.create(user=self.user_2, item=self.item_2)
+
+    def test_recommended_items_async(self):
+        self.client.force_login(self.user_1)
+        response = self.client.get(reverse('recommendations:item_recommended_async'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['object_list'], [self.item_2])
+        self.assertEqual(response.context['user_likes_list'], [self.item_1.pk])
+
+    def test_statistic_async(self):
+        self.client.force_login(self.user_1)
+        response = self.client.get(reverse('recommendations:statistic_async'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['same_interest_users'], [self.user_2])
+        self.assertEqual(response.context['most_popular_items'], [self.item_1, self.item_2])
+
+    def test_statistic_async_window(self):
+        self.client.force_login(self.user_1)
+
+        response = self.client.get(reverse('recommendations:statistic_async'), {'window': '7d'})
+        self.assertEqual(response.context['window'], '7d')
+
+        response = self.client.get(reverse('recommendations:statistic_async'), {'window': 'year'})
+        self.assertEqual(response.context['window'], 'all')
+
+    def test_async_views_access(self):
+        response = self.client.get(reverse('recommendations:statistic_async'))
+        self.assertEqual(response.status_code, 302)
+
+        Like.objects.filter(user=self.user_1).delete()
+        self.client.force_login(self.user_1)
+        response = self.client.get(reverse('recommendations:item_recommended_async'))
+        self.assertEqual(response.status_code, 403)
+
+
+class RecommendationWorkerPoolTestCase(TestCase):
+    """Класс тестирования пула процессов расчета рекомендаций по снимку в разделяемой памяти"""
+
+    def setUp(self):
+        likes = [(1, 10), (1, 11), (1, 12), (2, 11), (2, 12), (2, 13), (3, 10), (3, 14), (4, 12), (4, 15), (5, 15)]
+        self.matrix = SparseLikesMatrix.from_pairs(likes)
+
+    def test_attached_snapshot_shares_memory(self):
+        snapshot = SharedLikesSnapshot.publish(self.matrix)
+        attached = SharedLikesSnapshot.attach(snapshot.manifest)
+
+        try:
+            self.assertEqual(attached.matrix.recommend_items(1, 2), self.matrix.recommend_items(1, 2))
+
+            block_name, dtype, shape = snapshot.manifest['arrays']['user_items_indices']
+            published = np.ndarray(shape, dtype=np.dtype(dtype), buffer=snapshot.blocks[3].buf)
+            published[0] = 5
+            self.assertEqual(attached.matrix.user_items.indices[0], 5)
+            del published
+        finally:
+            attached.close()
+            snapshot.unlink()
+
+    def test_pool_matches_matrix(self):
+        pool = RecommendationWorkerPool(2)
+
+        try:
+            pool.publish(self.matrix, version=1)
+            futures = {user_pk: pool.submit(user_pk, 2, limit=3) for user_pk in range(1, 6)}
+
+            for user_pk, future in futures.items():
+                self.assertEqual(future.result(), self.matrix.recommend_items(user_pk, 2, limit=3))
+        finally:
+            pool.shutdown()
+
+
+class GraphSnapshotTestCase(TestCase):
+    """Класс тестирования снимка матриц лайков на диске"""
+
+    def setUp(self):
+        cache.clear()
+        reset_likes_stores()
+
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+        self.users = [User.objects.create(email=f'user_{i}@test.com', password='password', phone="88005553535")
+                      for i in range(3)]
+        self.items = [Item.objects.create(name=f"test_{i}", description="test") for i in range(4)]
+
+        for user, item in [(0, 0), (0, 1), (1, 1), (1, 2), (2, 2), (2, 3)]:
+            Like.objects.create(user=self.users[user], item=self.items[item])
+
+    def tearDown(self):
+        reset_likes_stores()
+        cache.clear()
+
+    def test_export_and_load_snapshot(self):
+        matrix = SparseLikesMatrix.from_pairs(Like.objects.values_list('user_id', 'item_id'))
+        export_snapshot(matrix, self.directory, sequence=7)
+
+        header, loaded = load_snapshot(self.directory)
+
+        self.assertEqual(header['sequence'], 7)
+        self.assertIsInstance(loaded.user_ids, np.memmap)
+        self.assertFalse(loaded.user_items.indices.flags['OWNDATA'])
+        for user in self.users:
+            self.assertEqual(loaded.recommend_items(user.pk, 2), matrix.recommend_items(user.pk, 2))
+
+    def test_export_keeps_latest_versions(self):
+        matrix = SparseLikesMatrix.from_pairs(Like.objects.values_list('user_id', 'item_id'))
+
+        paths = [export_snapshot(matrix, self.directory, sequence=sequence, keep=2) for sequence in range(3)]
+
+        self.assertFalse(os.path.exists(paths[0]))
+        self.assertTrue(all(os.path.exists(path) for path in paths[1:]))
+        self.assertEqual(load_snapshot(self.directory)[0]['sequence'], 2)
+
+    def test_store_opens_current_snapshot(self):
+        with mock.patch.object(settings, 'CACHE_ENABLED', True), \
+                mock.patch.object(settings, 'LIKE_EVENTS_GAP_TIMEOUT', 0), \
+                mock.patch.object(settings, 'GRAPH_SNAPSHOT_DIR', self.directory):
+            call_command('export_graph_snapshot', stdout=StringIO())
+
+            # Читается только журнал лайков после снимка
+            with self.assertNumQueries(1):
+                matrix = sparse_likes_store.get_graph()
+            self.assertIsInstance(matrix.user_ids, np.memmap)
+
+            # Лайк после выгрузки догоняется по журналу без чтения таблицы лайков
+            with self.captureOnCommitCallbacks(execute=True):
+                Like.objects.create(user=self.users[0], item=self.items[3])
+
+            with mock.patch('recommendations.services.iter_like_pairs') as iter_pairs:
+                matrix = sparse_likes_store.get_graph()
+                iter_pairs.assert_not_called()
+            self.assertEqual(matrix.edges_count, 7)
+            self.assertIn(self.items[3].pk, matrix.user_items_ids(self.users[0].pk))
+
+    def test_export_compacts_old_events(self):
+        LikeEvent.objects.update(created_at=datetime(2000, 1, 1, tzinfo=pytz.utc))
+        Like.objects.create(user=self.users[0], item=self.items[3])
+
+        call_command('export_graph_snapshot', directory=self.directory, compact=True, stdout=StringIO())
+
+        header, _ = load_snapshot(self.directory)
+        self.assertEqual(header['sequence'], LikeEvent.objects.get().sequence - 1)
+        self.assertEqual(LikeEvent.objects.get().item_id, self.items[3].pk)
+
+
+class BulkLikesTestCase(TestCase):
+    """Класс тестирования массовой загрузки и выгрузки лайков"""
+
+    def setUp(self):
+        reset_likes_stores()
+
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+        self.owner = User.objects.create(email='owner@test.com', password='password', phone="88005553535")
+        self.users = [User.objects.create(email=f'user_{i}@test.com', password='password', phone="88005553535")
+                      for i in range(2)]
+        self.items = [Item.objects.create(name=f"test_{i}", description="test", user=self.owner) for i in range(2)]
+
+        Like.objects.create(user=self.users[0], item=self.items[0])
+        self.items[0].count_likes = 1
+        self.items[0].save()
+
+    def tearDown(self):
+        reset_likes_stores()
+
+    def write_file(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def test_import_csv(self):
+        path = self.write_file('likes.csv', (
+            'user,item,created_at\n'
+            f'user_0@test.com,{self.items[0].pk},2024-01-01T10:00:00\n'
+            f'user_0@test.com,{self.items[1].pk},2024-01-01T10:00:00\n'
+            f'user_1@test.com,{self.items[1].pk},\n'
+            f'user_1@test.com,{self.items[1].pk},\n'
+            f'owner@test.com,{self.items[1].pk},\n'
+            f'unknown@test.com,{self.items[1].pk},\n'
+        ))
+        stdout = StringIO()
+
+        call_command('import_likes', path, stdout=stdout)
+
+        self.assertIn('Загружено лайков: 2', stdout.getvalue())
+        self.assertEqual(Like.objects.count(), 3)
+        self.assertEqual(list(Item.objects.order_by('pk').values_list('count_likes', flat=True)), [1, 2])
+        self.assertEqual(Like.objects.get(user=self.users[0], item=self.items[1]).created_at.year, 2024)
+
+    def test_import_resets_graph(self):
+        graph = likes_graph_store.get_graph()
+        path = self.write_file('likes.jsonl', json.dumps({'user': 'user_1@test.com', 'item': self.items[1].pk}))
+
+        call_command('import_likes', path, stdout=StringIO())
+
+        self.assertEqual(LikeEvent.objects.latest('sequence').action, LikeEvent.RESET)
+        graph = likes_graph_store.get_graph()
+        self.assertIn((user_node(self.users[1].pk), self.items[1].pk), graph.edges)
+
+    def test_import_unknown_format(self):
+        path = self.write_file('likes.parquet', '')
+
+        with self.assertRaises(CommandError):
+            call_command('import_likes', path, stdout=StringIO())
+
+    def test_export_and_import_round_trip(self):
+        Like.objects.create(user=self.users[1], item=self.items[1])
+        path = os.path.join(self.directory, 'likes.jsonl')
+
+        call_command('export_likes', path, stdout=StringIO())
+
+        with open(path, encoding='utf-8') as file:
+            rows = [json.loads(line) for line in file]
+        self.assertEqual([(row['user'], row['item']) for row in rows],
+                         [('user_0@test.com', self.items[0].pk), ('user_1@test.com', self.items[1].pk)])
+
+        Like.objects.all().delete()
+        call_command('import_likes', path, stdout=StringIO())
+
+        self.assertEqual(Like.objects.count(), 2)
+        self.assertEqual(list(Item.objects.order_by('pk').values_list('count_likes', flat=True)), [1, 1])
+
+
+class SyntheticDataTestCase(TestCase):
+    """Класс тестирования генератора синтетических данных и замеров производительности"""
+
+    def setUp(self):
+        reset_likes_stores()
+
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def tearDown(self):
+        reset_likes_stores()
+
+    def test_generate_is_reproducible(self):
+        counts = generate_synthetic_data(50, 20, 500, categories_count=3, seed=1)
+        likes = set(Like.objects.values_list('user__email', 'item__name'))
+
+        self.assertEqual((counts['users_count'], counts['items_count'], counts['categories_count']), (50, 20, 3))
+        self.assertEqual(counts['likes_count'], len(likes))
+        self.assertEqual(Item.objects.aggregate(total=Sum('count_likes'))['total'], len(likes))
+
+        delete_synthetic_data()
+        self.assertFalse(Like.objects.exists())
+
+        generate_synthetic_data(50, 20, 500, categories_count=3, seed=1)
+        self.assertEqual(set(Like.objects.values_list('user__email', 'item__name')), likes)
+
+    def test_benchmark_writes_report(self):
+        output = os.path.join(self.directory, 'benchmark.json')
+
+        call_command('benchmark_recommendations', likes=[500], repeat=1, samples=2, output=output, stdout=StringIO())
+
+        with open(output, encoding='utf-8') as file:
+            report = json.load(file)
+
+        benchmarks = report['scales']['500']['benchmarks']
+        self.assertIn('graph_build', benchmarks)
+        self.assertIn('item_list_cursor', benchmarks)
+        self.assertEqual(benchmarks['recommendations']['calls'], 2)
+        self.assertFalse(User.objects.filter(email__endswith='@synthetic.test').exists())
+
+
+class TracingTestCase(TestCase):
+    """Класс тестирования трассировки этапов расчета рекомендаций"""
+
+    def setUp(self):
+        reset_likes_stores()
+        clear_traces()
+
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+        self.users = [User.objects.create(email=f'user_{i}@test.com', password='password', phone="88005553535")
+                      for i in range(3)]
+        self.items = [Item.objects.create(name=f"test_{i}", description="test") for i in range(3)]
+
+        for user, item in [(0, 0), (1, 0), (1, 1), (2, 0), (2, 2)]:
+            Like.objects.create(user=self.users[user], item=self.items[item])
+
+    def tearDown(self):
+        reset_likes_stores()
+        clear_traces()
+
+    def test_spans_are_recorded(self):
+        with mock.patch.object(settings, 'TRACING_SAMPLE_RATE', 1.0), \
+                mock.patch.object(settings, 'RECOMMENDER_ENGINE', 'networkx'):
+            score_recommended_items(self.users[0].pk, k=5)
+
+        trace = get_recent_traces()[-1]
+        spans = {span['name']: span for span in trace['spans']}
+
+        self.assertEqual(trace['name'], 'recommendations')
+        self.assertTrue({'build_graph', 'same_interest_users', 'nearest_users', 'knn', 'page_rank',
+                         'score_items'} <= set(spans))
+        self.assertEqual(spans['knn']['parent'], 'nearest_users')
+        self.assertEqual(spans['knn']['attributes']['candidates'], 2)
+        self.assertEqual(spans['same_interest_users']['attributes']['neighbours'], 2)
+        self.assertEqual(spans['nearest_users']['attributes']['likes'], 5)
+        self.assertEqual(spans['score_items']['attributes']['candidates'], 2)
+
+    def test_not_sampled_calls_are_skipped(self):
+        with mock.patch.object(settings, 'TRACING_SAMPLE_RATE', 0.0):
+            score_recommended_items(self.users[0].pk, k=5)
+
+        self.assertEqual(get_recent_traces(), [])
+
+    def test_slow_trace_dumps_profile(self):
+        with mock.patch.object(settings, 'TRACING_SAMPLE_RATE', 1.0), \
+                mock.patch.object(settings, 'TRACING_SLOW_THRESHOLD', 0), \
+                mock.patch.object(settings, 'TRACING_PROFILE_DIR', self.directory), \
+                self.assertLogs('recommendations.tracing', level='WARNING'):
+            get_statistics(self.users[0].pk)
+
+        trace = get_recent_traces()[-1]
+
+        self.assertEqual(trace['name'], 'statistics')
+        self.assertTrue(os.path.exists(trace['profile']))
+
+
+class PopularityLeaderboardTestCase(TestCase):
+    """Класс тестирования лидербордов популярности по категориям и окнам"""
+
+    def setUp(self):
+        cache.clear()
+
+        self.categories = [Category.objects.create(name=f"test_{i}", description="test") for i in range(2)]
+        self.users = [User.objects.create(email=f'user_{i}@test.com', password='password', phone="88005553535")
+                      for i in range(3)]
+        self.items = [Item.objects.create(name=f"test_{i}", description="test", category=self.categories[i % 2])
+                      for i in range(4)]
+
+        now = datetime.now(ZONE)
+        for user, item, age in [(0, 0, 30), (1, 0, 30), (2, 0, 30), (0, 1, 3), (1, 1, 3), (0, 2, 0), (1, 3, 0)]:
+            Like.objects.create(user=self.users[user], item=self.items[item], created_at=now - timedelta(days=age))
+        recount_likes()
+
+    def test_popular_items_by_window(self):
+        self.assertEqual(list(get_popular_items(2, 'all')), [self.items[0], self.items[1]])
+        self.assertEqual(list(get_popular_items(2, '7d')), [self.items[1], self.items[2]])
+        self.assertEqual(list(get_popular_items(10, '24h')), [self.items[2], self.items[3]])
+
+    def test_popular_items_by_category(self):
+        self.assertEqual(list(get_popular_items(10, 'all', self.categories[0].pk)), [self.items[0], self.items[2]])
+        self.assertEqual(list(get_popular_items(10, '7d', self.categories[1].pk)), [self.items[1], self.items[3]])
+
+    def test_statistics_window(self):
+        _, most_popular_items = get_statistics(self.users[0].pk, count_items=1, window='7d')
+
+        self.assertEqual(list(most_popular_items), [self.items[1]])
+
+    def test_category_page_shows_popular_items(self):
+        response = self.client.get(reverse('recommendations:item_list', args=[self.categories[1].pk]))
+
+        self.assertEqual(list(response.context['popular_items']), [self.items[1], self.items[3]])
+
+
+class RedisLeaderboardTestCase(TestCase):
+    """Класс тестирования лидербордов популярности в Redis на заглушке клиента"""
+
+    def setUp(self):
+        self.categories = [Category.objects.create(name=f"test_{i}", description="test") for i in range(2)]
+        self.users = [User.objects.create(email=f'user_{i}@test.com', password='password', phone="88005553535")
+                      for i in range(3)]
+        self.items = [Item.objects.create(name=f"test_{i}", description="test", category=self.categories[i % 2])
+                      for i in range(4)]
+
+        self.now = datetime.now(ZONE)
+        for user, item, age in [(0, 0, 30), (1, 0, 30), (2, 0, 30), (0, 1, 3), (1, 1, 3), (0, 2, 0), (1, 3, 0)]:
+            Like.objects.create(user=self.users[user], item=self.items[item], created_at=self.now - timedelta(days=age))
+
+        self.redis_client = mock.MagicMock()
+        self.pipeline = self.redis_client.pipeline.return_value
+
+        for patcher in (mock.patch.object(settings, 'CACHE_ENABLED', True),
+                        mock.patch('recommendations.services.get_redis_client', return_value=self.redis_client)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_record_like_updates_all_windows(self):
+        self.redis_client.mget.return_value = [b'1', None, None]
+        item = self.items[1]
+
+        record_leaderboard_like(item.pk, item.category_id, self.now, 1)
+
+        bucket_key = leaderboard_bucket_key('all', get_hour(self.now))
+        for scope in ('all', item.category_id):
+            for window in LEADERBOARD_WINDOWS:
+                self.pipeline.zincrby.assert_any_call(leaderboard_key(scope, window), 1, item.pk)
+        self.pipeline.zincrby.assert_any_call(bucket_key, 1, item.pk)
+        self.pipeline.expire.assert_any_call(bucket_key, LEADERBOARD_BUCKET_TIMEOUT)
+        self.assertEqual(self.pipeline.zincrby.call_count, 8)
+        self.pipeline.execute.assert_called_once()
+
+    def test_record_like_skips_already_expired_hours(self):
+        # Час лайка уже вычтен из окна 24h, поэтому лайк попадает только в остальные окна и корзину
+        self.redis_client.mget.return_value = [b'1', f'{get_hour(self.now):%Y%m%d%H}'.encode(), None]
+
+        record_leaderboard_like(self.items[1].pk, self.items[1].category_id, self.now, -1)
+
+        updated_keys = [call.args[0] for call in self.pipeline.zincrby.call_args_list]
+        self.assertNotIn(leaderboard_key('all', '24h'), updated_keys)
+        self.assertIn(leaderboard_key('all', '7d'), updated_keys)
+        self.assertEqual(len(updated_keys), 6)
+
+    def test_record_like_without_built_leaderboards(self):
+        self.redis_client.mget.return_value = [None, None, None]
+
+        record_leaderboard_like(self.items[1].pk, self.items[1].category_id, self.now, 1)
+
+        self.redis_client.pipeline.assert_not_called()
+
+    def test_like_recorded_after_commit_without_category_query(self):
+        self.redis_client.mget.return_value = [b'1', None, None]
+        item = self.items[1]
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            create_like(self.users[2], item.pk)
+        self.redis_client.pipeline.assert_not_called()
+
+        # Категория берется из RETURNING, после коммита таблица элементов не запрашивается
+        with CaptureQueriesContext(connection) as queries:
+            for callback in callbacks:
+                callback()
+        self.assertFalse([query for query in queries.captured_queries if Item._meta.db_table in query['sql']])
+        self.pipeline.zincrby.assert_any_call(leaderboard_key(item.category_id, 'all'), 1, item.pk)
+
+    def test_rolled_back_like_not_recorded(self):
+        self.redis_client.mget.return_value = [b'1', None, None]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(DatabaseError), transaction.atomic():
+                create_like(self.users[2], self.items[1].pk)
+                raise DatabaseError
+
+        self.redis_client.pipeline.assert_not_called()
+
+    def test_rebuild_leaderboards(self):
+        self.redis_client.scan_iter.return_value = [b'stale_key']
+
+        self.assertTrue(rebuild_leaderboards())
+
+        self.pipeline.delete.assert_called_once_with(b'stale_key')
+        leaderboards = {call.args[0]: call.args[1] for call in self.pipeline.zadd.call_args_list}
+        items = [item.pk for item in self.items]
+        self.assertEqual(leaderboards[leaderboard_key('all', 'all')],
+                         {items[0]: 3, items[1]: 2, items[2]: 1, items[3]: 1})
+        self.assertEqual(leaderboards[leaderboard_key('all', '7d')], {items[1]: 2, items[2]: 1, items[3]: 1})
+        self.assertEqual(leaderboards[leaderboard_key('all', '24h')], {items[2]: 1, items[3]: 1})
+        self.assertEqual(leaderboards[leaderboard_key(self.categories[0].pk, 'all')], {items[0]: 3, items[2]: 1})
+        self.assertEqual(leaderboards[leaderboard_key(self.categories[1].pk, '24h')], {items[3]: 1})
+        self.assertEqual(leaderboards[leaderboard_bucket_key('all', get_hour(self.now))], {items[2]: 1, items[3]: 1})
+        self.pipeline.set.assert_any_call(leaderboard_cursor_key('24h'),
+                                          f'{get_hour(self.now) - timedelta(hours=24):%Y%m%d%H}')
+        self.pipeline.execute.assert_called_once()
+
+    def test_expire_leaderboard_buckets(self):
+        current_hour = get_hour(self.now)
+        new_cursor = current_hour - LEADERBOARD_WINDOWS['24h']
+        cursors = {
+            leaderboard_cursor_key('24h'): f'{new_cursor - timedelta(hours=2):%Y%m%d%H}'.encode(),
+            leaderboard_cursor_key('7d'): f'{current_hour - LEADERBOARD_WINDOWS["7d"]:%Y%m%d%H}'.encode(),
+        }
+        self.redis_client.get.side_effect = cursors.get
+
+        # Из окна 24h вычитаются два часа для всех элементов и каждой категории
+        self.assertEqual(expire_leaderboard_buckets(), 2)
+
+        self.assertEqual(self.pipeline.zunionstore.call_count, 6)
+        key = leaderboard_key('all', '24h')
+        self.pipeline.zunionstore.assert_any_call(key, {key: 1, leaderboard_bucket_key('all', new_cursor): -1})
+        self.pipeline.set.assert_any_call(leaderboard_cursor_key('24h'), f'{new_cursor:%Y%m%d%H}')
+
+    def test_expire_rebuilds_after_lost_buckets(self):
+        self.redis_client.get.return_value = f'{get_hour(self.now) - timedelta(days=10):%Y%m%d%H}'.encode()
+
+        with mock.patch('recommendations.services.rebuild_leaderboards') as rebuild:
+            self.assertEqual(expire_leaderboard_buckets(), 0)
+
+        rebuild.assert_called_once()
+        self.pipeline.zunionstore.assert_not_called()
@@ -0,0 +1,178 @@
+import cProfile
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import wraps
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Трассировка текущего расчета, этапы вложенных функций добавляются в нее же
+current_trace = contextvars.ContextVar('recommendation_trace', default=None)
+
+recent_traces = deque(maxlen=settings.TRACING_KEEP)
+recent_traces_lock = threading.Lock()
+
+
+class Span:
+    """Класс этапа расчета с длительностью и характеристиками данных, например размером графа"""
+
+    __slots__ = ('name', 'parent', 'started_at', 'duration', 'attributes')
+
+    def __init__(self, name, parent, attributes):
+        self.name = name
+        self.parent = parent
+        self.started_at = time.perf_counter()
+        self.duration = None
+        self.attributes = attributes
+
+    def set(self, **attributes):
+        """Метод добавления характеристик этапа"""
+
+        self.attributes.update(attributes)
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started_at
+
+    def as_dict(self, origin):
+        return {
+            'name': self.name,
+            'parent': self.parent,
+            'start_ms': (self.started_at - origin) * 1000,
+            'duration_ms': self.duration * 1000 if self.duration is not None else None,
+            'attributes': self.attributes,
+        }
+
+
+class NullSpan:
+    """Класс этапа вне трассировки, характеристики которого никуда не записываются"""
+
+    def set(self, **attributes):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class Trace:
+    """Класс трассировки одного расчета: этапы в порядке начала и, при профилировании, профиль cProfile"""
+
+    def __init__(self, name, attributes):
+        self.root = Span(name, None, attributes)
+        self.spans = [self.root]
+        self.stack = [self.root]
+        self.created_at = datetime.now(timezone.utc)
+        self.profiler = None
+
+    def start_profiler(self):
+        """Метод включения профилировщика, если он не занят другим инструментом"""
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            return
+        self.profiler = profiler
+
+    def finish(self):
+        if self.profiler is not None:
+            self.profiler.disable()
+        self.root.finish()
+
+    def as_dict(self):
+        return {
+            'name': self.root.name,
+            'created_at': self.created_at.isoformat(),
+            'duration_ms': self.root.duration * 1000,
+            'spans': [span_.as_dict(self.root.started_at) for span_ in self.spans],
+        }
+
+
+@contextmanager
+def span(name, **attributes):
+    """Функция замера этапа текущей трассировки, вне трассировки почти ничего не стоит"""
+
+    trace = current_trace.get()
+    if trace is None:
+        yield NULL_SPAN
+        return
+
+    current = Span(name, trace.stack[-1].name, attributes)
+    trace.spans.append(current)
+    trace.stack.append(current)
+
+    try:
+        yield current
+    finally:
+        current.finish()
+        trace.stack.pop()
+
+
+def traced(name):
+    """Декоратор начала трассировки расчета для доли TRACING_SAMPLE_RATE вызовов, внутри трассировки - этапа"""
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if current_trace.get() is not None:
+                with span(name):
+                    return func(*args, **kwargs)
+
+            if random.random() >= settings.TRACING_SAMPLE_RATE:
+                return func(*args, **kwargs)
+
+            trace = Trace(name, {})
+            token = current_trace.set(trace)
+            if settings.TRACING_PROFILE_DIR:
+                trace.start_profiler()
+
+            try:
+                return func(*args, **kwargs)
+            finally:
+                current_trace.reset(token)
+                finish_trace(trace)
+
+        return wrapper
+
+    return decorator
+
+
+def finish_trace(trace):
+    """Функция сохранения завершенной трассировки, медленные расчеты логируются вместе с профилем"""
+
+    trace.finish()
+    trace_data = trace.as_dict()
+
+    if trace_data['duration_ms'] >= settings.TRACING_SLOW_THRESHOLD:
+        if trace.profiler is not None:
+            path = os.path.join(settings.TRACING_PROFILE_DIR,
+                                f'{trace.root.name}_{trace.created_at:%Y%m%d%H%M%S%f}.prof')
+            trace.profiler.dump_stats(path)
+            trace_data['profile'] = path
+
+        logger.warning('Медленный расчет %s: %.1f мс, этапы: %s', trace.root.name, trace_data['duration_ms'],
+                       ', '.join(f'{span_["name"]} {span_["duration_ms"]:.1f} мс' for span_ in trace_data['spans']))
+
+    with recent_traces_lock:
+        recent_traces.append(trace_data)
+
+
+def get_recent_traces():
+    """Функция получения последних сохраненных трассировок, новые в конце"""
+
+    with recent_traces_lock:
+        return list(recent_traces)
+
+
+def clear_traces():
+    """Функция удаления сохраненных трассировок"""
+
+    with recent_traces_lock:
+        recent_traces.clear()
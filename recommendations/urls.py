@@ -3,7 +3,7 @@ from django.views.decorators.cache import cache_page
 from recommendations.apps import RecommendationsConfig
 from recommendations.views import ItemListView, UserItemListView, ItemDetailView, ItemUpdateView, ItemDeleteView, \
     ItemCreateView, like_item, unlike_item, UserLikeListView, RecommendedItemView, LikeErrorView, StatisticView, \
-    CategoryListView, get_contacts
+    CategoryListView, get_contacts, recommended_items_async, statistic_async
 
 app_name = RecommendationsConfig.name
 
@@ -24,8 +24,10 @@ urlpatterns = [
     path('user-likes/', UserLikeListView.as_view(), name='user_like_list'),
 
     path('recommendations/', cache_page(60)(RecommendedItemView.as_view()), name='item_recommended'),
+    path('recommendations/async/', recommended_items_async, name='item_recommended_async'),
 
     path('statistic/', StatisticView.as_view(), name='statistic'),
+    path('statistic/async/', statistic_async, name='statistic_async'),
 
     path('contacts/', get_contacts, name='contacts')
 ]
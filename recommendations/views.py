@@ -1,14 +1,19 @@
+from asgiref.sync import sync_to_async
 from django.contrib.auth import mixins
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
+from django.core.exceptions import PermissionDenied
 from django.core.mail import send_mail
 from django.shortcuts import redirect, render
 from django.urls import reverse_lazy, reverse
+from django.utils import timezone
 from django.views import generic
 from config import settings
 from recommendations.forms import ItemForm, ContactsForm
 from recommendations.models import Item, Like, Category
-from recommendations.services import collaborative_filtering_alg, NOW, get_statistics, cache_category_list, \
-    cache_item_list
+from recommendations.services import get_recommended_items, get_statistics, cache_category_list, \
+    cache_item_list, update_popular_items, create_like, delete_like, get_shuffle_seed, set_shuffle_seed_cookie, \
+    aget_recommended_items, aget_statistics, get_popular_items, LEADERBOARD_WINDOWS
 from users.models import User
 
 
@@ -73,21 +78,25 @@ class ItemListView(generic.ListView):
                     filter(name__icontains=query). \
                     exclude(user=self.request.user).order_by('-count_likes')
             else:
-                self.queryset = cache_item_list(category_published_items, self.request.user)
+                self.queryset = cache_item_list(category.pk, self.request.user, get_shuffle_seed(self.request))
         else:
             if query:
                 self.queryset = category_published_items. \
                     filter(name__icontains=query). \
                     order_by('-count_likes')
             else:
-                self.queryset = cache_item_list(category_published_items)
+                self.queryset = cache_item_list(category.pk, seed=get_shuffle_seed(self.request))
 
         return super().get_queryset()
 
+    def render_to_response(self, context, **response_kwargs):
+        return set_shuffle_seed_cookie(self.request, super().render_to_response(context, **response_kwargs))
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
         context['category_pk'] = self.kwargs.get('pk')
+        context['popular_items'] = get_popular_items(5, '7d', context['category_pk'])
         if self.request.user.is_authenticated:
             context['user_likes_list'] = Like.objects.filter(user=self.request.user).values_list('item_id', flat=True)
 
@@ -117,7 +126,7 @@ class ItemCreateView(mixins.LoginRequiredMixin, generic.CreateView):
     def form_valid(self, form):
         item = form.save()
         item.user = self.request.user
-        item.created_at = NOW
+        item.created_at = timezone.now()
         item.save()
         return super().form_valid(form)
 
@@ -133,7 +142,7 @@ class ItemUpdateView(mixins.LoginRequiredMixin, mixins.UserPassesTestMixin, gene
 
     def form_valid(self, form):
         item = form.save()
-        item.updated_at = NOW
+        item.updated_at = timezone.now()
         item.save()
         return super().form_valid(form)
 
@@ -163,17 +172,14 @@ def like_item(request, pk):
 
     previous_page = request.META.get('HTTP_REFERER')
 
-    item = Item.objects.get(pk=pk)
+    created = create_like(request.user, pk, published_only=True)
 
-    if item.user == request.user or Like.objects.filter(user=request.user, item=item) or not item.is_published:
+    if created is None:
         return redirect(reverse('recommendations:like_error'))
 
-    like = Like.objects.create(user=request.user, item=item)
-    like.created_at = NOW
-    item.count_likes += 1
+    _, count_likes = created
 
-    item.save()
-    like.save()
+    update_popular_items(pk, count_likes)
 
     return redirect(previous_page) if previous_page else redirect(reverse('recommendations:category_list'))
 
@@ -185,15 +191,11 @@ def unlike_item(request, pk):
     previous_page = request.META.get('HTTP_REFERER')
 
     item = Item.objects.get(pk=pk)
-    like = Like.objects.filter(user=request.user, item=item)
 
-    if not like:
+    if not delete_like(request.user, item):
         return redirect(reverse('recommendations:like_error'))
 
-    like.delete()
-
-    item.count_likes -= 1
-    item.save()
+    update_popular_items(item.pk, item.count_likes)
 
     if previous_page and (
             previous_page == request.build_absolute_uri(reverse('recommendations:statistic')) or
@@ -215,10 +217,7 @@ class RecommendedItemView(mixins.LoginRequiredMixin, mixins.UserPassesTestMixin,
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        recommended_items_ids = collaborative_filtering_alg(self.request.user.email)
-        recommended_items = Item.objects.filter(pk__in=recommended_items_ids).order_by('-count_likes')
-
-        context['object_list'] = recommended_items
+        context['object_list'] = get_recommended_items(self.request.user.pk)
         context['user_likes_list'] = Like.objects.filter(user=self.request.user).values_list('item_id', flat=True)
 
         return context
@@ -235,16 +234,76 @@ class StatisticView(mixins.LoginRequiredMixin, mixins.UserPassesTestMixin, gener
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        same_interest_users, most_popular_items = get_statistics(self.request.user.email)
-        same_interest_users = User.objects.filter(email__in=same_interest_users)
+        window = self.request.GET.get('window')
+        if window not in LEADERBOARD_WINDOWS:
+            window = 'all'
+
+        same_interest_users, most_popular_items = get_statistics(self.request.user.pk, window=window)
+        same_interest_users = User.objects.filter(pk__in=same_interest_users).only('pk', 'email')
 
         context['same_interest_users'] = same_interest_users
         context['most_popular_items'] = most_popular_items
+        context['window'] = window
         context['user_likes_list'] = Like.objects.filter(user=self.request.user).values_list('item_id', flat=True)
 
         return context
 
 
+async def get_request_user(request):
+    """Функция получения пользователя запроса в асинхронном контроллере, None для анонимного"""
+
+    is_authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+
+    return request.user if is_authenticated else None
+
+
+async def recommended_items_async(request):
+    """Асинхронный контроллер для получения страницы списка рекомендованных элементов"""
+
+    user = await get_request_user(request)
+
+    if user is None:
+        return redirect_to_login(request.get_full_path())
+    if not await user.like_set.aexists():
+        raise PermissionDenied
+
+    context = {
+        'object_list': await aget_recommended_items(user.pk),
+        'user_likes_list': [item_pk async for item_pk in
+                            Like.objects.filter(user=user).values_list('item_id', flat=True)],
+    }
+
+    return await sync_to_async(render)(request, 'recommendations/item_recommended.html', context)
+
+
+async def statistic_async(request):
+    """Асинхронный контроллер для получения страницы статистики"""
+
+    user = await get_request_user(request)
+
+    if user is None:
+        return redirect_to_login(request.get_full_path())
+    if not await user.like_set.aexists():
+        raise PermissionDenied
+
+    window = request.GET.get('window')
+    if window not in LEADERBOARD_WINDOWS:
+        window = 'all'
+
+    same_interest_users, most_popular_items = await aget_statistics(user.pk, window=window)
+
+    context = {
+        'same_interest_users': [same_user async for same_user in
+                                User.objects.filter(pk__in=same_interest_users).only('pk', 'email')],
+        'most_popular_items': most_popular_items,
+        'window': window,
+        'user_likes_list': [item_pk async for item_pk in
+                            Like.objects.filter(user=user).values_list('item_id', flat=True)],
+    }
+
+    return await sync_to_async(render)(request, 'recommendations/statistic.html', context)
+
+
 def get_contacts(request):
     """Контроллер для получения страницы с обратной связью"""
 
@@ -0,0 +1,132 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context, shared_memory
+
+import numpy as np
+
+from recommendations.sparse import SparseLikesMatrix
+
+# Модуль не импортирует Django, чтобы процессы пула запускались без настройки проекта
+
+
+class SharedLikesSnapshot:
+    """Класс снимка CSR-матриц лайков в разделяемой памяти, общего для всех процессов пула"""
+
+    def __init__(self, manifest, blocks, matrix=None):
+        self.manifest = manifest
+        self.blocks = blocks
+        self.matrix = matrix
+
+    @classmethod
+    def publish(cls, matrix):
+        """Метод копирования массивов матриц в новые блоки разделяемой памяти"""
+
+        arrays = matrix.to_csr_arrays()
+        snapshot_id = uuid.uuid4().hex[:12]
+        manifest = {'id': snapshot_id, 'arrays': {}}
+
+        blocks = []
+        for i, (name, array) in enumerate(arrays.items()):
+            block = shared_memory.SharedMemory(name=f'likes_{snapshot_id}_{i}', create=True,
+                                               size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+
+            manifest['arrays'][name] = (block.name, array.dtype.str, array.shape)
+            blocks.append(block)
+
+        return cls(manifest, blocks)
+
+    @classmethod
+    def attach(cls, manifest):
+        """Метод открытия снимка в процессе пула и построения матриц поверх разделяемой памяти без копирования"""
+
+        blocks, arrays = [], {}
+        for name, (block_name, dtype, shape) in manifest['arrays'].items():
+            # Процессы пула используют трекер ресурсов родителя, поэтому блоки удаляются только при unlink
+            block = shared_memory.SharedMemory(name=block_name)
+            blocks.append(block)
+            arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+        matrix = SparseLikesMatrix.from_csr_arrays(arrays)
+
+        return cls(manifest, blocks, matrix)
+
+    def close(self):
+        """Метод закрытия блоков снимка в текущем процессе"""
+
+        # Массивы поверх блоков должны быть освобождены до закрытия, иначе буфер останется занят
+        self.matrix = None
+        for block in self.blocks:
+            block.close()
+
+    def unlink(self):
+        """Метод удаления блоков снимка, вызывается процессом, который его опубликовал"""
+
+        self.close()
+        for block in self.blocks:
+            block.unlink()
+
+
+_worker_snapshot = None
+
+
+def score_user(manifest, user_pk, k, scoring='overlap', limit=None, params=None):
+    """Функция расчета рекомендаций в процессе пула по снимку из разделяемой памяти"""
+
+    global _worker_snapshot
+
+    if _worker_snapshot is None or _worker_snapshot.manifest['id'] != manifest['id']:
+        if _worker_snapshot is not None:
+            _worker_snapshot.close()
+        _worker_snapshot = SharedLikesSnapshot.attach(manifest)
+
+    return _worker_snapshot.matrix.recommend_items(user_pk, k, scoring, limit, **(params or {}))
+
+
+class RecommendationWorkerPool:
+    """Класс пула процессов расчета рекомендаций по общему снимку матриц лайков"""
+
+    def __init__(self, workers):
+        self.executor = ProcessPoolExecutor(workers, mp_context=get_context('spawn'))
+        self.snapshots = []
+        self.version = None
+        self.published_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def age(self):
+        return time.monotonic() - self.published_at if self.published_at is not None else float('inf')
+
+    def publish(self, matrix, version=None):
+        """Метод публикации нового снимка, следующие задачи будут считаться по нему"""
+
+        snapshot = SharedLikesSnapshot.publish(matrix)
+
+        with self._lock:
+            self.snapshots.append(snapshot)
+            self.version = version
+            self.published_at = time.monotonic()
+
+            # Предыдущий снимок живет до следующей публикации, чтобы уже отправленные задачи успели его открыть
+            while len(self.snapshots) > 2:
+                self.snapshots.pop(0).unlink()
+
+    def submit(self, user_pk, k, scoring='overlap', limit=None, **params):
+        """Метод отправки задачи (пользователь, k, limit) в пул, возвращает Future со списком (элемент, оценка)"""
+
+        with self._lock:
+            manifest = self.snapshots[-1].manifest
+
+        return self.executor.submit(score_user, manifest, user_pk, k, scoring, limit, params)
+
+    def shutdown(self):
+        """Метод остановки процессов и удаления всех снимков"""
+
+        self.executor.shutdown()
+
+        with self._lock:
+            for snapshot in self.snapshots:
+                snapshot.unlink()
+            self.snapshots = []